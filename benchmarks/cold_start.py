@@ -0,0 +1,106 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Measures the cold start of the Central Account Lambda: the time to import lambda_function and
+# the time of the first and second invocation, each run in a fresh interpreter against the
+# in-process stand-ins from stubs.py.
+#
+#   python benchmarks/cold_start.py --runs 20 --max-import-ms 150 --max-first-invocation-ms 400
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+def run_child():
+    """
+    Runs in a fresh interpreter and prints the measurements as JSON
+    :return : None
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fleet
+    import stubs
+    stubs.prepare_environment()
+    os.chdir(stubs.LAMBDA_FUNCTION_DIR)
+    synthetic_fleet = fleet.Fleet(servers=2, accounts=1)
+    for server in synthetic_fleet.servers:
+        server.state = 'READY_FOR_TEST'
+
+    started = time.perf_counter()
+    import lambda_function
+    imported = time.perf_counter()
+
+    stand_ins = stubs.StubbedAWS(synthetic_fleet.respond).install()
+    devnull = open(os.devnull, 'w')
+    stdout = sys.stdout
+    sys.stdout = devnull
+    try:
+        lambda_function.lambda_handler(fleet.stalled_event(synthetic_fleet.servers[0]), None)
+        first = time.perf_counter()
+        lambda_function.lambda_handler(fleet.stalled_event(synthetic_fleet.servers[1]), None)
+        second = time.perf_counter()
+    finally:
+        sys.stdout = stdout
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'first_invocation_ms': (first - imported) * 1000,
+        'second_invocation_ms': (second - first) * 1000,
+        'remote_calls': stand_ins.total_calls()
+    }))
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start benchmark for the Central Account Lambda')
+    parser.add_argument('--runs', type=int, default=10, help='number of fresh interpreters to measure')
+    parser.add_argument('--max-import-ms', type=float, help='fail when the median import time exceeds this value')
+    parser.add_argument('--max-first-invocation-ms', type=float, help='fail when the median first invocation time exceeds this value')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return 0
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], check=True, capture_output=True, text=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    failed = False
+    for metric in ['import_ms', 'first_invocation_ms', 'second_invocation_ms']:
+        values = [result[metric] for result in results]
+        print('{:<22} median {:8.1f} ms   p90 {:8.1f} ms   max {:8.1f} ms'.format(
+            metric, statistics.median(values), percentile(values, 0.9), max(values)))
+    print('{:<22} {}'.format('remote_calls', results[-1]['remote_calls']))
+
+    limits = {'import_ms': args.max_import_ms, 'first_invocation_ms': args.max_first_invocation_ms}
+    for metric, limit in limits.items():
+        if limit is not None and statistics.median(result[metric] for result in results) > limit:
+            print('REGRESSION: median {} is above {} ms'.format(metric, limit))
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Synthetic MGN fleets spread over many target accounts and regions, with generators for the
+# Stalled, CloudWatch Alarm and DisconnectFromService events the Central Account Lambda receives.
+
+import random
+
+LIFECYCLE_STATES = [
+    ('READY_FOR_TEST', 0.55),
+    ('NOT_READY', 0.15),
+    ('TESTING', 0.1),
+    ('READY_FOR_CUTOVER', 0.1),
+    ('CUTOVER', 0.05),
+    ('DISCONNECTED', 0.05),
+]
+
+DEFAULT_EVENT_MIX = {
+    'stalled': 0.4,
+    'lag': 0.3,
+    'elapsed': 0.1,
+    'disconnect': 0.2,
+}
+
+DESCRIBE_PAGE_SIZE = 200
+
+class SourceServer:
+    __slots__ = ('account', 'region', 'source_server_id', 'fqdn', 'state', 'replication_state', 'lag_seconds', 'backlog_bytes', 'replication_started')
+
+    def __init__(self, account, region, source_server_id, fqdn, state, replication_state='CONTINUOUS', lag_seconds=0, backlog_bytes=0, replication_started='2026-01-01T00:00:00+00:00'):
+        self.account = account
+        self.region = region
+        self.source_server_id = source_server_id
+        self.fqdn = fqdn
+        self.state = state
+        self.replication_state = replication_state
+        self.lag_seconds = lag_seconds
+        self.backlog_bytes = backlog_bytes
+        self.replication_started = replication_started
+
+    def arn(self):
+        return 'arn:aws:mgn:{}:{}:source-server/{}'.format(self.region, self.account, self.source_server_id)
+
+    def describe_item(self):
+        """
+        :return source server item as returned by MGN describe_source_servers
+        """
+        return {
+            'arn': self.arn(),
+            'sourceServerID': self.source_server_id,
+            'lifeCycle': {'state': self.state},
+            'sourceProperties': {
+                'identificationHints': {'fqdn': self.fqdn, 'hostname': self.fqdn.split('.')[0]}
+            },
+            'dataReplicationInfo': {
+                'dataReplicationState': self.replication_state,
+                'lagDuration': 'PT{}S'.format(self.lag_seconds),
+                'dataReplicationInitiation': {'startDateTime': self.replication_started},
+                'replicatedDisks': [{'deviceName': '/dev/sda', 'backloggedStorageBytes': self.backlog_bytes}]
+            }
+        }
+
+class Fleet:
+    """
+    A synthetic fleet of source servers spread evenly over accounts and regions.
+    """
+
+    def __init__(self, servers=10000, accounts=50, regions=None, seed=0):
+        """
+        :param servers: number of source servers
+        :param accounts: number of target accounts
+        :param regions: list of AWS regions, defaults to us-east-1 and eu-west-1
+        :param seed: seed of the random generator, runs with the same seed produce the same fleet and events
+        """
+        self.random = random.Random(seed)
+        self.regions = regions or ['us-east-1', 'eu-west-1']
+        self.accounts = ['{:012d}'.format(100000000000 + number) for number in range(accounts)]
+        states = [state for state, _ in LIFECYCLE_STATES]
+        weights = [weight for _, weight in LIFECYCLE_STATES]
+        self.servers = []
+        self.by_id = {}
+        self.by_target = {}
+        for number in range(servers):
+            server = SourceServer(
+                self.accounts[number % accounts],
+                self.regions[(number // accounts) % len(self.regions)],
+                's-{:017x}'.format(number + 1),
+                'host-{:05d}.corp.example.com'.format(number),
+                self.random.choices(states, weights)[0],
+                'STALLED' if self.random.random() < 0.02 else 'CONTINUOUS',
+                int(self.random.expovariate(1 / 600.0)),
+                int(self.random.expovariate(1 / 50000000.0)),
+                '2026-{:02d}-01T00:00:00+00:00'.format(1 + number % 12)
+            )
+            self.servers.append(server)
+            self.by_id[server.source_server_id] = server
+            self.by_target.setdefault((server.account, server.region), []).append(server)
+
+    def respond(self, service, operation, params, region, account=None):
+        """
+        Response function for stubs.StubbedAWS answering describe_source_servers from the fleet.
+        Calls without a sourceServerIDs filter page through the servers of the assumed account and region.
+        """
+        import stubs
+        if operation == 'DescribeSourceServers':
+            sourceserverids = (params.get('filters') or {}).get('sourceServerIDs')
+            if sourceserverids:
+                return {'items': [self.by_id[sourceserverid].describe_item() for sourceserverid in sourceserverids if sourceserverid in self.by_id]}
+            servers = self.by_target.get((account, region), [])
+            start = int(params.get('nextToken') or 0)
+            end = start + int(params.get('maxResults') or DESCRIBE_PAGE_SIZE)
+            response = {'items': [server.describe_item() for server in servers[start:end]]}
+            if end < len(servers):
+                response['nextToken'] = str(end)
+            return response
+        return stubs.default_response(service, operation, params, region, account)
+
+    def events(self, count, mix=None, duplicate_rate=0.0):
+        """
+        :param count: number of events to generate
+        :param mix: dictionary of event kind to share, see DEFAULT_EVENT_MIX
+        :param duplicate_rate: share of the events that are redelivered duplicates of an earlier event
+        :return generator of events
+        """
+        mix = mix or DEFAULT_EVENT_MIX
+        kinds = list(mix)
+        weights = [mix[kind] for kind in kinds]
+        delivered = []
+        for number in range(count):
+            if delivered and self.random.random() < duplicate_rate:
+                yield self.random.choice(delivered)
+                continue
+            server = self.random.choice(self.servers)
+            kind = self.random.choices(kinds, weights)[0]
+            if kind == 'stalled':
+                event = stalled_event(server, number)
+            elif kind == 'lag':
+                event = alarm_event(server, 'LagDuration', number)
+            elif kind == 'elapsed':
+                event = alarm_event(server, 'ElapsedReplicationDuration', number)
+            else:
+                event = disconnect_event(server, number)
+            if duplicate_rate:
+                delivered.append(event)
+            yield event
+
+def event_time(number):
+    return '2026-01-01T{:02d}:{:02d}:{:02d}Z'.format((number // 3600) % 24, (number // 60) % 60, number % 60)
+
+def stalled_event(server, number=0):
+    """
+    :return MGN Source Server Data Replication Stalled Change event
+    """
+    return {
+        'version': '0',
+        'id': 'stalled-{}-{}'.format(server.source_server_id, number),
+        'detail-type': 'MGN Source Server Data Replication Stalled Change',
+        'source': 'aws.mgn',
+        'account': server.account,
+        'time': event_time(number),
+        'region': server.region,
+        'resources': [server.arn()],
+        'detail': {'state': 'STALLED'}
+    }
+
+def alarm_event(server, metric, number=0, state='ALARM'):
+    """
+    :return CloudWatch Alarm State Change event for an MGN alarm created by ConfigureAlarmLambda
+    """
+    alarm_name = 'MGN-{}-{}'.format(server.source_server_id, metric)
+    return {
+        'version': '0',
+        'id': 'alarm-{}-{}-{}'.format(server.source_server_id, metric, number),
+        'detail-type': 'CloudWatch Alarm State Change',
+        'source': 'aws.cloudwatch',
+        'account': server.account,
+        'time': event_time(number),
+        'region': server.region,
+        'resources': ['arn:aws:cloudwatch:{}:{}:alarm:{}'.format(server.region, server.account, alarm_name)],
+        'detail': {
+            'alarmName': alarm_name,
+            'state': {'value': state, 'reason': 'Threshold Crossed', 'timestamp': event_time(number)},
+            'previousState': {'value': 'OK' if state == 'ALARM' else 'ALARM'},
+            'configuration': {
+                'description': 'Alarm to monitor ' + metric,
+                'metrics': [{
+                    'id': 'metric',
+                    'metricStat': {
+                        'metric': {'namespace': 'AWS/MGN', 'name': metric, 'dimensions': {'SourceServerID': server.source_server_id}},
+                        'period': 300,
+                        'stat': 'Maximum'
+                    },
+                    'returnData': True
+                }]
+            }
+        }
+    }
+
+def disconnect_event(server, number=0):
+    """
+    :return DisconnectFromService CloudTrail record as received by the Central Account Lambda
+    """
+    return {
+        'eventVersion': '1.08',
+        'eventID': 'disconnect-{}-{}'.format(server.source_server_id, number),
+        'eventName': 'DisconnectFromService',
+        'eventSource': 'mgn.amazonaws.com',
+        'eventTime': event_time(number),
+        'time': event_time(number),
+        'account': server.account,
+        'region': server.region,
+        'awsRegion': server.region,
+        'userIdentity': {'accountId': server.account},
+        'requestParameters': {'sourceServerID': server.source_server_id},
+        'responseElements': server.describe_item(),
+        'detail': {'state': 'DISCONNECTED'}
+    }
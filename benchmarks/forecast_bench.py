@@ -0,0 +1,106 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Offline benchmark of the replication forecast. The in-process AWS stand-ins answer
+# DescribeSourceServers with a synthetic fleet and GetMetricData with a synthetic AWS/MGN history
+# in which a share of the servers has a growing lag, and lambda_function/replication_forecast.py
+# analyzes every target. Needs NumPy, like the forecast function.
+#
+#   python benchmarks/forecast_bench.py --servers 20000 --accounts 4 --latency-ms 300
+
+import argparse
+from datetime import timedelta
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs
+
+class ForecastFleet:
+    """
+    Source servers of every target account and their synthetic metric history. Every growing-th
+    server has a lag growing from 600 seconds by 900 seconds per hour, the others a flat lag.
+    """
+
+    def __init__(self, servers, accounts, growing=20, page_size=1000):
+        self.accounts = ['{:012d}'.format(100000000000 + index) for index in range(accounts)]
+        self.servers_per_account = max(1, servers // accounts)
+        self.growing = growing
+        self.page_size = page_size
+
+    def respond(self, service, operation, params, region, account=None):
+        if operation == 'DescribeSourceServers':
+            start = int(params.get('nextToken') or 0)
+            end = min(start + self.page_size, self.servers_per_account)
+            response = {'items': [stubs.source_server_item(account, region, 's-{}{:013d}'.format(account[-4:], index)) for index in range(start, end)]}
+            if end < self.servers_per_account:
+                response['nextToken'] = str(end)
+            return response
+        if operation == 'GetMetricData':
+            return {'MetricDataResults': [self.metric_data(query, params['StartTime'], params['EndTime']) for query in params['MetricDataQueries']]}
+        return stubs.default_response(service, operation, params, region, account)
+
+    def metric_data(self, query, start, end):
+        stat = query['MetricStat']
+        period = stat['Period']
+        index = int(stat['Metric']['Dimensions'][0]['Value'][-13:])
+        timestamps = []
+        values = []
+        timestamp = start
+        step = 0
+        while timestamp < end:
+            if stat['Metric']['MetricName'] == 'LagDuration':
+                values.append(600.0 + 900.0 * step * period / 3600.0 if index % self.growing == 0 else 30.0)
+            else:
+                values.append(86400.0 + step * period)
+            timestamps.append(timestamp)
+            timestamp = timestamp + timedelta(seconds=period)
+            step += 1
+        return {'Id': query['Id'], 'Label': stat['Metric']['MetricName'], 'Timestamps': timestamps, 'Values': values, 'StatusCode': 'Complete'}
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the replication forecast.')
+    parser.add_argument('--servers', type=int, default=10000, help='number of source servers in the synthetic fleet')
+    parser.add_argument('--accounts', type=int, default=4, help='number of target accounts')
+    parser.add_argument('--region', default='us-east-1', help='target region')
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated latency of every API call in milliseconds')
+    args = parser.parse_args()
+
+    stubs.prepare_environment()
+    os.environ['LogLevel'] = 'ERROR'
+    os.environ['MetricsEnabled'] = 'false'
+    os.environ['DeliverySinks'] = 'logs'
+    os.environ.setdefault('ApiRateLimits', 'cloudwatch:GetMetricData=50,mgn:DescribeSourceServers=50')
+    import replication_forecast
+
+    forecast_fleet = ForecastFleet(args.servers, args.accounts)
+    stand_ins = stubs.StubbedAWS(forecast_fleet.respond, latency_ms={'*': args.latency_ms}).install()
+
+    started = time.perf_counter()
+    summary = replication_forecast.run_forecast([(account, args.region) for account in forecast_fleet.accounts])
+    elapsed = time.perf_counter() - started
+
+    print('servers {}   elapsed {:.3f} s   {:.1f} servers/s'.format(summary['servers'], elapsed, summary['servers'] / elapsed))
+    for (service, operation), count in sorted(stand_ins.calls.items()):
+        print('  {:<40} {:>8}'.format(service + ':' + operation, count))
+    print(json.dumps(summary))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Offline load test of the Central Account Lambda. A synthetic fleet produces Stalled, CloudWatch
+# Alarm and DisconnectFromService events which are run through lambda_handler or batch_handler
+# against the in-process AWS stand-ins, with configurable latency and throttling.
+#
+#   python benchmarks/load_bench.py --servers 10000 --accounts 50 --events 20000 --mode batch
+#   python benchmarks/load_bench.py --latency-ms AssumeRole=40 --latency-ms '*=15' --throttle-rate 0.02
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fleet
+import stubs
+
+# Module level functions of the Lambda function timed as stages, as (module name, function name, stage)
+STAGES = [
+    ('utils', 'get_event_type', 'classify'),
+    ('utils', 'get_source_server', 'source_server_lookup'),
+    ('utils', 'get_source_servers', 'bulk_source_server_lookup'),
+    ('lambda_function', 'process_event_types', 'process'),
+    ('utils', 'write_to_cw_logs', 'buffer_log_event'),
+    ('utils', 'publish_event_to_sns_topic', 'queue_notification'),
+    ('utils', 'flush_log_events', 'flush_log_events'),
+    ('utils', 'flush_notifications', 'flush_notifications'),
+    ('delivery', 'flush', 'flush_sinks'),
+]
+
+class StageTimer:
+    """
+    Wraps functions of the Lambda function modules and records the duration of every call per stage.
+    """
+
+    def __init__(self):
+        self.durations = {}
+
+    def wrap(self, module, function_name, stage):
+        original = getattr(module, function_name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.durations.setdefault(stage, []).append((time.perf_counter() - started) * 1000)
+
+        setattr(module, function_name, timed)
+
+    def record(self, stage, milliseconds):
+        self.durations.setdefault(stage, []).append(milliseconds)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def parse_latencies(values):
+    latencies = {}
+    for value in values or []:
+        operation, milliseconds = value.split('=', 1)
+        latencies[operation] = float(milliseconds)
+    return latencies
+
+def reset_container(utils):
+    """
+    Clears the warm container caches, as if the next event was delivered to a new container
+    """
+    utils.mgn_client_cache.clear()
+    utils.source_server_cache.clear()
+    utils.idempotency_cache.memory.clear()
+
+def run(args):
+    stubs.prepare_environment()
+    os.environ['LogLevel'] = args.log_level
+    os.chdir(stubs.LAMBDA_FUNCTION_DIR)
+    import lambda_function
+    import utils
+
+    synthetic_fleet = fleet.Fleet(args.servers, args.accounts, args.regions, args.seed)
+    stand_ins = stubs.StubbedAWS(synthetic_fleet.respond, parse_latencies(args.latency_ms), args.throttle_rate, args.seed).install()
+    timer = StageTimer()
+    for module_name, function_name, stage in STAGES:
+        timer.wrap(sys.modules[module_name], function_name, stage)
+
+    events = list(synthetic_fleet.events(args.events, duplicate_rate=args.duplicate_rate))
+    failures = 0
+    processed = 0
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if args.mode == 'single':
+            for event in events:
+                if args.cold_every and processed and processed % args.cold_every == 0:
+                    reset_container(utils)
+                invocation_started = time.perf_counter()
+                try:
+                    lambda_function.lambda_handler(event, None)
+                except Exception:
+                    failures += 1
+                timer.record('invocation', (time.perf_counter() - invocation_started) * 1000)
+                processed += 1
+        else:
+            for start in range(0, len(events), args.batch_size):
+                if args.cold_every and processed and processed % args.cold_every < args.batch_size:
+                    reset_container(utils)
+                records = [
+                    {'messageId': str(start + number), 'body': json.dumps(event)}
+                    for number, event in enumerate(events[start:start + args.batch_size])
+                ]
+                invocation_started = time.perf_counter()
+                response = lambda_function.batch_handler({'Records': records}, None)
+                timer.record('invocation', (time.perf_counter() - invocation_started) * 1000)
+                failures += len(response['batchItemFailures'])
+                processed += len(records)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'mode': args.mode,
+        'events': processed,
+        'failures': failures,
+        'elapsed_seconds': round(elapsed, 3),
+        'events_per_second': round(processed / elapsed, 1) if elapsed else None,
+        'remote_calls_per_event': round(stand_ins.total_calls() / processed, 3) if processed else None,
+        'remote_calls': {'{}:{}'.format(service, operation): count for (service, operation), count in sorted(stand_ins.calls.items())},
+        'throttled_calls': {'{}:{}'.format(service, operation): count for (service, operation), count in sorted(stand_ins.throttles.items())},
+        'stages_ms': {
+            stage: {
+                'count': len(values),
+                'p50': round(percentile(values, 0.5), 3),
+                'p90': round(percentile(values, 0.9), 3),
+                'p99': round(percentile(values, 0.99), 3),
+                'max': round(max(values), 3)
+            }
+            for stage, values in timer.durations.items()
+        }
+    }
+    return report
+
+def print_report(report):
+    print('mode {}   events {}   failures {}   elapsed {} s   {} events/s'.format(
+        report['mode'], report['events'], report['failures'], report['elapsed_seconds'], report['events_per_second']))
+    print('remote calls per event {}'.format(report['remote_calls_per_event']))
+    for operation, count in report['remote_calls'].items():
+        print('  {:<40} {:>8}   throttled {:>6}'.format(operation, count, report['throttled_calls'].get(operation, 0)))
+    print('{:<28} {:>8} {:>10} {:>10} {:>10} {:>10}'.format('stage', 'count', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for stage, values in report['stages_ms'].items():
+        print('{:<28} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(stage, values['count'], values['p50'], values['p90'], values['p99'], values['max']))
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load test of the Central Account Lambda')
+    parser.add_argument('--servers', type=int, default=10000, help='number of source servers in the synthetic fleet')
+    parser.add_argument('--accounts', type=int, default=50, help='number of target accounts')
+    parser.add_argument('--regions', nargs='+', default=['us-east-1', 'eu-west-1'], help='target regions')
+    parser.add_argument('--events', type=int, default=5000, help='number of events to process')
+    parser.add_argument('--mode', choices=['single', 'batch'], default='single', help='lambda_handler per event or SQS batches through batch_handler')
+    parser.add_argument('--batch-size', type=int, default=100, help='SQS batch size in batch mode')
+    parser.add_argument('--latency-ms', action='append', help='simulated latency as Operation=milliseconds, * applies to every operation')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of the calls answered with ThrottlingException')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='share of the events delivered twice')
+    parser.add_argument('--cold-every', type=int, default=0, help='clear the warm container caches every N events')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the fleet, event and throttling generators')
+    parser.add_argument('--log-level', default='ERROR', help='log level of the Lambda function while the test runs')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
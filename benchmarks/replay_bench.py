@@ -0,0 +1,88 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Offline benchmark of the streaming replay. A synthetic fleet writes a gzip compressed archive of
+# EventBridge events and CloudTrail records, which lambda_function/replay.py then replays against
+# the in-process AWS stand-ins into a local JSON lines file.
+#
+#   python benchmarks/replay_bench.py --events 200000 --workers 8
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fleet
+import stubs
+
+def write_archive(path, synthetic_fleet, count):
+    """
+    Writes the events as JSON lines, with the DisconnectFromService records in the raw CloudTrail layout
+    :return size: size of the archive in bytes
+    """
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        for event in synthetic_fleet.events(count):
+            if 'eventName' in event:
+                event = dict(event)
+                event['recipientAccountId'] = event.pop('account')
+                event['awsRegion'] = event.pop('region')
+                event['eventTime'] = event.pop('time')
+                event.pop('detail', None)
+            archive.write(json.dumps(event) + '\n')
+    return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the streaming replay.')
+    parser.add_argument('--servers', type=int, default=10000, help='number of source servers in the synthetic fleet')
+    parser.add_argument('--accounts', type=int, default=20, help='number of target accounts')
+    parser.add_argument('--events', type=int, default=50000, help='number of archived events')
+    parser.add_argument('--workers', type=int, default=None, help='replay worker processes, defaults to replay.DEFAULT_WORKERS')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='records per chunk sent to a worker')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the synthetic fleet')
+    args = parser.parse_args()
+
+    stubs.prepare_environment()
+    os.environ['LogLevel'] = 'ERROR'
+    os.environ['MetricsEnabled'] = 'false'
+    os.environ['SourceServerCacheTTL'] = '3600'
+    os.environ['SourceServerCacheMaxEntries'] = str(max(4096, args.servers))
+    import replay
+
+    synthetic_fleet = fleet.Fleet(args.servers, args.accounts, seed=args.seed)
+    # Installed before the worker processes are forked, so that every worker answers from the fleet
+    stubs.StubbedAWS(synthetic_fleet.respond).install()
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive_path = os.path.join(directory, 'archive.jsonl.gz')
+        output_path = os.path.join(directory, 'replayed.jsonl')
+        size = write_archive(archive_path, synthetic_fleet, args.events)
+        started = time.perf_counter()
+        workers = replay.DEFAULT_WORKERS if args.workers is None else args.workers
+        summary = replay.replay([archive_path], replay.FileOutput(output_path), workers, args.chunk_size, 5000, True)
+        elapsed = time.perf_counter() - started
+
+    print('archive {} events   {:.1f} MB compressed'.format(args.events, size / 1048576.0))
+    print('workers {}   elapsed {:.3f} s   {:.1f} records/s'.format(workers, elapsed, summary['records'] / elapsed))
+    print(json.dumps(summary))
+
+if __name__ == '__main__':
+    main()
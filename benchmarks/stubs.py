@@ -0,0 +1,233 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# In-process stand-ins for the AWS APIs called by the Central Account Lambda. The stand-ins hook
+# the before-send event of the shared boto3 session in client_factory, so real clients are
+# created and real requests are built, signed and retried by the SDK (and their cost measured)
+# but no request leaves the process.
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import sys
+import threading
+import time
+
+LAMBDA_FUNCTION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda_function')
+
+def prepare_environment():
+    """
+    Sets the environment variables the Lambda function expects and makes it importable
+    :return : None
+    """
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    os.environ.setdefault('EventsCLoudWatchLogGroup', 'MGN-Events-Log-Group-Benchmark')
+    os.environ.setdefault('EventsSNSTopic', 'arn:aws:sns:us-east-1:000000000000:MGN-Events-SNS-Benchmark')
+    # The synthetic events are random problems across the fleet, not storms with a shared cause
+    os.environ.setdefault('StormThreshold', '0')
+    if LAMBDA_FUNCTION_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_FUNCTION_DIR)
+
+def source_server_item(account, region, sourceserverid, state='READY_FOR_TEST'):
+    """
+    :return source server item as returned by MGN describe_source_servers
+    """
+    return {
+        'arn': 'arn:aws:mgn:{}:{}:source-server/{}'.format(region, account, sourceserverid),
+        'sourceServerID': sourceserverid,
+        'lifeCycle': {'state': state},
+        'sourceProperties': {
+            'identificationHints': {'fqdn': sourceserverid + '.corp.example.com', 'hostname': sourceserverid}
+        }
+    }
+
+def default_response(service, operation, params, region, account=None):
+    """
+    :param service: AWS service name
+    :param operation: API operation name
+    :param params: API parameters of the call
+    :param region: AWS region of the client
+    :param account: target account of clients created from AssumeRole credentials, None otherwise
+    :return parsed response for the operation
+    """
+    if operation == 'AssumeRole':
+        account = params['RoleArn'].split(':')[4]
+        return {
+            'Credentials': {
+                'AccessKeyId': 'ASIA' + account,
+                'SecretAccessKey': 'benchmark',
+                'SessionToken': 'benchmark',
+                'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)
+            }
+        }
+    if operation == 'DescribeSourceServers':
+        sourceserverids = params.get('filters', {}).get('sourceServerIDs', [])
+        return {'items': [source_server_item('000000000000', region, sourceserverid) for sourceserverid in sourceserverids]}
+    if operation == 'Publish':
+        return {'MessageId': 'benchmark'}
+    if operation == 'PublishBatch':
+        return {'Successful': [{'Id': entry['Id'], 'MessageId': 'benchmark'} for entry in params['PublishBatchRequestEntries']], 'Failed': []}
+    if operation == 'PutLogEvents':
+        return {'rejectedLogEventsInfo': {}}
+    return {}
+
+def encode_cbor_map(values):
+    """
+    :param values: dictionary of short strings
+    :return CBOR encoding of the dictionary, enough for the error bodies of the RPC v2 CBOR protocol
+    """
+    def text(value):
+        value = value.encode('utf-8')
+        return (bytes([0x60 + len(value)]) if len(value) < 24 else bytes([0x78, len(value)])) + value
+    return bytes([0xa0 + len(values)]) + b''.join(text(key) + text(value) for key, value in values.items())
+
+def response_body(model, error_code=None):
+    """
+    :param model: botocore operation model of the call
+    :param error_code: error code of an error response, None for an empty successful response
+    :return (headers, body) of the HTTP response in the protocol of the service
+    """
+    # The protocol the client picked among those of the service, on recent botocore versions
+    protocol = getattr(model.service_model, 'resolved_protocol', None) or model.service_model.protocol
+    if protocol == 'query':
+        if error_code is not None:
+            return {}, '<ErrorResponse><Error><Type>Sender</Type><Code>{}</Code><Message>Rate exceeded</Message></Error></ErrorResponse>'.format(error_code).encode('utf-8')
+        wrapper = model.output_shape.serialization.get('resultWrapper') if model.output_shape is not None else None
+        inner = '<{}/>'.format(wrapper) if wrapper else ''
+        return {}, '<{0}Response>{1}</{0}Response>'.format(model.name, inner).encode('utf-8')
+    if protocol == 'smithy-rpc-v2-cbor':
+        headers = {'smithy-protocol': 'rpc-v2-cbor'}
+        if error_code is not None:
+            return headers, encode_cbor_map({'__type': error_code, 'message': 'Rate exceeded'})
+        return headers, encode_cbor_map({})
+    if protocol == 'rest-xml':
+        if error_code is not None:
+            return {}, '<Error><Code>{}</Code><Message>Rate exceeded</Message></Error>'.format(error_code).encode('utf-8')
+        return {}, b''
+    if error_code is not None:
+        return {'x-amzn-errortype': error_code}, json.dumps({'__type': error_code, 'message': 'Rate exceeded'}).encode('utf-8')
+    return {}, b'{}'
+
+class RawBody:
+    """
+    Raw HTTP body of a stand-in response
+    """
+
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+def assumed_account(request_signer):
+    """
+    :param request_signer: botocore request signer of the client making the call
+    :return account encoded by default_response in the AssumeRole access key, or None
+    """
+    credentials = getattr(request_signer, '_credentials', None)
+    access_key = getattr(credentials, 'access_key', None) or ''
+    if access_key.startswith('ASIA') and len(access_key) == 16:
+        return access_key[4:]
+    return None
+
+class StubbedAWS:
+    """
+    Answers every API call made through client_factory with a canned response and counts the calls.
+    Each operation can be given a latency, and a share of the calls can be throttled.
+    """
+
+    def __init__(self, respond=default_response, latency_ms=None, throttle_rate=0.0, seed=0):
+        """
+        :param respond: function(service, operation, params, region, account) returning the parsed response
+        :param latency_ms: dictionary of operation name (or '*' for all) to simulated latency in milliseconds
+        :param throttle_rate: share of the calls answered with a ThrottlingException, between 0 and 1
+        :param seed: seed of the throttling random generator
+        """
+        import random
+        self.respond = respond
+        self.latency_ms = latency_ms or {}
+        self.throttle_rate = throttle_rate
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.call_ms = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def install(self):
+        """
+        Registers the stand-ins on the shared session, must run before the first client is created
+        :return self
+        """
+        import client_factory
+        events = client_factory.get_session().events
+        events.register('before-parameter-build', self._capture_params)
+        events.register('before-call', self._capture_call)
+        events.register('before-send', self._answer)
+        events.register('after-call', self._fill_response)
+        return self
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.throttles.clear()
+            self.call_ms = {}
+
+    def _capture_params(self, params, model, context, **kwargs):
+        context['stub_params'] = dict(params)
+
+    def _capture_call(self, model, request_signer, context, **kwargs):
+        context['stub_call'] = (model, request_signer.region_name, assumed_account(request_signer))
+
+    def _answer(self, request, **kwargs):
+        """
+        Answers every attempt of a call, the throttled attempts are retried by the SDK like real ones
+        :return AWSResponse
+        """
+        from botocore.awsrequest import AWSResponse
+        context = request.context
+        model, region, account = context['stub_call']
+        service = model.service_model.service_name
+        operation = model.name
+        latency = self.latency_ms.get(operation, self.latency_ms.get('*', 0))
+        if latency:
+            time.sleep(latency / 1000.0)
+        with self._lock:
+            self.calls[(service, operation)] += 1
+            self.call_ms.setdefault(operation, []).append(latency)
+            throttled = self.throttle_rate > 0 and self._random.random() < self.throttle_rate
+            if throttled:
+                self.throttles[(service, operation)] += 1
+        if throttled:
+            headers, body = response_body(model, 'ThrottlingException')
+            return AWSResponse(request.url, 400, headers, RawBody(body))
+        # The response is parsed from an empty body and completed with the canned response after the call
+        context['stub_response'] = self.respond(service, operation, context.get('stub_params', {}), region, account)
+        headers, body = response_body(model)
+        return AWSResponse(request.url, 200, headers, RawBody(body))
+
+    def _fill_response(self, parsed, context, **kwargs):
+        stub_response = context.pop('stub_response', None)
+        if stub_response is not None and 'Error' not in parsed:
+            parsed.update(stub_response)
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
@@ -20,6 +20,12 @@
 
 bucket=$1
 
+aws cloudformation package --template-file 'target_account/target_account_monitoring_resources.yaml' \
+--s3-bucket $bucket \
+--output-template-file 'target_account/target_account_monitoring_resources_packaged.yaml'
+
+aws s3 cp target_account/target_account_monitoring_resources_packaged.yaml s3://$bucket/
+
 aws cloudformation package --template-file 'central_account/central_account_monitoring_resources.yaml' \
 --s3-bucket $bucket \
 --output-template-file 'central_account/central_account_monitoring_resources_packaged.yaml'
@@ -0,0 +1,93 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Circuit breaker for the target accounts. When the monitoring role of an account is missing or
+# denies access, every further event of that account fails fast for a while instead of calling
+# assume_role again, then a single trial call decides whether the circuit closes.
+
+import threading
+import time
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a target account whose circuit is open
+    """
+
+class CircuitBreaker:
+    """
+    Thread safe circuit breaker keyed by target account. The circuit opens after failure_threshold
+    consecutive failures, stays open for open_seconds and is then half open: one caller is let
+    through, and its success closes the circuit while its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, open_seconds):
+        """
+        :param failure_threshold: consecutive failures opening the circuit
+        :param open_seconds: time in seconds calls fail fast once the circuit is open
+        """
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def check(self, key):
+        """
+        :param key: circuit key, the target account
+        :return : None, raises CircuitOpenError when the call must not be made
+        """
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit['opened_at'] is None:
+                return
+            now = time.monotonic()
+            if now - circuit['opened_at'] < self.open_seconds:
+                raise CircuitOpenError('Circuit open for {} after {} failures: {}'.format(key, circuit['failures'], circuit['error']))
+            # Half open, this caller makes the trial call while the others keep failing fast
+            circuit['opened_at'] = now
+
+    def record_success(self, key):
+        """
+        :param key: circuit key
+        :return : None
+        """
+        with self._lock:
+            self._circuits.pop(key, None)
+
+    def record_failure(self, key, error):
+        """
+        :param key: circuit key
+        :param error: error of the failed call, reported while the circuit is open
+        :return opened: True when this failure opened the closed circuit, False when it was already open
+        """
+        with self._lock:
+            circuit = self._circuits.setdefault(key, {'failures': 0, 'opened_at': None, 'error': None})
+            circuit['failures'] += 1
+            circuit['error'] = str(error)
+            if circuit['opened_at'] is not None:
+                # A failed trial call, or a call started before the circuit opened, keeps it open
+                circuit['opened_at'] = time.monotonic()
+                return False
+            if circuit['failures'] >= self.failure_threshold:
+                circuit['opened_at'] = time.monotonic()
+                return True
+            return False
+
+    def is_open(self, key):
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit is not None and circuit['opened_at'] is not None
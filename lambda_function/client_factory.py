@@ -0,0 +1,106 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# boto3 is imported on first use so that events failing validation, and a cold start that
+# never reaches a remote call, do not pay for loading it.
+
+import metrics
+import os
+import rate_limiter
+import threading
+
+session = None
+client_config = None
+clients = {}
+_lock = threading.Lock()
+
+def get_session():
+    """
+    :return boto3 Session shared by every client of the container
+    """
+    global session
+    if session is None:
+        with _lock:
+            if session is None:
+                import boto3.session
+                session = boto3.session.Session()
+                # Counts retried attempts and throttled responses of every client created from the session
+                session.events.register('response-received', metrics.observe_response)
+    return session
+
+def get_client_config():
+    """
+    :return botocore Config with connection reuse, retry mode and timeouts tuned for the Lambda function
+
+    The SDK retries are the only retry layer of the function, they retry throttled and transient
+    errors with jittered exponential backoff. The calls are already paced by the token buckets of
+    rate_limiter, the adaptive mode also slows a client down while it is throttled.
+    """
+    global client_config
+    if client_config is None:
+        from botocore.config import Config
+        client_config = Config(
+            connect_timeout=int(os.environ.get('ClientConnectTimeout', 2)),
+            read_timeout=int(os.environ.get('ClientReadTimeout', 10)),
+            max_pool_connections=int(os.environ.get('ClientMaxPoolConnections', 50)),
+            tcp_keepalive=True,
+            retries={
+                'mode': os.environ.get('ClientRetryMode', 'standard'),
+                'total_max_attempts': int(os.environ.get('ClientMaxAttempts', 5))
+            }
+        )
+    return client_config
+
+def get_client(service, region_name=None):
+    """
+    :param service: AWS service name
+    :param region_name: AWS region, defaults to the region of the function
+    :return client: shared client for the service and region, created on first use
+    """
+    key = (service, region_name)
+    client = clients.get(key)
+    if client is None:
+        current_session = get_session()
+        with _lock:
+            client = clients.get(key)
+            if client is None:
+                client = current_session.client(service, region_name=region_name, config=get_client_config())
+                rate_limiter.register(client)
+                clients[key] = client
+    return client
+
+def create_client(service, region_name, credentials, account=None):
+    """
+    :param service: AWS service name
+    :param region_name: AWS region
+    :param credentials: Credentials dictionary returned by sts assume_role
+    :param account: account of the credentials, calls are rate limited per account
+    :return client: new client using the temporary credentials, cached by the caller
+    """
+    current_session = get_session()
+    with _lock:
+        client = current_session.client(
+            service,
+            aws_access_key_id=credentials['AccessKeyId'],
+            aws_secret_access_key=credentials['SecretAccessKey'],
+            aws_session_token=credentials['SessionToken'],
+            region_name=region_name,
+            config=get_client_config()
+        )
+    rate_limiter.register(client, account)
+    return client
@@ -0,0 +1,438 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Delivery of ProcessedEvents to the configured sinks. Events are queued in every sink while an
+# invocation or batch is handled, and flush delivers them to all sinks concurrently. Every sink has
+# its own timeout and its failures are reported without affecting the other sinks.
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+import client_factory
+import event_history
+import json
+import message_templates
+import metrics
+import os
+import threading
+import time
+import utils
+import uuid
+
+# EventBridge PutEvents accepts at most 10 entries per call
+MAX_PUT_EVENTS_ENTRIES = 10
+
+class Sink:
+    """
+    A destination of ProcessedEvents. deliver only queues the event, the remote calls are made by
+    flush, which the DeliveryPipeline runs concurrently with the other sinks.
+    """
+
+    name = None
+    # Sinks receiving only the events whose processor notifies, like SNS, instead of every event
+    notifications_only = False
+    # A failure of a sink that is not required is logged and counted, the events are not retried for it
+    required = True
+
+    def __init__(self, timeout_seconds):
+        """
+        :param timeout_seconds: time the pipeline waits for flush before reporting the sink as failed
+        """
+        self.timeout_seconds = timeout_seconds
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def deliver(self, processed_event):
+        """
+        :param processed_event: ProcessedEvent queued until the next flush
+        :return : None
+        """
+        with self._lock:
+            self._pending.append(self.prepare(processed_event))
+
+    def prepare(self, processed_event):
+        """
+        :param processed_event: ProcessedEvent to queue
+        :return record queued for flush, formatted once when the event is delivered
+        """
+        return processed_event
+
+    def drain(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        return pending
+
+    def flush(self):
+        """
+        :return responses of the remote calls
+        """
+        raise NotImplementedError
+
+class LogSink(Sink):
+    """
+    Writes every event to the events log group through utils.log_buffer
+    """
+
+    name = 'logs'
+
+    def deliver(self, processed_event):
+        utils.write_to_cw_logs(processed_event)
+
+    def flush(self):
+        return utils.flush_log_events()
+
+class SnsSink(Sink):
+    """
+    Publishes notifications to the SNS topic, combined and flap suppressed by utils.digest
+    """
+
+    name = 'sns'
+    notifications_only = True
+
+    def deliver(self, processed_event):
+        utils.publish_event_to_sns_topic(processed_event)
+
+    def flush(self):
+        return utils.flush_notifications()
+
+class WebhookSink(Sink):
+    """
+    Posts notifications as one JSON document per flush to WebhookUrl. The text field carries one
+    line per event, the format accepted by Slack and Amazon Chime incoming webhooks.
+    """
+
+    name = 'webhook'
+    notifications_only = True
+
+    def __init__(self, timeout_seconds, url=None):
+        super().__init__(timeout_seconds)
+        self.url = url or os.environ.get('WebhookUrl')
+        self.renderer = message_templates.MessageRenderer(message_templates.WEBHOOK_TEMPLATES, message_templates.WEBHOOK_RECOVERY_TEMPLATES)
+
+    def prepare(self, processed_event):
+        return {
+            'text': self.renderer.render(processed_event),
+            'event': processed_event.get_event_attributes()
+        }
+
+    def flush(self):
+        records = self.drain()
+        if not records:
+            return []
+        # Imported on first use, it is only needed when the webhook sink is configured
+        import urllib.request
+        body = json.dumps({
+            'text': '\n'.join(record['text'] for record in records),
+            'events': [record['event'] for record in records]
+        }, default=str).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+            return [response.status]
+
+class EventBridgeSink(Sink):
+    """
+    Re-publishes every event to EventBridgeBusName, so other rules and targets can consume them
+    """
+
+    name = 'eventbridge'
+
+    def __init__(self, timeout_seconds, bus_name=None, source=None):
+        super().__init__(timeout_seconds)
+        self.bus_name = bus_name or os.environ.get('EventBridgeBusName', 'default')
+        self.source = source or os.environ.get('EventBridgeSource', 'mgn.monitoring')
+
+    def prepare(self, processed_event):
+        return {
+            'Source': self.source,
+            'DetailType': processed_event.get_event_type(),
+            'Detail': processed_event.to_json(),
+            'EventBusName': self.bus_name
+        }
+
+    def flush(self):
+        entries = self.drain()
+        responses = []
+        failed = 0
+        for start in range(0, len(entries), MAX_PUT_EVENTS_ENTRIES):
+            response = client_factory.get_client('events').put_events(
+                Entries=entries[start:start + MAX_PUT_EVENTS_ENTRIES]
+            )
+            failed += response.get('FailedEntryCount', 0)
+            responses.append(response)
+        if failed:
+            raise RuntimeError('Failed to put {} events to EventBridge bus {}'.format(failed, self.bus_name))
+        return responses
+
+class S3ArchiveSink(Sink):
+    """
+    Archives every event as one JSON lines object per flush under ArchivePrefix in ArchiveBucket
+    """
+
+    name = 's3'
+
+    def __init__(self, timeout_seconds, bucket=None, prefix=None):
+        super().__init__(timeout_seconds)
+        self.bucket = bucket or os.environ.get('ArchiveBucket')
+        self.prefix = prefix if prefix is not None else os.environ.get('ArchivePrefix', 'mgn-events/')
+
+    def prepare(self, processed_event):
+        return processed_event.to_json()
+
+    def flush(self):
+        lines = self.drain()
+        if not lines:
+            return []
+        key = '{}{}/{}.jsonl'.format(self.prefix, datetime.now(timezone.utc).strftime('%Y/%m/%d/%H'), uuid.uuid4())
+        return [client_factory.get_client('s3').put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body='\n'.join(lines).encode('utf-8'),
+            ContentType='application/x-ndjson'
+        )]
+
+class HistorySink(Sink):
+    """
+    Appends every event to the event history selected with EventHistoryStore, which maintains the
+    stall and lag episodes. The sink is disabled, and drops the events, when EventHistoryPath is not
+    set: a file in the /tmp folder of a container would be lost when the container is recycled.
+    """
+
+    name = 'history'
+
+    def __init__(self, timeout_seconds, store=None):
+        super().__init__(timeout_seconds)
+        self.store = store
+        self.disabled = False
+
+    def flush(self):
+        processed_events = self.drain()
+        if not processed_events or self.disabled:
+            return []
+        if self.store is None:
+            location = os.environ.get('EventHistoryPath')
+            if not location:
+                self.disabled = True
+                utils.logger.warning('The history sink is disabled, EventHistoryPath must name a store shared by every container')
+                return []
+            self.store = event_history.create_store(os.environ.get('EventHistoryStore', 'local'), location)
+        self.store.append(processed_events)
+        return [len(processed_events)]
+
+class SnapshotSink(Sink):
+    """
+    Applies the lifecycle, stalled and sweep events to the fleet status snapshot in SnapshotLocation.
+    The events are collected and applied at most every SnapshotSinkIntervalSeconds, with one read
+    and conditional write of the stored snapshot. The sink is best effort: when the write fails the
+    events are kept for the next write, and the scheduled rebuild corrects what is lost. The sink is
+    disabled, and drops the events, when SnapshotLocation is not an s3:// location.
+    """
+
+    name = 'snapshot'
+
+    def __init__(self, timeout_seconds, store=None, interval_seconds=None, max_events=None):
+        super().__init__(timeout_seconds)
+        self.store = store
+        self.disabled = False
+        self.interval_seconds = interval_seconds if interval_seconds is not None else float(os.environ.get('SnapshotSinkIntervalSeconds', 60))
+        self.max_events = max_events if max_events is not None else int(os.environ.get('SnapshotSinkMaxEvents', 10000))
+        self._unwritten = []
+        self._written_at = None
+
+    def flush(self):
+        processed_events = self.drain()
+        if self.disabled:
+            return []
+        self._unwritten.extend(processed_events)
+        if not self._unwritten:
+            return []
+        if len(self._unwritten) > self.max_events:
+            metrics.increment('snapshot_sink_dropped_events', len(self._unwritten) - self.max_events)
+            del self._unwritten[:len(self._unwritten) - self.max_events]
+        now = time.monotonic()
+        if self._written_at is not None and now - self._written_at < self.interval_seconds:
+            return []
+        if self.store is None:
+            # Imported here so that containers without the snapshot sink do not load it
+            import fleet_snapshot
+            self.store = fleet_snapshot.default_store()
+            if self.store is None:
+                self.disabled = True
+                self._unwritten = []
+                utils.logger.warning('The snapshot sink is disabled, SnapshotLocation must be an s3:// location shared by every container')
+                return []
+        try:
+            changed = self.store.update(self._unwritten)
+        except Exception as err:
+            metrics.increment('snapshot_sink_failures')
+            utils.logger.warning('Unable to update the fleet snapshot, {} events are kept for the next write: {}'.format(len(self._unwritten), err))
+            return []
+        self._unwritten = []
+        self._written_at = now
+        return [changed]
+
+SINK_TYPES = {sink_type.name: sink_type for sink_type in [LogSink, SnsSink, WebhookSink, EventBridgeSink, S3ArchiveSink, HistorySink, SnapshotSink]}
+
+def parse_sink_timeouts(value):
+    """
+    :param value: comma separated sink=seconds pairs
+    :return dictionary of timeouts in seconds keyed by sink name
+    """
+    timeouts = {}
+    for entry in value.split(','):
+        if entry.strip():
+            name, seconds = entry.split('=')
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+def configured_sinks():
+    """
+    :return list of the sinks named in DeliverySinks, only those also named in RequiredSinks are required
+    """
+    default_timeout = float(os.environ.get('SinkTimeoutSeconds', 10))
+    timeouts = parse_sink_timeouts(os.environ.get('SinkTimeouts', ''))
+    required = {name.strip().lower() for name in os.environ.get('RequiredSinks', 'logs,sns').split(',')}
+    sinks = []
+    for name in os.environ.get('DeliverySinks', 'logs,sns').split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in SINK_TYPES:
+            raise ValueError('Unknown delivery sink {}, expected one of {}'.format(name, ', '.join(SINK_TYPES)))
+        sink = SINK_TYPES[name](timeouts.get(name, default_timeout))
+        sink.required = name in required
+        sinks.append(sink)
+    return sinks
+
+class DeliveryPipeline:
+    """
+    Delivers ProcessedEvents to every sink and flushes the sinks concurrently. Only the failures of the
+    required sinks are reported: retrying the events for a best effort sink would deliver them again
+    through every other sink, publishing the notifications twice.
+    """
+
+    def __init__(self, sinks):
+        """
+        :param sinks: list of Sink instances
+        """
+        self.sinks = sinks
+        self._executor = None
+        self._running = {}
+        self._origins = {}
+        self._failed_origins = set()
+
+    def deliver(self, processed_event, notify=True, origin=None):
+        """
+        :param processed_event: ProcessedEvent to deliver
+        :param notify: False for events that are only recorded, they skip the notifications_only sinks
+        :param origin: identifier of the message the event comes from, returned by flush_with_origins when a sink fails
+        :return failures: dictionary of error messages keyed by the name of the sinks that failed to queue the event
+        """
+        failures = {}
+        for sink in self.sinks:
+            if sink.notifications_only and not notify:
+                continue
+            try:
+                sink.deliver(processed_event)
+                self._origins.setdefault(sink.name, set()).add(origin)
+            except Exception as err:
+                if not sink.required:
+                    metrics.increment('sink_best_effort_failures')
+                    utils.logger.warning('Unable to deliver the event to the best effort {} sink: {}'.format(sink.name, err))
+                    continue
+                utils.logger.error('Unable to deliver the event to the {} sink: {}'.format(sink.name, err))
+                failures[sink.name] = str(err)
+                self._failed_origins.add(origin)
+        return failures
+
+    def _flush_sink(self, sink):
+        with metrics.timer('sink_' + sink.name):
+            return sink.flush()
+
+    def flush(self):
+        """
+        Flushes every sink concurrently and waits at most the timeout of each sink
+        :return failures: dictionary of error messages keyed by the name of the required sinks that failed or timed out
+        """
+        return self.flush_with_origins()[0]
+
+    def flush_with_origins(self):
+        """
+        Flushes every sink like flush and tells which messages were not delivered
+        :return (failures, failed_origins): the failures returned by flush and the set of origins of the events
+                 queued in the failed sinks or that could not be queued, None stands for events delivered without origin
+        """
+        origins = self._origins
+        failed_origins = self._failed_origins
+        self._origins = {}
+        self._failed_origins = set()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.sinks)), thread_name_prefix='sink')
+        failures = {}
+        futures = []
+        for sink in self.sinks:
+            running = self._running.get(sink.name)
+            if running is not None and not running.done():
+                # A flush that timed out earlier still owns the sink, its events stay queued
+                failures[sink.name] = 'previous flush still running'
+                continue
+            future = self._executor.submit(self._flush_sink, sink)
+            self._running[sink.name] = future
+            futures.append((sink, future))
+
+        started = time.monotonic()
+        for sink, future in futures:
+            try:
+                future.result(timeout=max(0, sink.timeout_seconds - (time.monotonic() - started)))
+            except FutureTimeoutError:
+                failures[sink.name] = 'timed out after {} seconds'.format(sink.timeout_seconds)
+            except Exception as err:
+                failures[sink.name] = str(err)
+        required = {sink.name for sink in self.sinks if sink.required}
+        for name, error in list(failures.items()):
+            if name not in required:
+                del failures[name]
+                metrics.increment('sink_best_effort_failures')
+                utils.logger.warning('Delivery to the best effort {} sink failed: {}'.format(name, error))
+                continue
+            metrics.increment('sink_failures')
+            utils.logger.error('Delivery to the {} sink failed: {}'.format(name, error))
+            failed_origins.update(origins.get(name, ()))
+        return failures, failed_origins
+
+pipeline = DeliveryPipeline(configured_sinks())
+
+def deliver(processed_event, notify=True, origin=None):
+    """
+    :param processed_event: ProcessedEvent delivered to the configured sinks
+    :param notify: False for events that are only recorded
+    :param origin: identifier of the message the event comes from, such as the SQS message id
+    :return failures: dictionary of error messages keyed by sink name
+    """
+    return pipeline.deliver(processed_event, notify, origin)
+
+def flush():
+    """
+    :return failures: dictionary of error messages keyed by the name of the sinks that failed
+    """
+    return pipeline.flush()
+
+def flush_with_origins():
+    """
+    :return (failures, failed_origins): dictionary of error messages keyed by sink name and the origins of the undelivered events
+    """
+    return pipeline.flush_with_origins()
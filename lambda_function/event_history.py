@@ -0,0 +1,335 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Append-only history of processed events. Stall and lag episodes are opened and closed as the
+# matching problem and recovery events arrive, and their durations are added to daily aggregates
+# per account, so MTTR and worst account queries read a handful of aggregate rows instead of
+# scanning the events.
+
+import argparse
+from datetime import datetime, timezone
+import json
+import sys
+import threading
+
+# Episode kinds, keyed by a marker contained in the event type
+EPISODE_KINDS = [
+    ('Stalled', 'stall'),
+    ('LagDuration', 'lag'),
+]
+STALLED_STATE = 'STALLED'
+FORECAST_MARKER = 'Forecast'
+ALARM_STATE = 'ALARM'
+OK_STATE = 'OK'
+
+def parse_time(time_stamp):
+    """
+    :param time_stamp: ISO 8601 time stamp of an event, Z suffix accepted
+    :return datetime in UTC
+    """
+    parsed = datetime.fromisoformat(str(time_stamp).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def episode_transition(processed_event):
+    """
+    :param processed_event: ProcessedEvent
+    :return (kind, opens): the episode kind and True when the event opens an episode, False when it
+    closes one, or None when the event does not change an episode
+    """
+    event_type = processed_event.get_event_type()
+    if FORECAST_MARKER in event_type:
+        # Predicted breaches have not happened yet
+        return None
+    for marker, kind in EPISODE_KINDS:
+        if marker in event_type:
+            break
+    else:
+        return None
+    if processed_event.is_recovery():
+        # Recoveries of stalls, alarms and sweep breaches
+        return kind, False
+    state = (processed_event.get_event_detail() or {}).get('state')
+    if isinstance(state, dict):
+        # CloudWatch alarm events carry the alarm state as {"value": ...}
+        state = state.get('value')
+        if state == ALARM_STATE:
+            return kind, True
+        if state == OK_STATE:
+            return kind, False
+        return None
+    if kind == 'stall':
+        return kind, state == STALLED_STATE
+    # Lag events of the replication sweep are emitted while the threshold is breached, their end as a recovery
+    return kind, True
+
+class EventHistoryStore:
+    """
+    Backend of the event history. Implementations record every event, maintain the episodes and
+    answer the queries from indexes or aggregates.
+    """
+
+    def append(self, processed_events):
+        """
+        :param processed_events: list of ProcessedEvents in arrival order
+        :return : None
+        """
+        raise NotImplementedError
+
+    def server_history(self, source_server_id, since=None, limit=100):
+        """
+        :param source_server_id: MGN source server id
+        :param since: optional datetime of the oldest event
+        :param limit: maximum number of events
+        :return list of event documents, newest first
+        """
+        raise NotImplementedError
+
+    def open_incidents(self, kind=None, account=None, limit=100):
+        """
+        :param kind: optional episode kind, stall or lag
+        :param account: optional account
+        :param limit: maximum number of episodes
+        :return list of open episode dictionaries, oldest first
+        """
+        raise NotImplementedError
+
+    def mttr(self, kind, account=None, since=None, until=None):
+        """
+        :param kind: episode kind, stall or lag
+        :param account: optional account
+        :param since: optional datetime, episodes closed on or after its day
+        :param until: optional datetime, episodes closed on or before its day
+        :return mean time to recovery in seconds, None when no episode closed
+        """
+        raise NotImplementedError
+
+    def worst_accounts(self, kind, since=None, until=None, limit=10):
+        """
+        :param kind: episode kind, stall or lag
+        :return list of (account, episodes, total seconds, mean seconds), longest total first
+        """
+        raise NotImplementedError
+
+class LocalEventHistoryStore(EventHistoryStore):
+    """
+    SQLite backed event history for local runs, replays and single container deployments.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: SQLite database file, created if it does not exist
+        """
+        # Imported here so that containers without a local history do not load sqlite3
+        import sqlite3
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY,
+                    time_stamp TEXT NOT NULL,
+                    account TEXT,
+                    region TEXT,
+                    source_server_id TEXT,
+                    event_type TEXT,
+                    severity TEXT,
+                    document TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS events_by_server ON events (source_server_id, time_stamp);
+                CREATE INDEX IF NOT EXISTS events_by_account ON events (account, time_stamp);
+                CREATE INDEX IF NOT EXISTS events_by_type ON events (event_type, time_stamp);
+                CREATE TABLE IF NOT EXISTS episodes (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    account TEXT,
+                    region TEXT,
+                    source_server_id TEXT,
+                    started_at TEXT NOT NULL,
+                    ended_at TEXT,
+                    duration_seconds REAL
+                );
+                CREATE INDEX IF NOT EXISTS episodes_by_server ON episodes (source_server_id, kind, started_at);
+                CREATE INDEX IF NOT EXISTS open_episodes ON episodes (kind, account, started_at) WHERE ended_at IS NULL;
+                CREATE INDEX IF NOT EXISTS open_episodes_by_server ON episodes (source_server_id, kind) WHERE ended_at IS NULL;
+                CREATE TABLE IF NOT EXISTS episode_stats (
+                    account TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    episodes INTEGER NOT NULL,
+                    total_seconds REAL NOT NULL,
+                    max_seconds REAL NOT NULL,
+                    PRIMARY KEY (account, kind, day)
+                );
+                CREATE INDEX IF NOT EXISTS episode_stats_by_kind ON episode_stats (kind, day);
+            ''')
+
+    def append(self, processed_events):
+        with self._lock, self._connection:
+            for processed_event in processed_events:
+                self._connection.execute(
+                    'INSERT INTO events (time_stamp, account, region, source_server_id, event_type, severity, document) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (str(processed_event.get_time_stamp()), processed_event.get_aws_account_id(), processed_event.get_aws_region(),
+                     processed_event.get_source_server_id(), processed_event.get_event_type(), processed_event.get_event_severity(),
+                     processed_event.to_json())
+                )
+                transition = episode_transition(processed_event)
+                if transition is not None:
+                    self._apply_transition(processed_event, *transition)
+
+    def _apply_transition(self, processed_event, kind, opens):
+        key = (processed_event.get_source_server_id(), kind, processed_event.get_aws_account_id(), processed_event.get_aws_region())
+        row = self._connection.execute(
+            'SELECT id, started_at FROM episodes WHERE source_server_id = ? AND kind = ? AND account = ? AND region = ? AND ended_at IS NULL',
+            key
+        ).fetchone()
+        ended_at = parse_time(processed_event.get_time_stamp())
+        if opens:
+            if row is None:
+                self._connection.execute(
+                    'INSERT INTO episodes (kind, account, region, source_server_id, started_at) VALUES (?, ?, ?, ?, ?)',
+                    (kind, key[2], key[3], key[0], ended_at.isoformat())
+                )
+            return
+        if row is None:
+            return
+        duration = max(0.0, (ended_at - parse_time(row[1])).total_seconds())
+        self._connection.execute(
+            'UPDATE episodes SET ended_at = ?, duration_seconds = ? WHERE id = ?', (ended_at.isoformat(), duration, row[0])
+        )
+        self._connection.execute(
+            '''INSERT INTO episode_stats (account, kind, day, episodes, total_seconds, max_seconds) VALUES (?, ?, ?, 1, ?, ?)
+               ON CONFLICT (account, kind, day) DO UPDATE SET
+                   episodes = episodes + 1,
+                   total_seconds = total_seconds + excluded.total_seconds,
+                   max_seconds = MAX(max_seconds, excluded.max_seconds)''',
+            (key[2], kind, ended_at.date().isoformat(), duration, duration)
+        )
+
+    def server_history(self, source_server_id, since=None, limit=100):
+        query = 'SELECT document FROM events WHERE source_server_id = ?'
+        params = [source_server_id]
+        if since is not None:
+            query += ' AND time_stamp >= ?'
+            params.append(since.isoformat())
+        query += ' ORDER BY time_stamp DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            return [row[0] for row in self._connection.execute(query, params)]
+
+    def open_incidents(self, kind=None, account=None, limit=100):
+        query = 'SELECT kind, account, region, source_server_id, started_at FROM episodes WHERE ended_at IS NULL'
+        params = []
+        if kind is not None:
+            query += ' AND kind = ?'
+            params.append(kind)
+        if account is not None:
+            query += ' AND account = ?'
+            params.append(account)
+        query += ' ORDER BY started_at LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [
+            {'kind': row[0], 'account': row[1], 'region': row[2], 'source_server_id': row[3], 'started_at': row[4]}
+            for row in rows
+        ]
+
+    def _stats_filter(self, kind, account, since, until):
+        query = ' FROM episode_stats WHERE kind = ?'
+        params = [kind]
+        if account is not None:
+            query += ' AND account = ?'
+            params.append(account)
+        if since is not None:
+            query += ' AND day >= ?'
+            params.append(since.date().isoformat())
+        if until is not None:
+            query += ' AND day <= ?'
+            params.append(until.date().isoformat())
+        return query, params
+
+    def mttr(self, kind, account=None, since=None, until=None):
+        query, params = self._stats_filter(kind, account, since, until)
+        with self._lock:
+            total_seconds, episodes = self._connection.execute('SELECT SUM(total_seconds), SUM(episodes)' + query, params).fetchone()
+        if not episodes:
+            return None
+        return total_seconds / episodes
+
+    def worst_accounts(self, kind, since=None, until=None, limit=10):
+        query, params = self._stats_filter(kind, None, since, until)
+        query = 'SELECT account, SUM(episodes), SUM(total_seconds)' + query + ' GROUP BY account ORDER BY SUM(total_seconds) DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [(account, episodes, total_seconds, total_seconds / episodes) for account, episodes, total_seconds in rows]
+
+# Backends selected with the EventHistoryStore environment variable
+HISTORY_BACKENDS = {
+    'local': LocalEventHistoryStore,
+}
+
+def register_backend(name, backend):
+    """
+    :param name: value of EventHistoryStore selecting the backend
+    :param backend: EventHistoryStore subclass, constructed with the EventHistoryPath value
+    :return : None
+    """
+    HISTORY_BACKENDS[name] = backend
+
+def create_store(name, location):
+    """
+    :param name: backend name
+    :param location: path or resource name passed to the backend
+    :return EventHistoryStore
+    """
+    if name not in HISTORY_BACKENDS:
+        raise ValueError('Unknown event history store {}, expected one of {}'.format(name, ', '.join(HISTORY_BACKENDS)))
+    return HISTORY_BACKENDS[name](location)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Queries a local event history, for example one written by replay.py --history.')
+    parser.add_argument('path', help='SQLite event history file')
+    parser.add_argument('query', choices=['mttr', 'open', 'worst', 'server'], help='query to run')
+    parser.add_argument('--kind', default='stall', help='episode kind, stall or lag')
+    parser.add_argument('--account', help='account of the mttr and open queries')
+    parser.add_argument('--server', help='source server id of the server query')
+    parser.add_argument('--since', type=parse_time, help='ISO 8601 start of the mttr, worst and server queries')
+    parser.add_argument('--until', type=parse_time, help='ISO 8601 end of the mttr and worst queries')
+    parser.add_argument('--limit', type=int, default=20, help='maximum number of rows')
+    args = parser.parse_args(argv)
+
+    store = LocalEventHistoryStore(args.path)
+    if args.query == 'mttr':
+        result = {'kind': args.kind, 'account': args.account, 'mttr_seconds': store.mttr(args.kind, args.account, args.since, args.until)}
+    elif args.query == 'open':
+        result = store.open_incidents(args.kind, args.account, args.limit)
+    elif args.query == 'worst':
+        result = [
+            {'account': account, 'episodes': episodes, 'total_seconds': total_seconds, 'mean_seconds': mean_seconds}
+            for account, episodes, total_seconds, mean_seconds in store.worst_accounts(args.kind, args.since, args.until, args.limit)
+        ]
+    else:
+        result = [json.loads(document) for document in store.server_history(args.server, args.since, args.limit)]
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
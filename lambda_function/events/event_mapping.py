@@ -16,8 +16,19 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
 #########################################################################################
 
+import json
+
+# Version of the JSON document written for every processed event, raised when fields change meaning
+SCHEMA_VERSION = 1
+
 class ProcessedEvent:
-    
+    """
+    An MGN event after processing. The attributes are kept in slots and the JSON document of the
+    event is built once by to_json and cached until an attribute changes.
+    """
+
+    __slots__ = ('aws_account_id', 'aws_region', 'event_type', 'time_stamp', 'source_server_id', 'source_server_fqdn', 'event_severity', 'event_detail', '_json')
+
     def __init__(self, aws_account_id, aws_region, event_type, time_stamp, source_server_id, source_server_fqdn, event_detail, event_severity):
         self.aws_account_id = aws_account_id
         self.aws_region = aws_region
@@ -27,6 +38,18 @@ class ProcessedEvent:
         self.source_server_fqdn = source_server_fqdn
         self.event_severity = event_severity
         self.event_detail = event_detail
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != '_json':
+            object.__setattr__(self, '_json', None)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_json'}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
     
     def set_aws_account_id(self, aws_account_id):
         self.aws_account_id = aws_account_id
@@ -65,7 +88,7 @@ class ProcessedEvent:
         return self.source_server_fqdn
     
     def set_event_severity(self, event_severity):
-        self.severity = event_severity
+        self.event_severity = event_severity
     
     def get_event_severity(self):
         return self.event_severity
@@ -76,6 +99,12 @@ class ProcessedEvent:
     def get_event_detail(self):
         return self.event_detail
 
+    def is_recovery(self):
+        """
+        :return True for events reporting that a problem cleared, such as an alarm returning to OK
+        """
+        return isinstance(self.event_detail, dict) and self.event_detail.get('recovered') is True
+
     def set_event_attributes(self, aws_account_id, aws_region, event_type, time_stamp, source_server_id, source_server_fqdn, event_severity, event_detail):
         self.aws_account_id = aws_account_id
         self.aws_region = aws_region
@@ -83,7 +112,7 @@ class ProcessedEvent:
         self.time_stamp = time_stamp
         self.source_server_id = source_server_id
         self.source_server_fqdn = source_server_fqdn
-        self.severity = event_severity
+        self.event_severity = event_severity
         self.event_detail = event_detail
 
     def get_event_attributes(self):
@@ -98,5 +127,12 @@ class ProcessedEvent:
             "event_detail": self.event_detail
         }
 
-
-
+    def to_json(self):
+        """
+        :return String JSON object of the event attributes and the schema_version, built once per change
+        """
+        if self._json is None:
+            document = {"schema_version": SCHEMA_VERSION}
+            document.update(self.get_event_attributes())
+            object.__setattr__(self, '_json', json.dumps(document, separators=(',', ':'), default=str))
+        return self._json
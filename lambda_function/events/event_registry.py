@@ -0,0 +1,112 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# EventBridge detail-type values mapped to the event type used to look up the processor
+DETAIL_TYPE_DISPATCH = {
+    'MGN Source Server Data Replication Stalled Change': 'Stalled',
+    'MGN Source Server Lifecycle State Change': 'LifecycleStateChange',
+    'MGN Source Server Launch Result': 'LaunchResult',
+}
+
+# CloudWatch alarm metric names mapped to event types
+ALARM_METRIC_DISPATCH = {
+    'LagDuration': 'LagDuration',
+    'ElapsedReplicationDuration': 'ElapsedReplicationDuration',
+}
+
+# CloudTrail event names mapped to event types
+EVENT_NAME_DISPATCH = {
+    'DisconnectFromService': 'DisconnectFromService',
+}
+
+CLOUDWATCH_ALARM_DETAIL_TYPE = 'CloudWatch Alarm State Change'
+
+processors = {}
+
+class EventProcessor:
+    """
+    A registered processor for one event type.
+    """
+
+    def __init__(self, event_type, process, locate_source_server=None, validate=True, notify=True, invalidate_source_server=False):
+        """
+        :param event_type: event type returned by classify_event
+        :param process: function(event, source_server) returning a ProcessedEvent
+        :param locate_source_server: function(event) returning (account, region, source server id), or None when no lookup is required
+        :param validate: skip the event when the source server is in a Testing, Cutover or Disconnected state
+        :param notify: publish the processed event to SNS in addition to logging it
+        :param invalidate_source_server: drop the cached source server record, the event changes its state
+        """
+        self.event_type = event_type
+        self.process = process
+        self.locate_source_server = locate_source_server
+        self.validate = validate
+        self.notify = notify
+        self.invalidate_source_server = invalidate_source_server
+
+def register_processor(event_type, locate_source_server=None, validate=True, notify=True, invalidate_source_server=False):
+    """
+    Decorator registering a processing function for an event type
+    :param event_type: event type returned by classify_event
+    :return decorator
+    """
+    def decorator(process):
+        processors[event_type] = EventProcessor(event_type, process, locate_source_server, validate, notify, invalidate_source_server)
+        return process
+    return decorator
+
+def register_detail_type(detail_type, event_type):
+    """
+    :param detail_type: EventBridge detail-type of a new event
+    :param event_type: event type the detail-type is classified as
+    :return : None
+    """
+    DETAIL_TYPE_DISPATCH[detail_type] = event_type
+
+def classify_event(event):
+    """
+    :param event: event being processed
+    :return String (str) Event Type Name
+    """
+    if 'detail-type' in event:
+        detail_type = event['detail-type']
+        if detail_type == CLOUDWATCH_ALARM_DETAIL_TYPE:
+            try:
+                metric_name = event['detail']['configuration']['metrics'][0]['metricStat']['metric']['name']
+            except (KeyError, IndexError, TypeError):
+                raise ValueError('The Event Received Is Not Parsable')
+            event_type = ALARM_METRIC_DISPATCH.get(metric_name)
+        else:
+            event_type = DETAIL_TYPE_DISPATCH.get(detail_type)
+    elif 'eventName' in event:
+        event_type = EVENT_NAME_DISPATCH.get(event['eventName'])
+    else:
+        raise ValueError('The Event Received Is Not Parsable')
+
+    if event_type is None or event_type not in processors:
+        raise NotImplementedError('Event recieved does not have a processor implemented.')
+    return event_type
+
+def get_processor(event_type):
+    """
+    :param event_type: event type returned by classify_event
+    :return EventProcessor registered for the event type
+    """
+    if event_type not in processors:
+        raise NotImplementedError('Event recieved does not have a processor implemented.')
+    return processors[event_type]
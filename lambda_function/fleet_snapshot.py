@@ -0,0 +1,493 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Fleet migration status snapshot. One row per source server with its lifecycle state, replication
+# state, lag and FQDN, held column by column. The first build pages through describe_source_servers
+# in every target concurrently; after that the snapshot sink applies the Lifecycle State Change,
+# Stalled and sweep events the function already receives, so the snapshot stays current without
+# rescanning the fleet, and a scheduled rebuild replaces the rows of every target it read, which
+# corrects whatever the events missed and drops deleted servers. The snapshot is
+# stored as gzip compressed JSON with conditional writes and exported as CSV or Parquet.
+#
+#   python lambda_function/fleet_snapshot.py build --targets 111111111111:us-east-1 --output fleet.csv
+#   python lambda_function/fleet_snapshot.py export --store s3://bucket/fleet/snapshot.json.gz --output fleet.parquet
+
+import argparse
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from datetime import datetime, timezone
+import gzip
+import io
+import json
+import math
+import os
+import sys
+
+SCHEMA_VERSION = 1
+COLUMNS = ('account', 'region', 'source_server_id', 'fqdn', 'lifecycle_state', 'replication_state', 'lag_seconds', 'updated_at')
+NUMERIC_COLUMNS = ('lag_seconds', 'updated_at')
+LIFECYCLE_MARKER = 'Lifecycle State Change'
+STALLED_MARKER = 'Stalled'
+SWEEP_MARKER = 'Replication Sweep'
+# S3 error codes of a conditional write that lost against another writer
+WRITE_CONFLICT_ERROR_CODES = ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409')
+
+class SnapshotConflictError(RuntimeError):
+    """
+    Raised when the stored snapshot changed under every conditional write attempt
+    """
+
+def epoch_seconds(time_stamp):
+    """
+    :param time_stamp: ISO 8601 time stamp, Z suffix accepted, or datetime
+    :return seconds since the epoch
+    """
+    if not isinstance(time_stamp, datetime):
+        time_stamp = datetime.fromisoformat(str(time_stamp).replace('Z', '+00:00'))
+    if time_stamp.tzinfo is None:
+        time_stamp = time_stamp.replace(tzinfo=timezone.utc)
+    return time_stamp.timestamp()
+
+class FleetSnapshot:
+    """
+    Columnar status table of the fleet. Text columns are lists of interned strings, lag and update
+    time are arrays of doubles with NaN for an unknown lag, and rows are found by (account, region,
+    source server ID). A row only changes for data at least as recent as the row.
+    """
+
+    def __init__(self):
+        self.columns = {name: array('d') if name in NUMERIC_COLUMNS else [] for name in COLUMNS}
+        self._rows = {}
+        # Time of the last full build in epoch seconds, None for a snapshot that was never built
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def upsert(self, account, region, source_server_id, updated_at, **values):
+        """
+        :param updated_at: time of the data in epoch seconds
+        :param values: column values to set, columns not given keep their value
+        :return True when the row was added or changed
+        """
+        key = (account, region, source_server_id)
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._rows)
+            self._rows[key] = row
+            for name, column in self.columns.items():
+                column.append(math.nan if name in NUMERIC_COLUMNS else None)
+            self.columns['account'][row] = sys.intern(account)
+            self.columns['region'][row] = sys.intern(region)
+            self.columns['source_server_id'][row] = source_server_id
+        elif updated_at < self.columns['updated_at'][row]:
+            return False
+        self.columns['updated_at'][row] = updated_at
+        for name, value in values.items():
+            if name in NUMERIC_COLUMNS:
+                self.columns[name][row] = math.nan if value is None else float(value)
+            else:
+                self.columns[name][row] = sys.intern(value) if isinstance(value, str) else value
+        return True
+
+    def apply_event(self, processed_event):
+        """
+        :param processed_event: ProcessedEvent delivered by the function
+        :return True when the event changed the snapshot
+        """
+        event_type = processed_event.get_event_type()
+        detail = processed_event.get_event_detail() or {}
+        if LIFECYCLE_MARKER in event_type:
+            values = {'lifecycle_state': detail.get('state')}
+        elif SWEEP_MARKER in event_type:
+            values = {'lifecycle_state': detail.get('lifecycle_state'), 'replication_state': detail.get('state'), 'lag_seconds': detail.get('lag_seconds')}
+        elif STALLED_MARKER in event_type and isinstance(detail.get('state'), str):
+            values = {'replication_state': detail['state']}
+        else:
+            return False
+        if processed_event.get_server_fqdn():
+            values['fqdn'] = processed_event.get_server_fqdn()
+        return self.upsert(
+            processed_event.get_aws_account_id(), processed_event.get_aws_region(), processed_event.get_source_server_id(),
+            epoch_seconds(processed_event.get_time_stamp()), **values
+        )
+
+    def merge(self, other, rebuilt_targets=()):
+        """
+        Takes every row of other that is at least as recent as the row of this snapshot
+        :param rebuilt_targets: (account, region) pairs this snapshot was built from, the rows of other in these
+                                targets that were not updated since the build are dropped, as the build did not find them
+        :return number of rows added or changed
+        """
+        cutoff = self.built_at
+        if other.built_at is not None and (self.built_at is None or other.built_at > self.built_at):
+            self.built_at = other.built_at
+        changed = 0
+        for record in other.records():
+            account, region, source_server_id, updated_at = record['account'], record['region'], record['source_server_id'], record.pop('updated_at')
+            if cutoff is not None and updated_at < cutoff and (account, region) in rebuilt_targets:
+                continue
+            values = {name: value for name, value in record.items() if name not in ('account', 'region', 'source_server_id')}
+            changed += self.upsert(account, region, source_server_id, updated_at, **values)
+        return changed
+
+    def records(self):
+        """
+        :return generator of one dictionary per row, None for an unknown lag
+        """
+        columns = [self.columns[name] for name in COLUMNS]
+        for row in zip(*columns):
+            record = dict(zip(COLUMNS, row))
+            if math.isnan(record['lag_seconds']):
+                record['lag_seconds'] = None
+            yield record
+
+    def needs_rebuild(self, rebuild_seconds, now):
+        """
+        :param rebuild_seconds: age of the last full build after which the snapshot is rebuilt, 0 never rebuilds
+        :param now: current time in epoch seconds
+        :return True when the snapshot should be built again from the source servers
+        """
+        if rebuild_seconds <= 0:
+            return False
+        return self.built_at is None or now - self.built_at >= rebuild_seconds
+
+    def state_counts(self, column='lifecycle_state'):
+        """
+        :return dictionary of the number of servers per value of the column
+        """
+        counts = {}
+        for value in self.columns[column]:
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def to_document(self):
+        columns = {name: list(self.columns[name]) for name in COLUMNS}
+        columns['lag_seconds'] = [None if math.isnan(lag) else lag for lag in self.columns['lag_seconds']]
+        return {'schema_version': SCHEMA_VERSION, 'built_at': self.built_at, 'columns': columns}
+
+    @classmethod
+    def from_document(cls, document):
+        snapshot = cls()
+        snapshot.built_at = document.get('built_at')
+        columns = document['columns']
+        for row in range(len(columns['source_server_id'])):
+            snapshot.upsert(
+                columns['account'][row], columns['region'][row], columns['source_server_id'][row], columns['updated_at'][row],
+                **{name: columns[name][row] for name in COLUMNS[3:-1]}
+            )
+        return snapshot
+
+    def write_csv(self, output):
+        """
+        :param output: text file object
+        :return : None
+        """
+        writer = csv.writer(output)
+        writer.writerow(COLUMNS)
+        for record in self.records():
+            record['updated_at'] = datetime.fromtimestamp(record['updated_at'], timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            writer.writerow([record[name] for name in COLUMNS])
+
+    def to_parquet(self):
+        """
+        :return Parquet file content as bytes, requires pyarrow
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet export requires pyarrow, export as CSV instead or install pyarrow.')
+        columns = self.to_document()['columns']
+        columns['updated_at'] = [datetime.fromtimestamp(updated_at, timezone.utc) for updated_at in columns['updated_at']]
+        output = pyarrow.BufferOutputStream()
+        pyarrow.parquet.write_table(pyarrow.table(columns), output, compression='snappy')
+        return output.getvalue().to_pybytes()
+
+    def export(self, location):
+        """
+        :param location: local path or s3://bucket/key, ending in .parquet for Parquet and CSV otherwise
+        :return : None
+        """
+        if location.endswith('.parquet'):
+            body = self.to_parquet()
+        else:
+            text = io.StringIO()
+            self.write_csv(text)
+            body = text.getvalue().encode('utf-8')
+        write_location(location, body)
+
+def read_location(location):
+    """
+    :param location: local path or s3://bucket/key
+    :return content as bytes, or None when it does not exist
+    """
+    return read_versioned_location(location)[0]
+
+def read_versioned_location(location):
+    """
+    :param location: local path or s3://bucket/key
+    :return (content, version): content as bytes and its S3 ETag or local modification time, (None, None) when it does not exist
+    """
+    if location.startswith('s3://'):
+        import botocore.exceptions
+        import client_factory
+        bucket, _, key = location[len('s3://'):].partition('/')
+        try:
+            response = client_factory.get_client('s3').get_object(Bucket=bucket, Key=key)
+        except botocore.exceptions.ClientError as err:
+            if err.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None, None
+            raise err
+        return response['Body'].read(), response['ETag']
+    if not os.path.exists(location):
+        return None, None
+    with open(location, 'rb') as stored:
+        return stored.read(), local_version(location)
+
+def local_version(location):
+    """
+    :return modification time and size of a local file, or None when it does not exist
+    """
+    try:
+        status = os.stat(location)
+    except FileNotFoundError:
+        return None
+    return '{}:{}'.format(status.st_mtime_ns, status.st_size)
+
+def write_location(location, body):
+    """
+    :param location: local path or s3://bucket/key
+    :param body: content as bytes
+    :return : None
+    """
+    if location.startswith('s3://'):
+        import client_factory
+        bucket, _, key = location[len('s3://'):].partition('/')
+        client_factory.get_client('s3').put_object(Bucket=bucket, Key=key, Body=body)
+        return
+    with open(location, 'wb') as stored:
+        stored.write(body)
+
+def write_location_if(location, body, expected_version):
+    """
+    Writes the content only if the stored content is still the one that was read. On S3 the write is
+    conditional on the ETag; a local file is compared before it is replaced, which is only safe for a
+    single writer such as the command line.
+    :param location: local path or s3://bucket/key
+    :param body: content as bytes
+    :param expected_version: version returned by read_versioned_location, None when nothing was stored
+    :return True when written, False when the stored content changed in the meantime
+    """
+    if location.startswith('s3://'):
+        import botocore.exceptions
+        import client_factory
+        bucket, _, key = location[len('s3://'):].partition('/')
+        condition = {'IfMatch': expected_version} if expected_version is not None else {'IfNoneMatch': '*'}
+        try:
+            client_factory.get_client('s3').put_object(Bucket=bucket, Key=key, Body=body, **condition)
+        except botocore.exceptions.ClientError as err:
+            if err.response['Error']['Code'] in WRITE_CONFLICT_ERROR_CODES:
+                return False
+            raise err
+        return True
+    if local_version(location) != expected_version:
+        return False
+    temporary = '{}.{}.tmp'.format(location, os.getpid())
+    with open(temporary, 'wb') as stored:
+        stored.write(body)
+    os.replace(temporary, location)
+    return True
+
+class SnapshotStore:
+    """
+    Stored snapshot shared by the containers of the function. Every write is conditional on the
+    version that was read: when another container stored the snapshot in the meantime, the stored
+    snapshot is read again and the changes are applied to it, so no update is lost.
+    """
+
+    def __init__(self, location, write_attempts=None):
+        """
+        :param location: local path or s3://bucket/key of the gzip compressed JSON snapshot
+        :param write_attempts: conditional writes attempted before SnapshotConflictError is raised
+        """
+        self.location = location
+        self.write_attempts = write_attempts if write_attempts is not None else int(os.environ.get('SnapshotWriteAttempts', 5))
+
+    def load(self):
+        """
+        :return FleetSnapshot, or None when no snapshot was stored yet
+        """
+        return self._load()[0]
+
+    def _load(self):
+        body, version = read_versioned_location(self.location)
+        if body is None:
+            return None, None
+        return FleetSnapshot.from_document(json.loads(gzip.decompress(body))), version
+
+    def save(self, snapshot, rebuilt_targets=()):
+        """
+        :param snapshot: FleetSnapshot to store, merged with the stored snapshot
+        :param rebuilt_targets: (account, region) pairs the snapshot was built from, whose stored rows it replaces
+        :return snapshot: the stored FleetSnapshot
+        """
+        rebuilt_targets = set(rebuilt_targets)
+        for _ in range(max(1, self.write_attempts)):
+            stored, version = self._load()
+            if stored is not None:
+                snapshot.merge(stored, rebuilt_targets)
+            if self._write(snapshot, version):
+                return snapshot
+        raise SnapshotConflictError('The snapshot {} changed during {} write attempts'.format(self.location, self.write_attempts))
+
+    def update(self, processed_events):
+        """
+        :param processed_events: list of ProcessedEvents
+        :return number of rows changed, the snapshot is only stored when a row changed
+        """
+        for _ in range(max(1, self.write_attempts)):
+            snapshot, version = self._load()
+            if snapshot is None:
+                # There is nothing to update before the first build
+                return 0
+            changed = sum(snapshot.apply_event(processed_event) for processed_event in processed_events)
+            if not changed or self._write(snapshot, version):
+                return changed
+        raise SnapshotConflictError('The snapshot {} changed during {} write attempts'.format(self.location, self.write_attempts))
+
+    def _write(self, snapshot, version):
+        """
+        :return True when stored, False when another writer stored the snapshot since it was read
+        """
+        import metrics
+        document = snapshot.to_document()
+        document['saved_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if write_location_if(self.location, gzip.compress(json.dumps(document, separators=(',', ':')).encode('utf-8')), version):
+            return True
+        metrics.increment('snapshot_write_conflicts')
+        return False
+
+def default_store():
+    """
+    :return SnapshotStore of SnapshotLocation, or None when it is not an s3:// location. The /tmp
+             directory of a Lambda container is not shared, a snapshot stored there would only see
+             the events of that container.
+    """
+    location = os.environ.get('SnapshotLocation', '')
+    if not location.startswith('s3://'):
+        return None
+    return SnapshotStore(location)
+
+def snapshot_target(account, region, now):
+    """
+    :param account: target account
+    :param region: target region
+    :param now: time of the build
+    :return rows: list of (source server ID, column values) of every source server of the target
+    """
+    import metrics
+    import replication_sweep
+    import utils
+    client = utils.get_mgn_client(account, region)
+    rows = []
+    with metrics.timer('describe_source_servers'):
+        pages = list(client.get_paginator('describe_source_servers').paginate(filters={}))
+    for page in pages:
+        for item in page['items']:
+            source_server_id = utils.parse_source_serverid(item['arn'])
+            replication = replication_sweep.replication_metrics(item, now)
+            rows.append((source_server_id, {
+                'fqdn': item['sourceProperties']['identificationHints'].get('fqdn'),
+                'lifecycle_state': item['lifeCycle']['state'],
+                'replication_state': replication['state'],
+                'lag_seconds': replication['lag_seconds'],
+            }))
+    return rows
+
+def build_snapshot(targets, max_workers=None):
+    """
+    Pages through describe_source_servers in every target concurrently
+    :param targets: list of (account, region) tuples
+    :param max_workers: number of targets read at the same time
+    :return (snapshot, failed_targets): the FleetSnapshot and the account:region pairs that failed, see rebuilt_targets
+    """
+    import utils
+    if max_workers is None:
+        max_workers = int(os.environ.get('SnapshotConcurrency', 8))
+    now = datetime.now(timezone.utc)
+    snapshot = FleetSnapshot()
+    snapshot.built_at = now.timestamp()
+    failed_targets = []
+    if not targets:
+        return snapshot, failed_targets
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        futures = {executor.submit(snapshot_target, account, region, now): (account, region) for account, region in targets}
+        for future, (account, region) in futures.items():
+            try:
+                rows = future.result()
+            except Exception as err:
+                utils.logger.error('Unable to read the source servers of account {} region {}: {}'.format(account, region, err))
+                failed_targets.append('{}:{}'.format(account, region))
+                continue
+            for source_server_id, values in rows:
+                snapshot.upsert(account, region, source_server_id, now.timestamp(), **values)
+    return snapshot, failed_targets
+
+def rebuilt_targets(targets, failed_targets):
+    """
+    :param targets: list of (account, region) tuples passed to build_snapshot
+    :param failed_targets: account:region pairs returned by build_snapshot
+    :return list of the (account, region) tuples that were read, their stored rows are replaced by the build
+    """
+    return [(account, region) for account, region in targets if '{}:{}'.format(account, region) not in failed_targets]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Builds and exports the fleet migration status snapshot.')
+    parser.add_argument('command', choices=['build', 'export', 'summary'], help='build reads every target, export and summary read the stored snapshot')
+    parser.add_argument('--targets', help='comma separated account:region pairs to build, defaults to SnapshotTargets or SweepTargets')
+    parser.add_argument('--store', default=os.environ.get('SnapshotLocation', '/tmp/mgn-fleet-snapshot.json.gz'), help='local path or s3://bucket/key of the stored snapshot')
+    parser.add_argument('--output', help='CSV, or Parquet for a .parquet name, local path or s3://bucket/key')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('MetricsEnabled', 'false')
+    os.environ.setdefault('LogLevel', 'WARNING')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    store = SnapshotStore(args.store)
+    result = {}
+    if args.command == 'build':
+        import replication_sweep
+        targets = replication_sweep.parse_sweep_targets(args.targets or os.environ.get('SnapshotTargets') or os.environ.get('SweepTargets', ''))
+        snapshot, result['failed_targets'] = build_snapshot(targets)
+        snapshot = store.save(snapshot, rebuilt_targets(targets, result['failed_targets']))
+    else:
+        snapshot = store.load()
+        if snapshot is None:
+            print('No snapshot stored at {}, run build first'.format(args.store), file=sys.stderr)
+            return 1
+    if args.output:
+        snapshot.export(args.output)
+    result['servers'] = len(snapshot)
+    result['lifecycle_states'] = snapshot.state_counts()
+    print(json.dumps(result))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
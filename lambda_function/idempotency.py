@@ -0,0 +1,124 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import hashlib
+import json
+import threading
+import time
+from ttl_cache import TTLCache
+
+def event_key(event):
+    """
+    :param event: the event recieved by the function
+    :return key: the EventBridge event id, or a content hash for CloudTrail records without one
+    """
+    if 'id' in event:
+        return 'id:' + str(event['id'])
+    content = json.dumps(event, sort_keys=True, separators=(',', ':'), default=str)
+    return 'sha256:' + hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class IdempotencyStore:
+    """
+    Persistent tier of the idempotency cache, shared by all containers of the function.
+    Implementations must expire keys after their time to live.
+    """
+
+    def exists(self, key):
+        """
+        :param key: idempotency key
+        :return True | False: True if the key was recorded and has not expired
+        """
+        raise NotImplementedError
+
+    def put(self, key, ttl_seconds):
+        """
+        :param key: idempotency key
+        :param ttl_seconds: time to live of the key in seconds
+        :return : None
+        """
+        raise NotImplementedError
+
+class LocalIdempotencyStore(IdempotencyStore):
+    """
+    SQLite backed stand-in for a persistent store, for local runs, replays and benchmarks.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: SQLite database file, created if it does not exist
+        """
+        # Imported here so that containers without a local store do not load sqlite3
+        import sqlite3
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS processed_events (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)'
+            )
+
+    def exists(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT expires_at FROM processed_events WHERE key = ?', (key,)
+            ).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def put(self, key, ttl_seconds):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO processed_events (key, expires_at) VALUES (?, ?)', (key, now + ttl_seconds)
+            )
+            self._connection.execute('DELETE FROM processed_events WHERE expires_at <= ?', (now,))
+
+class IdempotencyCache:
+    """
+    Two tier record of processed events. The in-memory tier answers for warm containers without any
+    remote call, the optional persistent tier catches duplicates delivered to other containers.
+    """
+
+    def __init__(self, ttl_seconds, max_entries, store=None):
+        """
+        :param ttl_seconds: time a processed event is remembered
+        :param max_entries: number of keys kept in the in-memory tier
+        :param store: optional IdempotencyStore used as the persistent tier
+        """
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries, ttl_seconds)
+        self.store = store
+
+    def is_duplicate(self, key):
+        """
+        :param key: idempotency key of the event
+        :return True | False: True if the event was already processed
+        """
+        if self.memory.get(key) is not None:
+            return True
+        if self.store is not None and self.store.exists(key):
+            self.memory.set(key, True)
+            return True
+        return False
+
+    def record(self, key):
+        """
+        :param key: idempotency key of an event that was processed successfully
+        :return : None
+        """
+        self.memory.set(key, True)
+        if self.store is not None:
+            self.store.put(key, self.ttl_seconds)
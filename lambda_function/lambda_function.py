@@ -16,134 +16,501 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
 #########################################################################################
 
+from datetime import datetime, timezone
 from events.event_mapping import ProcessedEvent
+from events.event_registry import register_processor
+from events import event_registry
+import delivery
+import idempotency
+import json
+import metrics
+import os
+import replication_sweep
 import utils
 
-def process_event_types(event):
+# Severity keys of the CloudWatch alarm metrics whose key differs from the metric name
+ALARM_SEVERITY_KEYS = {'ElapsedReplicationDuration': 'ReplicationDuration'}
+
+def locate_mgn_resource(event):
+    """
+    :param : event - an MGN event whose first resource is the source server ARN
+    :return : (accountid, region, sourceserverid)
+    """
+    return event['account'], event['region'], utils.parse_source_serverid(event['resources'][0])
+
+def locate_alarm_dimension(event):
+    """
+    :param : event - a CloudWatch alarm event on an AWS/MGN metric
+    :return : (accountid, region, sourceserverid)
+    """
+    sourceserverid = event['detail']['configuration']['metrics'][0]['metricStat']['metric']['dimensions']['SourceServerID']
+    return event['account'], event['region'], sourceserverid
+
+def process_event_types(event, source_server=None, eventtype=None):
     """
     This function determines the event type recieved and processes calls the correct processing function
     :param : event - the event recieved by the function
+    :param : source_server - the MGN source server record already looked up for the event
+    :param : eventtype - the event type if the event was already classified
     :return : processed_event - a new formatted event extracting details from the event
     """
     try:
-        if 'detail-type' in event:
-            if 'Stalled' in event['detail-type']:
-                processed_event = process_stalled_event(event)
-                return processed_event
-            elif 'LagDuration' in event['detail']['configuration']['description']:
-                processed_event = process_cloudwatch_alarm(event)
-                return processed_event
-            elif 'ElapsedReplicationDuration' in event['detail']['configuration']['description']:
-                processed_event = process_cloudwatch_alarm(event)
-                return processed_event
-        elif 'eventName' in event:
-            processed_event = process_source_disconnect(event)
-            return processed_event
-        else:
-            raise ValueError('The Event Received Is Not Parsable')
+        if eventtype is None:
+            eventtype = event_registry.classify_event(event)
+        processor = event_registry.get_processor(eventtype)
+        processed_event = processor.process(event, source_server)
+        return processed_event
     except ValueError as err:
         print(err)
         raise ValueError
+    except NotImplementedError as err:
+        print(err)
+        raise err
     except Exception as err:
         print(err)
         raise Exception
 
-def process_stalled_event(event):
+@register_processor('Stalled', locate_source_server=locate_mgn_resource)
+def process_stalled_event(event, source_server):
     """
     This function processes data replication stalled events
     :param : event - the event recieved by the function
+    :param : source_server - the MGN source server record for the event
     :return : processed_event - a new formatted event extracting details from the event
     """
     event_type = event['detail-type']
     source_server_id = utils.parse_source_serverid(event['resources'][0])
-    severity_map = utils.open_file('event_severity.json')
-    source = utils.get_source_details(event['account'], source_server_id, event['region'])
-    fqdn = source['items'][0]['sourceProperties']['identificationHints']['fqdn']
+    fqdn = source_server['sourceProperties']['identificationHints']['fqdn']
     event_detail = {
         "state": event['detail']['state']
     }
-    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, severity_map['Stalled'])
+    severity_key = 'Stalled'
+    if event['detail']['state'] != 'STALLED':
+        # The target accounts forward the end of a stall as well, it closes the stall episode
+        event_detail["recovered"] = True
+        severity_key = 'Recovery'
+    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, utils.get_severity(severity_key, event['account'], event['region'], source_server))
 
     return processed_event
 
-def process_source_disconnect(event):
+@register_processor('DisconnectFromService', validate=False, invalidate_source_server=True)
+def process_source_disconnect(event, source_server=None):
     """
     This function processes MGN source server disconnection events
+    The disconnect event carries the identification hints, no lookup is required
     :param : event - the event recieved by the function
     :return : processed_event - a new formatted event extracting details from the event
     """
     event_type = event['eventName']
     source_server_id = event['requestParameters']['sourceServerID']
-    severity_map = utils.open_file('event_severity.json')
     fqdn = event['responseElements']['sourceProperties']['identificationHints']['fqdn']
     event_detail = {
         "state": event['detail']['state']
     }
-    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, severity_map['Disconnect'])
+    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, utils.get_severity('Disconnect', event['account'], event['region'], fqdn=fqdn))
     return processed_event
 
-def process_cloudwatch_alarm(event):
+@register_processor('LagDuration', locate_source_server=locate_alarm_dimension)
+@register_processor('ElapsedReplicationDuration', locate_source_server=locate_alarm_dimension)
+def process_cloudwatch_alarm(event, source_server):
     """
     This function processes cloudwatch alarm events
     :param : event - the event recieved by the function
+    :param : source_server - the MGN source server record for the event
     :return : processed_event - a new formatted event extracting details from the event
     """
     event_type=event['detail-type']+" : "+event['detail']['configuration']['metrics'][0]['metricStat']['metric']['name']
     source_server_id = event['detail']['configuration']['metrics'][0]['metricStat']['metric']['dimensions']['SourceServerID']
-    severity_map = utils.open_file('event_severity.json')
-    mgn_source_details = utils.get_source_details(event['account'], source_server_id, event['region'])
-    fqdn = mgn_source_details['items'][0]['sourceProperties']['identificationHints']['fqdn']
+    metric_name = event['detail']['configuration']['metrics'][0]['metricStat']['metric']['name']
+    fqdn = source_server['sourceProperties']['identificationHints']['fqdn']
     event_detail = {
         "alarm_name": event['detail']['alarmName'],
         "resources": event['resources'][0],
         "state": event['detail']['state'],
         "previous_state": event['detail']['previousState']
     }
-    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, severity_map['LagDuration'])
+    if event['detail']['state']['value'] == 'OK':
+        # The target accounts forward the return to OK of an alarm that was in ALARM
+        event_detail["recovered"] = True
+    severity = utils.get_severity(ALARM_SEVERITY_KEYS.get(metric_name, metric_name), event['account'], event['region'], source_server, event['detail']['state']['value'])
+    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, severity)
+    return processed_event
+
+@register_processor('LifecycleStateChange', locate_source_server=locate_mgn_resource, validate=False, notify=False, invalidate_source_server=True)
+def process_lifecycle_state_change(event, source_server):
+    """
+    This function processes MGN source server lifecycle state change events
+    :param : event - the event recieved by the function
+    :param : source_server - the MGN source server record for the event
+    :return : processed_event - a new formatted event extracting details from the event
+    """
+    event_type = event['detail-type']
+    source_server_id = utils.parse_source_serverid(event['resources'][0])
+    fqdn = source_server['sourceProperties']['identificationHints']['fqdn']
+    event_detail = {
+        "state": event['detail']['state']
+    }
+    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, utils.get_severity('LifecycleStateChange', event['account'], event['region'], source_server))
+    return processed_event
+
+@register_processor('LaunchResult', locate_source_server=locate_mgn_resource, validate=False)
+def process_launch_result(event, source_server):
+    """
+    This function processes MGN test and cutover launch job result events
+    :param : event - the event recieved by the function
+    :param : source_server - the MGN source server record for the event
+    :return : processed_event - a new formatted event extracting details from the event
+    """
+    event_type = event['detail-type']
+    source_server_id = utils.parse_source_serverid(event['resources'][0])
+    fqdn = source_server['sourceProperties']['identificationHints']['fqdn']
+    event_detail = {
+        "state": event['detail']['state'],
+        "job_id": event['detail'].get('job-id')
+    }
+    processed_event = ProcessedEvent(event['account'], event['region'], event_type, event['time'], source_server_id, fqdn, event_detail, utils.get_severity('LaunchResult', event['account'], event['region'], source_server))
     return processed_event
 
+def get_event_source_server(event, eventtype):
+    """
+    This function extracts the MGN source server the event refers to
+    :param : event - the event recieved by the function
+    :param : eventtype - the event type returned by utils.get_event_type
+    :return : (accountid, region, sourceserverid) or None when the event does not require a lookup
+    """
+    processor = event_registry.get_processor(eventtype)
+    if processor.locate_source_server is None:
+        return None
+    return processor.locate_source_server(event)
+
+def is_storm_event(event, eventtype):
+    """
+    :param : event - the event recieved by the function
+    :param : eventtype - the event type returned by utils.get_event_type
+    :return : True for problem events counted by the storm correlator, Stalled and alarms entering ALARM
+    """
+    if eventtype not in utils.STORM_EVENT_TYPES:
+        return False
+    state = event.get('detail', {}).get('state')
+    if isinstance(state, dict):
+        return state.get('value') == 'ALARM'
+    return state == 'STALLED'
+
+def cached_source_server(event_source_server):
+    """
+    :param : event_source_server - (accountid, region, sourceserverid) returned by get_event_source_server
+    :return : source_server - the cached source server record, or None when it is not cached
+    """
+    if event_source_server is None:
+        return None
+    return utils.source_server_cache.get(event_source_server)
+
+def correlate_storm(event, eventtype, event_source_server, origin=None, count_only=False):
+    """
+    This function attaches the event to the open storm incident of its account and region, if any.
+    Attached events are only logged, no source server lookup or notification is made for them.
+    Only events of cached source servers are counted, as the state of the others is unknown: they are
+    processed normally and counted afterwards with count_only, once the lookup cached their record.
+    :param : event - the event recieved by the function
+    :param : eventtype - the event type returned by utils.get_event_type
+    :param : event_source_server - (accountid, region, sourceserverid) returned by get_event_source_server
+    :param : origin - identifier of the message the event comes from, passed to the delivery pipeline
+    :param : count_only - True for an event that was already processed, it is counted but not logged again
+    :return : incident - the Incident the event was attached to, or None
+    """
+    if event_source_server is None or not is_storm_event(event, eventtype):
+        return None
+    accountid, region, sourceserverid = event_source_server
+    source_server = cached_source_server(event_source_server)
+    # Source servers in a state that is not processed do not take part in a storm
+    if source_server is None or source_server['lifeCycle']['state'] in utils.SKIP_PROCESSING_STATES:
+        return None
+    fqdn = source_server['sourceProperties']['identificationHints'].get('fqdn')
+    incident = utils.storm_correlator.observe(accountid, region, sourceserverid, eventtype, fqdn)
+    if incident is None or count_only:
+        return incident
+    event_detail = {
+        "incident_id": incident.incident_id,
+        "state": event['detail']['state']
+    }
+    alarm_state = event['detail']['state'].get('value') if isinstance(event['detail']['state'], dict) else None
+    severity = utils.get_severity(ALARM_SEVERITY_KEYS.get(eventtype, eventtype), accountid, region, source_server, alarm_state)
+    processed_event = ProcessedEvent(accountid, region, 'Replication Storm : ' + eventtype, event.get('time'), sourceserverid, fqdn, event_detail, severity)
+    delivery.deliver(processed_event, notify=False, origin=origin)
+    metrics.increment('storm_attached_events')
+    return incident
+
+def deliver_storm_incidents():
+    """
+    This function queues one notification for every storm incident opened since the last flush, and a
+    summary listing every attached host for every incident closed since the last flush
+    :return : incidents - the incidents notified, their incident id is the origin of the notification
+    """
+    incidents = utils.storm_correlator.pending_notifications()
+    for incident in incidents:
+        hosts = sorted(incident.hosts.values())
+        event_detail = {
+            "incident_id": incident.incident_id,
+            "event_types": ', '.join(sorted(incident.event_types)),
+            "host_count": len(hosts),
+            "events": incident.events,
+            "hosts": hosts[:utils.STORM_MAX_HOSTS]
+        }
+        time_stamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if incident.closed:
+            event_detail['recovered'] = True
+            event_detail['duration_seconds'] = int(incident.last_event_at - incident.opened_at)
+            processed_event = ProcessedEvent(incident.account, incident.region, 'Replication Storm Incident', time_stamp, None, None, event_detail, 'Informational')
+            metrics.increment('storm_incidents_closed')
+            utils.logger.warning('Closed storm incident {} for account {} region {} with {} source servers'.format(
+                incident.incident_id, incident.account, incident.region, len(hosts)))
+        else:
+            processed_event = ProcessedEvent(incident.account, incident.region, 'Replication Storm Incident', time_stamp, None, None, event_detail, 'Critical')
+            metrics.increment('storm_incidents')
+            utils.logger.warning('Opened storm incident {} for account {} region {} with {} source servers'.format(
+                incident.incident_id, incident.account, incident.region, len(hosts)))
+        delivery.deliver(processed_event, notify=True, origin=incident.incident_id)
+    return incidents
+
+def handle_event(event, eventtype, origin=None):
+    """
+    This function validates, processes, logs and publishes a single event
+    :param : event - the event recieved by the function
+    :param : eventtype - the event type returned by utils.get_event_type
+    :param : origin - identifier of the message the event comes from, passed to the delivery pipeline
+    :return : None
+    """
+    metrics.begin_event(eventtype, event.get('account'))
+    try:
+        processor = event_registry.get_processor(eventtype)
+        source_server = None
+        process_event = True
+        event_source_server = get_event_source_server(event, eventtype)
+        if event_source_server is not None:
+            accountid, region, sourceserverid = event_source_server
+            metrics.set_dimensions(account=accountid)
+            with metrics.timer('source_server_lookup'):
+                source_server = utils.get_source_server(accountid, sourceserverid, region)
+            if processor.validate:
+                process_event = utils.source_server_validation(source_server)
+        
+        if process_event is True:
+            with metrics.timer('process'):
+                processed_event = process_event_types(event, source_server, eventtype)
+            if processor.invalidate_source_server:
+                # The cached record holds the previous lifecycle state, the next event looks the server up again
+                utils.invalidate_source_server(processed_event.aws_account_id, processed_event.aws_region, processed_event.source_server_id)
+            with metrics.timer('deliver'):
+                delivery.deliver(processed_event, notify=processor.notify, origin=origin)
+            print(processed_event.to_json())
+        else:
+            metrics.increment('skipped_events')
+            utils.logger.warn(
+                '''The event received is from an MGN source server in a Testing, Cutover, or Disconnected state, \n
+                therefore this event will not be processed.'''
+            )
+    finally:
+        metrics.end_event(event_id=event.get('id'))
+
+def flush_deliveries():
+    """
+    This function flushes every delivery sink concurrently
+    :return : None - raises RuntimeError when a sink failed, so that the invocation is retried
+    """
+    failures = delivery.flush()
+    if failures:
+        raise RuntimeError('Delivery failed for the sinks: {}'.format(failures))
+
 def lambda_handler(event, context):
     
     print(event)
+    idempotency_key = idempotency.event_key(event)
+    if utils.idempotency_cache.is_duplicate(idempotency_key):
+        utils.logger.info('Skipping duplicate delivery of event ' + idempotency_key)
+        metrics.increment('duplicate_events')
+        metrics.flush()
+        return
     eventtype = utils.get_event_type(event)
-    if eventtype == 'Stalled':
-        sourcearn = event['resources'][0]
-        sourceserverid = utils.parse_source_serverid(sourcearn)
-        accountid = event['account']
-        region = event['region']
-        response = utils.get_source_details(accountid, sourceserverid, region)
-        process_event = utils.source_server_validation(response)
-    elif eventtype == 'LagDuration':
-        sourcearn = event['resources'][0]
-        sourceserverid = event['detail']['configuration']['metrics'][0]['metricStat']['metric']['dimensions']['SourceServerID']
-        accountid = event['account']
-        region = event['region']
-        response = utils.get_source_details(accountid, sourceserverid, region)
-        process_event = utils.source_server_validation(response)
-    elif eventtype == 'ElapsedReplicationDuration':
-        sourcearn = event['resources'][0]
-        sourceserverid = event['detail']['configuration']['metrics'][0]['metricStat']['metric']['dimensions']['SourceServerID']
-        accountid = event['account']
-        region = event['region']
-        response = utils.get_source_details(accountid, sourceserverid, region)
-        process_event = utils.source_server_validation(response)
-    elif eventtype == 'DisconnectFromService':
-        sourcearn = event['responseElements']['arn']
-        sourceserverid = event['requestParameters']['sourceServerID']
-        accountid = event['userIdentity']['accountId']
-        region = event['awsRegion']
-        response = utils.get_source_details(accountid, sourceserverid, region)
-        process_event = True
+    try:
+        event_source_server = get_event_source_server(event, eventtype)
+        resolved = cached_source_server(event_source_server) is not None
+        if not correlate_storm(event, eventtype, event_source_server):
+            handle_event(event, eventtype)
+            if not resolved:
+                correlate_storm(event, eventtype, event_source_server, count_only=True)
+    finally:
+        try:
+            incidents = deliver_storm_incidents()
+            try:
+                flush_deliveries()
+            except Exception:
+                utils.storm_correlator.requeue(incidents)
+                raise
+        finally:
+            metrics.flush()
+    # Only recorded once the deliveries are flushed, a failed delivery is retried
+    utils.idempotency_cache.record(idempotency_key)
+
+def batch_handler(event, context):
+    """
+    This function processes an SQS batch of EventBridge events. Source servers are resolved with one
+    describe_source_servers call per (account, region) before the events are handled one by one.
+    :param : event - the SQS batch recieved by the function
+    :return : batchItemFailures - the message ids of the records that should be retried
+    """
+    failed_message_ids = []
+    parsed_records = []
+    groups = {}
+    batch_keys = set()
+    handled_records = []
+
+    for record in event['Records']:
+        try:
+            mgn_event = json.loads(record['body'])
+            idempotency_key = idempotency.event_key(mgn_event)
+            if idempotency_key in batch_keys or utils.idempotency_cache.is_duplicate(idempotency_key):
+                utils.logger.info('Skipping duplicate delivery of event ' + idempotency_key)
+                metrics.increment('duplicate_events')
+                continue
+            batch_keys.add(idempotency_key)
+            eventtype = utils.get_event_type(mgn_event)
+            event_source_server = get_event_source_server(mgn_event, eventtype)
+            resolved = cached_source_server(event_source_server) is not None
+            incident = correlate_storm(mgn_event, eventtype, event_source_server, record['messageId'])
+            if incident is not None:
+                handled_records.append((record['messageId'], idempotency_key, incident.incident_id))
+                continue
+        except Exception as err:
+            utils.logger.error('Unable to parse SQS message {}: {}'.format(record['messageId'], err))
+            failed_message_ids.append(record['messageId'])
+            continue
+        group = None
+        if event_source_server is not None:
+            accountid, region, sourceserverid = event_source_server
+            group = (accountid, region)
+            groups.setdefault(group, []).append(sourceserverid)
+        parsed_records.append((record['messageId'], mgn_event, eventtype, event_source_server, resolved, group, idempotency_key))
+
+    failed_groups = []
+    for (accountid, region), sourceserverids in groups.items():
+        try:
+            utils.get_source_servers(accountid, sourceserverids, region)
+        except Exception as err:
+            utils.logger.error('Unable to describe source servers in account {} region {}: {}'.format(accountid, region, err))
+            failed_groups.append((accountid, region))
+
+    for message_id, mgn_event, eventtype, event_source_server, resolved, group, idempotency_key in parsed_records:
+        if group in failed_groups:
+            failed_message_ids.append(message_id)
+            continue
+        try:
+            print(mgn_event)
+            handle_event(mgn_event, eventtype, message_id)
+            handled_records.append((message_id, idempotency_key, None))
+            if not resolved:
+                # Counted now that its source server and state are cached
+                correlate_storm(mgn_event, eventtype, event_source_server, count_only=True)
+        except Exception as err:
+            utils.logger.error('Unable to process SQS message {}: {}'.format(message_id, err))
+            failed_message_ids.append(message_id)
+
+    incidents = deliver_storm_incidents()
+    failures, failed_origins = delivery.flush_with_origins()
+    utils.storm_correlator.requeue([incident for incident in incidents if incident.incident_id in failed_origins])
+    # Events queued without origin failed, the failed records cannot be told apart
+    undelivered_all = None in failed_origins
+    # The keys are only recorded once the deliveries are flushed, a failed delivery is retried
+    for message_id, idempotency_key, incident_id in handled_records:
+        if undelivered_all or message_id in failed_origins or incident_id in failed_origins:
+            failed_message_ids.append(message_id)
+        else:
+            utils.idempotency_cache.record(idempotency_key)
+    metrics.increment('batch_item_failures', len(failed_message_ids))
+    metrics.flush()
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_message_ids]
+    }
+
+def sweep_handler(event, context):
+    """
+    This function runs the scheduled fleet wide replication sweep over the targets in SweepTargets
+    :param : event - the scheduled event, an optional "targets" list of account:region strings overrides SweepTargets
+    :return : summary - number of servers swept, breaches found, notifications queued, recoveries and failed targets
+    """
+    if isinstance(event, dict) and event.get('targets'):
+        targets = replication_sweep.parse_sweep_targets(','.join(event['targets']))
     else:
-        raise NotImplementedError('Event recieved does not have a processor implemented.')
-    
-    if process_event is True:
-        processed_event = process_event_types(event)
-        utils.write_to_cw_logs(processed_event)
-        utils.publish_event_to_sns_topic(processed_event)
-        print(processed_event.get_event_attributes())
+        targets = replication_sweep.parse_sweep_targets(os.environ.get('SweepTargets', ''))
+    try:
+        summary = replication_sweep.run_sweep(targets)
+    finally:
+        breaches = replication_sweep.drain_pending_breaches()
+        try:
+            flush_deliveries()
+            # Only recorded once delivered, the next sweep notifies the breaches and recoveries of a failed flush again
+            replication_sweep.record_notified_breaches(breaches)
+        finally:
+            metrics.flush()
+    print(summary)
+    return summary
+
+def forecast_handler(event, context):
+    """
+    This function runs the scheduled replication trend analysis over the targets in ForecastTargets, or SweepTargets when unset
+    :param : event - the scheduled event, an optional "targets" list of account:region strings overrides the configured targets
+    :return : summary - number of servers analyzed, breaches predicted, notifications queued and failed targets
+    """
+    # Imported here as it needs NumPy, which is only available to the forecast function
+    import replication_forecast
+    if isinstance(event, dict) and event.get('targets'):
+        targets = replication_sweep.parse_sweep_targets(','.join(event['targets']))
     else:
-        utils.logger.warn(
-            '''The event received is from an MGN source server in a Testing, Cutover, or Disconnected state, \n
-            therefore this event will not be processed.'''
-        )
\ No newline at end of file
+        targets = replication_sweep.parse_sweep_targets(os.environ.get('ForecastTargets') or os.environ.get('SweepTargets', ''))
+    try:
+        summary = replication_forecast.run_forecast(targets)
+    finally:
+        forecast_keys = replication_forecast.drain_pending_forecasts()
+        try:
+            flush_deliveries()
+            # Only recorded once delivered, the next run notifies the forecasts of a failed flush again
+            replication_forecast.record_notified_forecasts(forecast_keys)
+        finally:
+            metrics.flush()
+    print(summary)
+    return summary
+
+def snapshot_handler(event, context):
+    """
+    This function builds the fleet status snapshot over the targets in SnapshotTargets, or SweepTargets when unset, and exports it.
+    The snapshot is rebuilt when none is stored or its last build is older than SnapshotRebuildSeconds.
+    :param : event - an optional "rebuild" flag forcing a full build and an optional "targets" list of account:region strings
+    :return : summary - number of servers per lifecycle state, failed targets and the export location
+    """
+    import fleet_snapshot
+    store = fleet_snapshot.default_store()
+    if store is None:
+        raise ValueError('SnapshotLocation must be set to an s3:// location to build the fleet status snapshot.')
+    snapshot = None if isinstance(event, dict) and event.get('rebuild') else store.load()
+    if snapshot is not None and snapshot.needs_rebuild(int(os.environ.get('SnapshotRebuildSeconds', 86400)), datetime.now(timezone.utc).timestamp()):
+        snapshot = None
+    summary = {'rebuilt': snapshot is None, 'failed_targets': []}
+    try:
+        if snapshot is None:
+            if isinstance(event, dict) and event.get('targets'):
+                targets = replication_sweep.parse_sweep_targets(','.join(event['targets']))
+            else:
+                targets = replication_sweep.parse_sweep_targets(os.environ.get('SnapshotTargets') or os.environ.get('SweepTargets', ''))
+            snapshot, summary['failed_targets'] = fleet_snapshot.build_snapshot(targets)
+            # The rows of the targets that were read are replaced, so deleted source servers are dropped
+            snapshot = store.save(snapshot, fleet_snapshot.rebuilt_targets(targets, summary['failed_targets']))
+        export_location = os.environ.get('SnapshotExportLocation')
+        if export_location:
+            snapshot.export(export_location)
+            summary['export'] = export_location
+    finally:
+        metrics.flush()
+    summary['servers'] = len(snapshot)
+    summary['lifecycle_states'] = snapshot.state_counts()
+    print(summary)
+    return summary
@@ -0,0 +1,144 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import botocore.exceptions
+import json
+import threading
+import time
+
+# CloudWatch Logs PutLogEvents service limits
+MAX_BATCH_EVENTS = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD_BYTES = 26
+MAX_BATCH_SPAN_MS = 24 * 60 * 60 * 1000
+
+class LogBuffer:
+    """
+    Collects log events per log stream and writes them with as few PutLogEvents calls as the
+    service limits allow. Streams created by the buffer are remembered across warm invocations,
+    so describe_log_streams is never called. In stdout mode every event is printed as a JSON
+    line instead, for the Lambda log group to pick up.
+    """
+
+    def __init__(self, get_client, log_group, stdout=False):
+        """
+        :param get_client: function returning the CloudWatch Logs client, only called when a batch is written
+        :param log_group: CloudWatch Log Group the events are written to
+        :param stdout: write structured JSON to stdout instead of calling the Logs API
+        """
+        self.get_client = get_client
+        self.log_group = log_group
+        self.stdout = stdout
+        self.known_streams = set()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, log_stream, message, timestamp=None):
+        """
+        :param log_stream: CloudWatch Log Stream the event belongs to
+        :param message: log message
+        :param timestamp: event time in milliseconds since the epoch, defaults to now
+        :return : None
+        """
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        with self._lock:
+            self._pending.setdefault(log_stream, []).append({
+                'timestamp': timestamp,
+                'message': message
+            })
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(events) for events in self._pending.values())
+
+    def flush(self):
+        """
+        :return responses: list of PutLogEvents responses, empty in stdout mode
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+
+        responses = []
+        for log_stream, log_events in pending.items():
+            if self.stdout:
+                for log_event in log_events:
+                    print(json.dumps({
+                        'logGroup': self.log_group,
+                        'logStream': log_stream,
+                        'timestamp': log_event['timestamp'],
+                        'message': log_event['message']
+                    }))
+                continue
+            log_events.sort(key=lambda log_event: log_event['timestamp'])
+            for batch in split_batches(log_events):
+                responses.append(self._put_batch(log_stream, batch))
+        return responses
+
+    def _ensure_stream(self, log_stream):
+        if log_stream in self.known_streams:
+            return
+        try:
+            self.get_client().create_log_stream(
+                logGroupName=self.log_group,
+                logStreamName=log_stream,
+            )
+        except botocore.exceptions.ClientError as err:
+            if err.response['Error']['Code'] != 'ResourceAlreadyExistsException':
+                raise err
+        self.known_streams.add(log_stream)
+
+    def _put_batch(self, log_stream, batch):
+        self._ensure_stream(log_stream)
+        put_log_params = {
+            'logGroupName': self.log_group,
+            'logStreamName': log_stream,
+            'logEvents': batch
+        }
+        try:
+            return self.get_client().put_log_events(**put_log_params)
+        except botocore.exceptions.ClientError as err:
+            if err.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise err
+            # The stream was deleted since it was created, create it again and retry once
+            self.known_streams.discard(log_stream)
+            self._ensure_stream(log_stream)
+            return self.get_client().put_log_events(**put_log_params)
+
+def split_batches(log_events):
+    """
+    :param log_events: log events sorted by timestamp
+    :return generator of lists of log events within the PutLogEvents count, size and time span limits
+    """
+    batch = []
+    batch_bytes = 0
+    for log_event in log_events:
+        event_bytes = len(log_event['message'].encode('utf-8')) + EVENT_OVERHEAD_BYTES
+        if batch and (
+            len(batch) >= MAX_BATCH_EVENTS
+            or batch_bytes + event_bytes > MAX_BATCH_BYTES
+            or log_event['timestamp'] - batch[0]['timestamp'] >= MAX_BATCH_SPAN_MS
+        ):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(log_event)
+        batch_bytes += event_bytes
+    if batch:
+        yield batch
@@ -0,0 +1,175 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Message templates of the delivery sinks. A MessageRenderer selects the template of an event type
+# once and keeps it, so every following event of that type is formatted with a single lookup
+# instead of walking the list of event type markers. Recoveries, events whose problem cleared, are
+# formatted with the recovery templates.
+
+# (event type marker, template), the first marker contained in the event type is used
+NOTIFICATION_TEMPLATES = [
+    ('Replication Storm Incident', '''
+            Hello, \n
+            {detail[host_count]} source servers in AWS Account {account} in the region {region} reported {detail[event_types]} events within a few seconds, which points to a shared cause such as a replication server, staging area subnet or network link. \n
+            Further events of these servers are attached to incident {detail[incident_id]} and not notified one by one. This is a {severity} event which occured on {time_stamp}. \n
+            Affected hosts: \n
+{host_list}
+        '''),
+    ('Replication Forecast', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} is trending towards a breach of the {detail[metric]} threshold. \n
+            At {detail[slope_per_hour]} per hour the current level of {detail[level]} reaches the threshold of {detail[threshold]} in {detail[hours_to_breach]} hours, around {detail[predicted_breach_time]}. \n
+            This is a {severity} forecast made on {time_stamp}.
+        '''),
+    ('Stalled', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} is experiencing stalled data replication. \n
+            This is a {severity} event which occured on {time_stamp}.            
+        '''),
+    ('LagDuration', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} is experiencing lag in replication. \n
+            This is a {severity} event which occured on {time_stamp}.       
+        '''),
+    ('ElapsedReplicationDuration', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} has exceeded the replication threshold of 90 days. \n
+            This is a {severity} event which occured on {time_stamp}. 
+        '''),
+    ('DisconnectFromService', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} has been disconnected from the AWS MGN service. \n
+            This is a {severity} event which occured on {time_stamp}. 
+        '''),
+    ('Backlog', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} has a replication backlog of {detail[backlog_bytes]} bytes. \n
+            This is a {severity} event which occured on {time_stamp}. 
+        '''),
+    ('Launch Result', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} reported the launch result {detail[state]}. \n
+            This is a {severity} event which occured on {time_stamp}. 
+        '''),
+    ('Lifecycle State Change', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} changed to the lifecycle state {detail[state]}. \n
+            This is a {severity} event which occured on {time_stamp}. 
+        '''),
+]
+
+# Templates of recoveries, the empty marker matches every event type
+NOTIFICATION_RECOVERY_TEMPLATES = [
+    ('Replication Storm Incident', '''
+            Hello, \n
+            Storm incident {detail[incident_id]} in AWS Account {account} in the region {region} is closed after {detail[duration_seconds]} seconds. \n
+            {detail[host_count]} source servers reported {detail[events]} {detail[event_types]} events while it was open. This is a {severity} event which occured on {time_stamp}. \n
+            Affected hosts: \n
+{host_list}
+        '''),
+    ('LagDuration', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} is no longer experiencing lag in replication. \n
+            This is a {severity} event which occured on {time_stamp}.
+        '''),
+    ('Stalled', '''
+            Hello, \n
+            The data replication of the Hostname {fqdn} in AWS Account {account} in the region {region} is no longer stalled. \n
+            This is a {severity} event which occured on {time_stamp}.
+        '''),
+    ('', '''
+            Hello, \n
+            The Hostname {fqdn} in AWS Account {account} in the region {region} recovered from the event {event_type}. \n
+            This is a {severity} event which occured on {time_stamp}.
+        '''),
+]
+
+WEBHOOK_TEMPLATES = [
+    ('Replication Storm Incident', '{severity}: incident {detail[incident_id]}, {detail[host_count]} source servers in account {account} region {region} reported {detail[event_types]} events at {time_stamp}'),
+    ('Replication Forecast', '{severity}: {detail[metric]} of {fqdn} ({source_server_id}) in account {account} region {region} is forecast to exceed {detail[threshold]} in {detail[hours_to_breach]} hours'),
+    ('Stalled', '{severity}: stalled data replication on {fqdn} ({source_server_id}) in account {account} region {region} at {time_stamp}'),
+    ('LagDuration', '{severity}: replication lag on {fqdn} ({source_server_id}) in account {account} region {region} at {time_stamp}'),
+    ('ElapsedReplicationDuration', '{severity}: replication threshold exceeded on {fqdn} ({source_server_id}) in account {account} region {region} at {time_stamp}'),
+    ('DisconnectFromService', '{severity}: {fqdn} ({source_server_id}) disconnected from AWS MGN in account {account} region {region} at {time_stamp}'),
+    ('Backlog', '{severity}: replication backlog of {detail[backlog_bytes]} bytes on {fqdn} ({source_server_id}) in account {account} region {region} at {time_stamp}'),
+    ('Launch Result', '{severity}: launch result {detail[state]} for {fqdn} ({source_server_id}) in account {account} region {region} at {time_stamp}'),
+    ('Lifecycle State Change', '{severity}: {fqdn} ({source_server_id}) changed to lifecycle state {detail[state]} in account {account} region {region} at {time_stamp}')
+]
+
+WEBHOOK_RECOVERY_TEMPLATES = [
+    ('Replication Storm Incident', '{severity}: incident {detail[incident_id]} closed, {detail[host_count]} source servers in account {account} region {region} reported {detail[events]} {detail[event_types]} events'),
+    ('', '{severity}: {fqdn} ({source_server_id}) recovered from {event_type} in account {account} region {region} at {time_stamp}')
+]
+
+def format_host_list(detail):
+    """
+    :param detail: event detail, with a list of host names in hosts for incident events
+    :return host_list: one indented line per host, empty for other events
+    """
+    if not isinstance(detail, dict) or not detail.get('hosts'):
+        return ''
+    return '\n'.join('            ' + str(host) for host in detail['hosts'])
+
+class MessageRenderer:
+    """
+    Formats ProcessedEvents with the template of their event type. Templates are resolved once per
+    event type and kept for the lifetime of the container.
+    """
+
+    def __init__(self, templates, recovery_templates=()):
+        """
+        :param templates: list of (event type marker, str.format template) tuples
+        :param recovery_templates: list of (event type marker, str.format template) tuples used for recoveries
+        """
+        self.templates = templates
+        self.recovery_templates = recovery_templates
+        self._compiled = {}
+
+    def compile(self, event_type, recovery=False):
+        """
+        :param event_type: event type of a ProcessedEvent
+        :param recovery: True to select the recovery template of the event type
+        :return template: template used for the event type
+        """
+        template = self._compiled.get((event_type, recovery))
+        if template is None:
+            for marker, candidate in self.recovery_templates if recovery else self.templates:
+                if marker in event_type:
+                    template = candidate
+                    break
+            else:
+                raise RuntimeError('The event provided does not contain a valid event type.')
+            self._compiled[(event_type, recovery)] = template
+        return template
+
+    def render(self, event):
+        """
+        :param event: ProcessedEvent to format
+        :return message: formatted message
+        """
+        return self.compile(event.get_event_type(), event.is_recovery()).format(
+            event_type=event.get_event_type(),
+            fqdn=event.get_server_fqdn(),
+            account=event.get_aws_account_id(),
+            region=event.get_aws_region(),
+            severity=event.get_event_severity(),
+            time_stamp=event.get_time_stamp(),
+            source_server_id=event.get_source_server_id(),
+            detail=event.get_event_detail(),
+            host_list=format_host_list(event.get_event_detail())
+        )
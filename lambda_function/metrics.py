@@ -0,0 +1,219 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Hot path instrumentation emitted as CloudWatch Embedded Metric Format (EMF). Stage timings and
+# counters are aggregated per (event type, account) during an invocation and printed as EMF log
+# lines by flush, which CloudWatch turns into metrics without any API call.
+
+from contextlib import contextmanager
+import json
+import os
+import random
+import threading
+import time
+
+NAMESPACE = os.environ.get('MetricsNamespace', 'MGN-Monitoring')
+DIMENSIONS = ['EventType', 'Account']
+# EMF accepts at most 100 values per metric in one log line
+MAX_VALUES_PER_LINE = 100
+THROTTLING_ERROR_CODES = ['Throttling', 'ThrottlingException', 'ThrottledException', 'RequestLimitExceeded', 'TooManyRequestsException', 'RequestThrottledException']
+# Some APIs only tell a throttled response by its message, whatever its error code
+THROTTLING_ERROR_MESSAGES = ['Rate exceeded']
+
+enabled = os.environ.get('MetricsEnabled', 'true').lower() == 'true'
+sample_rate = float(os.environ.get('MetricsSampleRate', 1.0))
+debug = os.environ.get('MetricsDebug', 'false').lower() == 'true'
+
+_local = threading.local()
+_lock = threading.Lock()
+_aggregates = {}
+
+class EventContext:
+    """
+    Measurements of the event currently processed by a thread.
+    """
+
+    def __init__(self, event_type, account, sampled):
+        self.event_type = event_type or 'Unknown'
+        self.account = account or 'ALL'
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.trace = []
+
+def current_context():
+    """
+    :return EventContext of the thread, or an invocation level context when no event is being processed
+    """
+    context = getattr(_local, 'context', None)
+    if context is None:
+        context = EventContext('Invocation', 'ALL', random.random() < sample_rate)
+        _local.context = context
+    return context
+
+def begin_event(event_type, account):
+    """
+    Starts the measurements of one event on the current thread
+    :param event_type: event type, used as the EventType dimension
+    :param account: target account, used as the Account dimension
+    :return : None
+    """
+    _local.context = EventContext(event_type, account, random.random() < sample_rate)
+
+def set_dimensions(event_type=None, account=None):
+    """
+    Updates the dimensions of the current event once they are known
+    :return : None
+    """
+    context = current_context()
+    if event_type:
+        context.event_type = event_type
+    if account:
+        context.account = account
+
+def end_event(**details):
+    """
+    Records the total time of the current event and, in debug mode, prints its full trace
+    :param details: additional fields printed with the debug trace
+    :return : None
+    """
+    context = current_context()
+    total_ms = (time.perf_counter() - context.started) * 1000
+    record_timing('event_total', total_ms)
+    if debug:
+        trace = {
+            'trace': 'mgn-event',
+            'EventType': context.event_type,
+            'Account': context.account,
+            'total_ms': round(total_ms, 3),
+            'stages': context.trace
+        }
+        trace.update(details)
+        print(json.dumps(trace, default=str))
+    _local.context = None
+
+def _aggregate(context):
+    key = (context.event_type, context.account)
+    aggregate = _aggregates.get(key)
+    if aggregate is None:
+        aggregate = _aggregates[key] = {'timers': {}, 'counters': {}}
+    return aggregate
+
+def record_timing(stage, milliseconds):
+    """
+    :param stage: name of the stage, used as the metric name
+    :param milliseconds: duration of the stage
+    :return : None
+    """
+    if not enabled:
+        return
+    context = current_context()
+    if debug:
+        context.trace.append({'stage': stage, 'ms': round(milliseconds, 3), 'at_ms': round((time.perf_counter() - context.started) * 1000, 3)})
+    if not context.sampled:
+        return
+    with _lock:
+        _aggregate(context)['timers'].setdefault(stage, []).append(milliseconds)
+
+def increment(counter, value=1):
+    """
+    :param counter: name of the counter, used as the metric name
+    :param value: amount to add
+    :return : None
+    """
+    if not enabled or not value:
+        return
+    context = current_context()
+    if debug:
+        context.trace.append({'counter': counter, 'value': value})
+    with _lock:
+        counters = _aggregate(context)['counters']
+        counters[counter] = counters.get(counter, 0) + value
+
+@contextmanager
+def timer(stage):
+    """
+    Context manager recording the duration of the enclosed block as a stage timing
+    :param stage: name of the stage
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, (time.perf_counter() - started) * 1000)
+
+def observe_response(context=None, parsed_response=None, exception=None, **kwargs):
+    """
+    botocore response-received handler counting retried attempts and throttled responses
+    :return : None
+    """
+    if not enabled:
+        return
+    if context and context.get('retries', {}).get('attempt', 1) > 1:
+        increment('aws_retries')
+    error = (parsed_response or {}).get('Error') or {}
+    if error.get('Code') in THROTTLING_ERROR_CODES or error.get('Message') in THROTTLING_ERROR_MESSAGES:
+        increment('aws_throttles')
+
+def emf_lines(event_type, account, aggregate, timestamp):
+    """
+    :return generator of EMF log line dictionaries for one (event type, account) aggregate
+    """
+    timers = aggregate['timers']
+    counters = aggregate['counters']
+    lines = max([1] + [(len(values) + MAX_VALUES_PER_LINE - 1) // MAX_VALUES_PER_LINE for values in timers.values()])
+    for line in range(lines):
+        metrics = []
+        record = {'EventType': event_type, 'Account': account}
+        for stage, values in timers.items():
+            chunk = values[line * MAX_VALUES_PER_LINE:(line + 1) * MAX_VALUES_PER_LINE]
+            if chunk:
+                metrics.append({'Name': stage, 'Unit': 'Milliseconds'})
+                record[stage] = [round(value, 3) for value in chunk]
+        if line == 0:
+            for counter, value in counters.items():
+                metrics.append({'Name': counter, 'Unit': 'Count'})
+                record[counter] = value
+        if not metrics:
+            continue
+        record['_aws'] = {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [DIMENSIONS],
+                'Metrics': metrics
+            }]
+        }
+        yield record
+
+def flush():
+    """
+    Prints the aggregated measurements as EMF log lines and resets them
+    :return lines: number of EMF lines printed
+    """
+    global _aggregates
+    with _lock:
+        aggregates = _aggregates
+        _aggregates = {}
+    _local.context = None
+    timestamp = int(time.time() * 1000)
+    printed = 0
+    for (event_type, account), aggregate in aggregates.items():
+        for record in emf_lines(event_type, account, aggregate, timestamp):
+            print(json.dumps(record))
+            printed += 1
+    return printed
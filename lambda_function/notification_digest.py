@@ -0,0 +1,149 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+from ttl_cache import TTLCache
+
+# Stages of an alarm within the flap window opened by a notified ALARM
+FLAP_ALARM = 'ALARM'
+FLAP_RECOVERED = 'RECOVERED'
+FLAP_FLAPPING = 'FLAPPING'
+
+# SNS PublishBatch service limits
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 262144
+MAX_SUBJECT_LENGTH = 100
+
+class NotificationDigest:
+    """
+    Groups processed events by account, region, event type, recovery and time window so that one
+    message is published per group, and suppresses CloudWatch alarm state changes that flap for the same
+    source server within the flap suppression window that follows a notified ALARM.
+    """
+
+    def __init__(self, window_seconds, flap_window_seconds, max_flap_entries=10000):
+        """
+        :param window_seconds: events whose time stamps fall in the same window are combined, 0 combines all pending events
+        :param flap_window_seconds: an alarm that returns to ALARM after recovering within this window of a notified ALARM is suppressed
+        :param max_flap_entries: number of source server alarm states remembered for flap suppression
+        """
+        self.window_seconds = window_seconds
+        self.flap_history = TTLCache(max_flap_entries, flap_window_seconds)
+        self._groups = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        """
+        :param event: ProcessedEvent to be notified
+        :return True | False: False when the event was suppressed as an alarm flap
+        """
+        if self.is_flapping(event):
+            return False
+        # Recoveries are combined apart from the problems of the same event type
+        group_key = (event.get_aws_account_id(), event.get_aws_region(), event.get_event_type(), event.is_recovery(), self.window_start(event))
+        with self._lock:
+            self._groups.setdefault(group_key, []).append(event)
+        return True
+
+    def is_flapping(self, event):
+        """
+        :param event: ProcessedEvent to be notified
+        :return True | False: True if the alarm state change should be suppressed
+
+        Only alarm state changes are considered. A notified ALARM opens the flap window of the source
+        server and metric. The first recovery in the window is always notified, the alarm is only
+        considered flapping once it returns to ALARM (ALARM -> OK -> ALARM), from then on every
+        transition is suppressed until the window closes.
+        """
+        event_detail = event.get_event_detail()
+        if not isinstance(event_detail, dict) or 'previous_state' not in event_detail:
+            return False
+        if self.flap_history.ttl_seconds <= 0:
+            return False
+        flap_key = (event.get_aws_account_id(), event.get_source_server_id(), event.get_event_type())
+        in_alarm = alarm_state(event_detail['state']) == 'ALARM'
+        entry = self.flap_history.get(flap_key)
+        if entry is None:
+            if in_alarm:
+                self.flap_history.set(flap_key, (time.monotonic(), FLAP_ALARM))
+            return False
+        opened_at, stage = entry
+        if stage == FLAP_FLAPPING:
+            return True
+        if stage == FLAP_ALARM and in_alarm:
+            return False
+        if stage == FLAP_ALARM:
+            stage = FLAP_RECOVERED
+        elif in_alarm:
+            stage = FLAP_FLAPPING
+        # The window keeps running from the notified ALARM that opened it
+        remaining = self.flap_history.ttl_seconds - (time.monotonic() - opened_at)
+        self.flap_history.set(flap_key, (opened_at, stage), remaining)
+        return stage == FLAP_FLAPPING
+
+    def window_start(self, event):
+        """
+        :param event: ProcessedEvent to be notified
+        :return start of the digest window the event belongs to, in seconds since the epoch
+        """
+        if self.window_seconds <= 0:
+            return 0
+        try:
+            time_stamp = datetime.fromisoformat(event.get_time_stamp().replace('Z', '+00:00')).timestamp()
+        except (AttributeError, ValueError):
+            return 0
+        return int(time_stamp // self.window_seconds) * self.window_seconds
+
+    def drain(self):
+        """
+        :return groups: list of lists of ProcessedEvents, one list per digest group
+        """
+        with self._lock:
+            groups = list(self._groups.values())
+            self._groups = OrderedDict()
+        return groups
+
+def alarm_state(state):
+    """
+    :param state: alarm state as found in a CloudWatch Alarm State Change event
+    :return state value string
+    """
+    if isinstance(state, dict):
+        return state.get('value')
+    return state
+
+def split_batches(entries):
+    """
+    :param entries: PublishBatch request entries
+    :return generator of lists of entries within the PublishBatch count and size limits
+    """
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        entry_bytes = len(entry['Message'].encode('utf-8')) + len(entry.get('Subject', '').encode('utf-8'))
+        if batch and (len(batch) >= MAX_BATCH_ENTRIES or batch_bytes + entry_bytes > MAX_BATCH_BYTES):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+    if batch:
+        yield batch
@@ -0,0 +1,127 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Client side rate limiting of the AWS APIs called by the function. Every API (and, for the MGN
+# clients using assumed role credentials, every target account) has its own token bucket, so a
+# burst of events is spread out instead of being throttled by the service. Calls that are
+# throttled anyway are retried by the SDK, see client_factory.get_client_config, which is the only
+# retry layer so that a call is never attempted more than ClientMaxAttempts times.
+
+import metrics
+import os
+import threading
+import time
+
+# Calls per second of one container, APIs missing from the limits are not rate limited
+DEFAULT_API_RATE_LIMITS = 'sts:AssumeRole=20,mgn:DescribeSourceServers=10,cloudwatch:GetMetricData=10'
+
+class TokenBucket:
+    """
+    A thread safe token bucket. acquire reserves a token and sleeps until it is available, so
+    concurrent callers are served in turn at the configured rate.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: tokens added per second
+        :param capacity: maximum number of tokens, the size of a burst, defaults to one second of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        :param tokens: number of tokens to take
+        :return wait: seconds slept before the tokens were available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+def parse_rate_limits(value):
+    """
+    :param value: comma separated service:Operation=calls per second pairs
+    :return dictionary of calls per second keyed by (service, Operation)
+    """
+    limits = {}
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        api, rate = entry.split('=')
+        service, operation = api.strip().split(':')
+        limits[(service.lower(), operation)] = float(rate)
+    return limits
+
+rate_limits = parse_rate_limits(DEFAULT_API_RATE_LIMITS)
+rate_limits.update(parse_rate_limits(os.environ.get('ApiRateLimits', '')))
+buckets = {}
+_lock = threading.Lock()
+
+def get_bucket(service, operation, account=None):
+    """
+    :param service: AWS service name
+    :param operation: API operation name
+    :param account: target account of the client, None for the clients of the central account
+    :return TokenBucket for the API and account, or None when the API is not rate limited
+    """
+    key = (service, operation, account)
+    bucket = buckets.get(key)
+    if bucket is None:
+        rate = rate_limits.get((service, operation))
+        if not rate:
+            return None
+        with _lock:
+            bucket = buckets.setdefault(key, TokenBucket(rate))
+    return bucket
+
+def acquire(service, operation, account=None):
+    """
+    Waits for a token of the API before it is called
+    :return : None
+    """
+    bucket = get_bucket(service, operation, account)
+    if bucket is None:
+        return
+    wait = bucket.acquire()
+    if wait > 0:
+        metrics.record_timing('rate_limit_wait', wait * 1000)
+
+def register(client, account=None):
+    """
+    Rate limits every call made by the client
+    :param client: botocore client
+    :param account: target account of the client, None for the clients of the central account
+    :return : None
+    """
+    service = client.meta.service_model.service_name
+
+    def before_call(model, **kwargs):
+        acquire(service, model.name, account)
+
+    # Registered first so that the limit also applies when another handler answers the call
+    client.meta.events.register_first('before-call', before_call)
@@ -0,0 +1,330 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Streaming replay of archived MGN events through the processors of lambda_function. Records are
+# read from EventBridge archive exports and CloudTrail files (JSON lines, optionally gzip
+# compressed) by a chain of generators, processed in chunks by a process pool and written in
+# batches to the events log group or to a local JSON lines file. Only a bounded number of chunks
+# is in flight, so memory stays constant whatever the size of the archive.
+#
+#   python lambda_function/replay.py archive-2026-10-*.jsonl.gz --output replayed.jsonl --dry-run
+#   python lambda_function/replay.py cloudtrail/*.json.gz --output logs --workers 8
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+
+CLOUDTRAIL_DETAIL_TYPE = 'AWS API Call via CloudTrail'
+DISCONNECTED_STATE = 'DISCONNECTED'
+# A single processor processes the chunks in the main process, a pool would only add overhead
+DEFAULT_WORKERS = os.cpu_count() if (os.cpu_count() or 1) > 1 else 0
+
+def open_archive(path):
+    """
+    :param path: archive file, gzip compressed when it ends with .gz, - reads stdin
+    :return text file object
+    """
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def read_lines(paths):
+    """
+    :param paths: archive files
+    :return generator of the non empty lines of every file
+    """
+    for path in paths:
+        archive = open_archive(path)
+        try:
+            for line in archive:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if archive is not sys.stdin:
+                archive.close()
+
+def parse_records(lines, errors):
+    """
+    :param lines: JSON lines, each an event, a list of events or a CloudTrail file with Records
+    :param errors: dictionary counting the lines that could not be parsed
+    :return generator of raw records
+    """
+    for line in lines:
+        try:
+            document = json.loads(line)
+        except ValueError:
+            errors['unparsable'] = errors.get('unparsable', 0) + 1
+            continue
+        if isinstance(document, list):
+            yield from document
+        elif isinstance(document, dict) and isinstance(document.get('Records'), list):
+            yield from document['Records']
+        else:
+            yield document
+
+def normalize_record(record):
+    """
+    Converts CloudTrail records, raw or delivered by EventBridge, to the layout the
+    DisconnectFromService processor receives from the events rule
+    :param record: raw record of the archive
+    :return event in the layout of the live events
+    """
+    if record.get('detail-type') == CLOUDTRAIL_DETAIL_TYPE:
+        event = dict(record['detail'])
+        event.setdefault('account', record.get('account'))
+        event.setdefault('region', record.get('region'))
+        event.setdefault('time', record.get('time'))
+        event.setdefault('detail', {'state': DISCONNECTED_STATE})
+        return event
+    if 'eventName' in record and 'account' not in record:
+        event = dict(record)
+        event['account'] = record.get('recipientAccountId') or record.get('userIdentity', {}).get('accountId')
+        event['region'] = record.get('awsRegion')
+        event['time'] = record.get('eventTime')
+        event.setdefault('detail', {'state': DISCONNECTED_STATE})
+        return event
+    return record
+
+def chunks(records, size):
+    """
+    :return generator of lists of at most size records
+    """
+    iterator = iter(records)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def process_chunk(records):
+    """
+    Classifies, looks up and processes a chunk of records in a worker process. Source servers are
+    resolved with one describe_source_servers call per (account, region) of the chunk and kept in
+    the source server cache of the worker for the following chunks.
+    :param records: normalized records
+    :return (processed, errors): list of (ProcessedEvent, notify) tuples and a dictionary of error counts
+    """
+    import lambda_function
+    import utils
+    from events import event_registry
+
+    errors = {}
+    classified = []
+    groups = {}
+    for record in records:
+        try:
+            eventtype = event_registry.classify_event(record)
+            event_source_server = lambda_function.get_event_source_server(record, eventtype)
+        except NotImplementedError:
+            errors['unsupported'] = errors.get('unsupported', 0) + 1
+            continue
+        except Exception:
+            errors['unparsable'] = errors.get('unparsable', 0) + 1
+            continue
+        if event_source_server is not None:
+            accountid, region, sourceserverid = event_source_server
+            groups.setdefault((accountid, region), []).append(sourceserverid)
+        classified.append((record, eventtype, event_source_server))
+
+    failed_groups = set()
+    for (accountid, region), sourceserverids in groups.items():
+        try:
+            utils.get_source_servers(accountid, sourceserverids, region)
+        except Exception as err:
+            utils.logger.error('Unable to describe source servers in account {} region {}: {}'.format(accountid, region, err))
+            failed_groups.add((accountid, region))
+
+    processed = []
+    for record, eventtype, event_source_server in classified:
+        processor = event_registry.get_processor(eventtype)
+        source_server = None
+        try:
+            if event_source_server is not None:
+                accountid, region, sourceserverid = event_source_server
+                if (accountid, region) in failed_groups:
+                    errors['lookup_failed'] = errors.get('lookup_failed', 0) + 1
+                    continue
+                source_server = utils.get_source_server(accountid, sourceserverid, region)
+                if processor.validate and not utils.source_server_validation(source_server):
+                    errors['skipped'] = errors.get('skipped', 0) + 1
+                    continue
+            processed.append((lambda_function.process_event_types(record, source_server, eventtype), processor.notify))
+        except Exception:
+            errors['process_failed'] = errors.get('process_failed', 0) + 1
+    return processed, errors
+
+def process_chunks(record_chunks, workers):
+    """
+    :param record_chunks: generator of lists of normalized records
+    :param workers: number of worker processes, 0 processes the chunks in this process
+    :return generator of the results of process_chunk, in the order of the chunks
+    """
+    if workers <= 0:
+        for chunk in record_chunks:
+            yield process_chunk(chunk)
+        return
+    in_flight = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in record_chunks:
+            in_flight.append(executor.submit(process_chunk, chunk))
+            # Bounded read ahead keeps the memory of the replay constant
+            if len(in_flight) >= workers * 2:
+                yield in_flight.pop(0).result()
+        for future in in_flight:
+            yield future.result()
+
+class FileOutput:
+    """
+    Writes processed events as JSON lines to a local file
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, processed_event):
+        self.file.write(processed_event.to_json() + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def event_timestamp(time_stamp):
+    """
+    :param time_stamp: ISO 8601 time stamp of an event, Z suffix accepted
+    :return milliseconds since the epoch, or None when the time stamp cannot be parsed
+    """
+    try:
+        parsed = datetime.fromisoformat(str(time_stamp).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+class LogGroupOutput:
+    """
+    Writes processed events to the events log group through the batched log buffer of utils, with
+    the levels of utils.write_to_cw_logs. The log events carry the time of the original event, so
+    the replayed events sort and query in the log group by when they happened.
+    """
+
+    SEVERITY_LEVELS = {'Critical': 'CRITICAL', 'Major': 'WARN'}
+
+    def __init__(self):
+        import utils
+        self.utils = utils
+        self.log_stream_name = str(os.environ.get('EventsCLoudWatchLogGroup')) + '-MGN-Events'
+
+    def write(self, processed_event):
+        level = self.SEVERITY_LEVELS.get(processed_event.get_event_severity(), 'INFO')
+        self.utils.put_log_events(self.utils.format_log_event(processed_event, level), self.log_stream_name,
+                                  event_timestamp(processed_event.get_time_stamp()))
+
+    def flush(self):
+        for response in self.utils.flush_log_events():
+            if response.get('rejectedLogEventsInfo'):
+                self.utils.logger.warning('CloudWatch Logs rejected replayed events outside of its accepted time range: {}'.format(response['rejectedLogEventsInfo']))
+
+    def close(self):
+        self.flush()
+
+def replay(paths, output, workers, chunk_size, flush_every, dry_run, history=None):
+    """
+    :param paths: archive files
+    :param output: FileOutput or LogGroupOutput
+    :param workers: number of worker processes
+    :param chunk_size: records per chunk sent to a worker
+    :param flush_every: processed events written between two flushes of the output
+    :param dry_run: do not publish notifications to SNS
+    :param history: optional EventHistoryStore every processed event is appended to
+    :return summary: dictionary with the number of records, processed events, notifications and errors
+    """
+    import utils
+
+    summary = {'records': 0, 'processed': 0, 'notified': 0, 'errors': {}}
+    records = (normalize_record(record) for record in parse_records(read_lines(paths), summary['errors']))
+
+    def counted(records):
+        for record in records:
+            summary['records'] += 1
+            yield record
+
+    unflushed = 0
+    for processed, errors in process_chunks(chunks(counted(records), chunk_size), workers):
+        for name, count in errors.items():
+            summary['errors'][name] = summary['errors'].get(name, 0) + count
+        if history is not None:
+            history.append([processed_event for processed_event, notify in processed])
+        for processed_event, notify in processed:
+            output.write(processed_event)
+            summary['processed'] += 1
+            unflushed += 1
+            if notify and not dry_run and utils.publish_event_to_sns_topic(processed_event):
+                summary['notified'] += 1
+        if unflushed >= flush_every:
+            output.flush()
+            if not dry_run:
+                utils.flush_notifications()
+            unflushed = 0
+    output.close()
+    if not dry_run:
+        utils.flush_notifications()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replays archived MGN events through the Central Account Lambda processors.')
+    parser.add_argument('paths', nargs='+', help='EventBridge archive exports or CloudTrail files, JSON lines, optionally .gz, - for stdin')
+    parser.add_argument('--output', default='logs', help='logs writes to the events log group, any other value is a local JSON lines file')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='worker processes, 0 processes in this process')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='records per chunk sent to a worker')
+    parser.add_argument('--flush-every', type=int, default=5000, help='processed events written between two flushes of the output')
+    parser.add_argument('--dry-run', action='store_true', help='do not publish notifications to SNS')
+    parser.add_argument('--history', help='SQLite event history file the processed events are also appended to')
+    args = parser.parse_args(argv)
+
+    # A replay runs for minutes, source server records are kept for the whole run by default
+    os.environ.setdefault('SourceServerCacheTTL', '3600')
+    os.environ.setdefault('SourceServerCacheMaxEntries', '100000')
+    os.environ.setdefault('MetricsEnabled', 'false')
+    os.environ.setdefault('LogLevel', 'WARNING')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    output = LogGroupOutput() if args.output == 'logs' else FileOutput(args.output)
+    started = time.perf_counter()
+    history = None
+    if args.history:
+        import event_history
+        history = event_history.LocalEventHistoryStore(args.history)
+    summary = replay(args.paths, output, args.workers, args.chunk_size, args.flush_every, args.dry_run, history)
+    summary['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Replication trend analysis and breach forecasting. The AWS/MGN metric history of every source
+# server is fetched with GetMetricData, up to 500 metric queries per call, and held in NumPy
+# arrays of servers x periods, so the slopes, moving percentiles and time to breach of the whole
+# fleet are computed in one vectorized pass instead of one call and one loop per server.
+#
+# NumPy is not part of the Lambda runtime. The module is only imported by forecast_handler, whose
+# function runs with a layer providing NumPy, so the event handler does not depend on it.
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import delivery
+from events.event_mapping import ProcessedEvent
+import metrics
+import numpy as np
+import os
+import replication_sweep
+import threading
+from ttl_cache import TTLCache
+import utils
+
+FORECAST_EVENT_TYPE = 'Replication Forecast'
+GET_METRIC_DATA_MAX_QUERIES = 500
+METRIC_NAMESPACE = 'AWS/MGN'
+
+# (AWS/MGN metric, severity key in event_severity.json), metrics with a threshold of 0 are not forecast
+FORECAST_METRICS = [
+    ('LagDuration', 'LagDurationForecast'),
+    ('ElapsedReplicationDuration', 'ReplicationDurationForecast'),
+    ('Backlog', 'BacklogForecast'),
+]
+
+# Forecasts already notified, so that a predicted breach is notified once and not on every run. The
+# record is kept by the container, like the notified breaches of the sweep.
+notified_forecasts = TTLCache(
+    int(os.environ.get('ForecastNotifiedMaxEntries', 50000)),
+    int(os.environ.get('ForecastRenotifySeconds', 21600))
+)
+# Forecasts notified by the current run, recorded in notified_forecasts once they are delivered
+pending_forecasts = []
+_pending_lock = threading.Lock()
+
+def get_forecast_settings():
+    """
+    :return dictionary with the period, lookback and horizon in seconds, the percentile, the
+    number of periods of the moving percentile window and the minimum number of datapoints of a trend
+    """
+    return {
+        'period': int(os.environ.get('ForecastPeriodSeconds', 300)),
+        'lookback': int(os.environ.get('ForecastLookbackSeconds', 10800)),
+        'horizon': int(os.environ.get('ForecastHorizonSeconds', 14400)),
+        'percentile': float(os.environ.get('ForecastPercentile', 90)),
+        'window': int(os.environ.get('ForecastPercentileWindow', 6)),
+        'min_points': int(os.environ.get('ForecastMinPoints', 6)),
+    }
+
+def list_forecast_servers(account, region):
+    """
+    :param account: target account
+    :param region: target region
+    :return servers: list of (source server ID, source server record) of the replicating source servers
+    """
+    client = utils.get_mgn_client(account, region)
+    servers = []
+    with metrics.timer('describe_source_servers'):
+        for page in client.get_paginator('describe_source_servers').paginate(filters={}):
+            for item in page['items']:
+                if item['lifeCycle']['state'] in utils.SKIP_PROCESSING_STATES:
+                    continue
+                source_server_id = utils.parse_source_serverid(item['arn'])
+                source_server = utils.compact_source_server(item)
+                utils.source_server_cache.set((account, region, source_server_id), source_server)
+                servers.append((source_server_id, source_server))
+    return servers
+
+def metric_queries(source_server_ids, metric_names, period):
+    """
+    :param source_server_ids: list of source server IDs
+    :param metric_names: list of AWS/MGN metric names
+    :param period: period of the datapoints in seconds
+    :return queries: GetMetricData queries, the Id m<index> is the flat index metric x server
+    """
+    queries = []
+    for metric_index, metric_name in enumerate(metric_names):
+        for server_index, source_server_id in enumerate(source_server_ids):
+            queries.append({
+                'Id': 'm' + str(metric_index * len(source_server_ids) + server_index),
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': METRIC_NAMESPACE,
+                        'MetricName': metric_name,
+                        'Dimensions': [{'Name': 'SourceServerID', 'Value': source_server_id}]
+                    },
+                    'Period': period,
+                    'Stat': 'Maximum'
+                },
+                'ReturnData': True
+            })
+    return queries
+
+def fetch_query_batch(client, queries, start, end, period, values):
+    """
+    Fetches one batch of at most GET_METRIC_DATA_MAX_QUERIES queries, following NextToken, into values
+    :param values: array of shape (queries, periods) indexed by the flat index of the query Id
+    :return datapoints: number of datapoints received
+    """
+    request = {
+        'MetricDataQueries': queries,
+        'StartTime': datetime.fromtimestamp(start, timezone.utc),
+        'EndTime': datetime.fromtimestamp(end, timezone.utc),
+        'ScanBy': 'TimestampAscending'
+    }
+    datapoints = 0
+    while True:
+        with metrics.timer('get_metric_data'):
+            response = client.get_metric_data(**request)
+        for result in response['MetricDataResults']:
+            if not result['Timestamps']:
+                continue
+            timestamps = np.fromiter((timestamp.timestamp() for timestamp in result['Timestamps']), dtype=np.float64, count=len(result['Timestamps']))
+            columns = ((timestamps - start) // period).astype(np.int64)
+            inside = (columns >= 0) & (columns < values.shape[1])
+            values[int(result['Id'][1:]), columns[inside]] = np.asarray(result['Values'], dtype=np.float64)[inside]
+            datapoints += int(inside.sum())
+        if not response.get('NextToken'):
+            return datapoints
+        request['NextToken'] = response['NextToken']
+
+def fetch_metric_matrix(client, source_server_ids, metric_names, start, end, period, max_workers=None):
+    """
+    :param client: CloudWatch client of the target account
+    :param source_server_ids: list of source server IDs
+    :param metric_names: list of AWS/MGN metric names
+    :param start: start of the history, epoch seconds aligned to the period
+    :param end: end of the history, epoch seconds aligned to the period
+    :param period: period of the datapoints in seconds
+    :param max_workers: number of GetMetricData calls made at the same time
+    :return values: array of shape (metrics, servers, periods), NaN where a period has no datapoint
+    """
+    if max_workers is None:
+        max_workers = int(os.environ.get('ForecastFetchConcurrency', 4))
+    periods = int((end - start) // period)
+    values = np.full((len(metric_names) * len(source_server_ids), periods), np.nan)
+    queries = metric_queries(source_server_ids, metric_names, period)
+    batches = [queries[index:index + GET_METRIC_DATA_MAX_QUERIES] for index in range(0, len(queries), GET_METRIC_DATA_MAX_QUERIES)]
+    if batches:
+        # The batches write disjoint rows of values
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+            datapoints = sum(executor.map(lambda batch: fetch_query_batch(client, batch, start, end, period, values), batches))
+        metrics.increment('forecast_datapoints', datapoints)
+    return values.reshape(len(metric_names), len(source_server_ids), periods)
+
+def moving_percentile(values, window, percentile):
+    """
+    :param values: array of shape (series, periods), NaN where a period has no datapoint
+    :param window: number of periods of the window
+    :param percentile: percentile between 0 and 100
+    :return array of shape (series, periods - window + 1) with the percentile of every window,
+    interpolated linearly like numpy.nanpercentile, NaN for windows without a datapoint
+
+    numpy.nanpercentile falls back to a loop over the windows as soon as one of them holds a NaN,
+    so the windows are sorted, NaN last, and the percentile is taken by index instead.
+    """
+    windows = np.sort(np.lib.stride_tricks.sliding_window_view(values, window, axis=-1), axis=-1)
+    counts = (~np.isnan(windows)).sum(axis=-1)
+    position = np.maximum(counts - 1, 0) * (percentile / 100.0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    lower_values = np.take_along_axis(windows, lower[..., np.newaxis], axis=-1)[..., 0]
+    upper_values = np.take_along_axis(windows, upper[..., np.newaxis], axis=-1)[..., 0]
+    result = lower_values + (upper_values - lower_values) * (position - lower)
+    return np.where(counts > 0, result, np.nan)
+
+def analyze_series(values, offsets, threshold, settings):
+    """
+    Computes the trend of every series in one vectorized pass
+    :param values: array of shape (series, periods), NaN where a period has no datapoint
+    :param offsets: array of shape (periods,), seconds of every period relative to the end of the history
+    :param threshold: breach threshold of the metric
+    :param settings: dictionary returned by get_forecast_settings
+    :return analysis: dictionary of arrays of shape (series,) with the number of datapoints, the
+    least squares slope per second, the latest moving percentile (level) and the seconds until the
+    level reaches the threshold at that slope, NaN when it does not within the trend
+    """
+    valid = ~np.isnan(values)
+    points = valid.sum(axis=1)
+    x = np.where(valid, offsets, 0.0)
+    y = np.where(valid, values, 0.0)
+    sum_x = x.sum(axis=1)
+    sum_y = y.sum(axis=1)
+    denominator = points * (x * x).sum(axis=1) - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(
+            (points >= settings['min_points']) & (denominator > 0),
+            (points * (x * y).sum(axis=1) - sum_x * sum_y) / denominator,
+            np.nan
+        )
+
+    # Moving percentile over the last window periods, so that a single spike does not set the level
+    window = max(1, min(settings['window'], values.shape[1]))
+    level = moving_percentile(values, window, settings['percentile'])[:, -1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        time_to_breach = np.where((slope > 0) & (level < threshold), (threshold - level) / slope, np.nan)
+    return {
+        'points': points,
+        'slope': slope,
+        'level': level,
+        'time_to_breach': time_to_breach,
+    }
+
+def forecast_target(account, region, thresholds, settings, now):
+    """
+    :param account: target account
+    :param region: target region
+    :param thresholds: dictionary returned by replication_sweep.get_thresholds
+    :param settings: dictionary returned by get_forecast_settings
+    :param now: time of the run, epoch seconds
+    :return (servers, processed_events): number of source servers analyzed and the predicted breaches
+    """
+    metrics.begin_event(FORECAST_EVENT_TYPE, account)
+    try:
+        forecast_metrics = [(metric_name, severity_key) for metric_name, severity_key in FORECAST_METRICS if thresholds.get(metric_name, 0) > 0]
+        servers = list_forecast_servers(account, region)
+        if not servers or not forecast_metrics:
+            return len(servers), []
+        period = settings['period']
+        end = now - now % period
+        start = end - settings['lookback']
+        client = utils.get_target_client('cloudwatch', account, region)
+        values = fetch_metric_matrix(client, [source_server_id for source_server_id, source_server in servers], [metric_name for metric_name, severity_key in forecast_metrics], start, end, period)
+        offsets = np.arange(start, end, period, dtype=np.float64)[:values.shape[2]] - end
+
+        time_stamp = datetime.fromtimestamp(end, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        processed_events = []
+        with metrics.timer('forecast_analysis'):
+            for metric_index, (metric_name, severity_key) in enumerate(forecast_metrics):
+                threshold = thresholds[metric_name]
+                analysis = analyze_series(values[metric_index], offsets, threshold, settings)
+                for server_index in np.flatnonzero(analysis['time_to_breach'] <= settings['horizon']):
+                    source_server_id, source_server = servers[server_index]
+                    time_to_breach = float(analysis['time_to_breach'][server_index])
+                    event_detail = {
+                        'metric': metric_name,
+                        'threshold': threshold,
+                        'level': round(float(analysis['level'][server_index]), 3),
+                        'slope_per_hour': round(float(analysis['slope'][server_index]) * 3600, 3),
+                        'points': int(analysis['points'][server_index]),
+                        'hours_to_breach': round(time_to_breach / 3600, 2),
+                        'predicted_breach_time': datetime.fromtimestamp(end + time_to_breach, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    }
+                    processed_events.append(ProcessedEvent(
+                        account, region, FORECAST_EVENT_TYPE + ' : ' + metric_name, time_stamp, source_server_id,
+                        source_server['sourceProperties']['identificationHints'].get('fqdn'), event_detail,
+                        utils.get_severity(severity_key, account, region, source_server)
+                    ))
+        metrics.increment('forecast_servers', len(servers))
+        return len(servers), processed_events
+    finally:
+        metrics.end_event(region=region)
+
+def run_forecast(targets, max_workers=None):
+    """
+    Forecasts every target concurrently and sends the predicted breaches through the delivery sinks. The
+    notified forecasts are only recorded by record_notified_forecasts, once the caller flushed the deliveries.
+    :param targets: list of (account, region) tuples
+    :param max_workers: number of targets analyzed at the same time
+    :return summary: dictionary with the number of servers, predicted breaches, notifications and failed targets
+    """
+    if max_workers is None:
+        max_workers = int(os.environ.get('ForecastConcurrency', 4))
+    thresholds = replication_sweep.get_thresholds()
+    settings = get_forecast_settings()
+    now = int(datetime.now(timezone.utc).timestamp())
+    summary = {'servers': 0, 'predicted': 0, 'notified': 0, 'failed_targets': []}
+    if not targets:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        futures = {executor.submit(forecast_target, account, region, thresholds, settings, now): (account, region) for account, region in targets}
+        for future, (account, region) in futures.items():
+            try:
+                servers, processed_events = future.result()
+            except Exception as err:
+                utils.logger.error('Unable to forecast account {} region {}: {}'.format(account, region, err))
+                summary['failed_targets'].append('{}:{}'.format(account, region))
+                continue
+            summary['servers'] += servers
+            for processed_event in processed_events:
+                summary['predicted'] += 1
+                forecast_key = (account, region, processed_event.get_source_server_id(), processed_event.get_event_type())
+                notify = notified_forecasts.get(forecast_key) is None
+                if notify:
+                    with _pending_lock:
+                        pending_forecasts.append(forecast_key)
+                    summary['notified'] += 1
+                delivery.deliver(processed_event, notify=notify)
+    return summary
+
+def drain_pending_forecasts():
+    """
+    :return forecast_keys: the forecasts notified since the last call, to be recorded with record_notified_forecasts
+    """
+    with _pending_lock:
+        forecast_keys = list(pending_forecasts)
+        del pending_forecasts[:]
+    return forecast_keys
+
+def record_notified_forecasts(forecast_keys):
+    """
+    :param forecast_keys: forecasts returned by drain_pending_forecasts whose notifications were delivered
+    :return : None - the forecasts are not notified again for ForecastRenotifySeconds
+    """
+    for forecast_key in forecast_keys:
+        notified_forecasts.set(forecast_key, True)
@@ -0,0 +1,260 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Scheduled fleet wide replication sweep. Instead of relying on two CloudWatch alarms per source
+# server, the sweep pages through describe_source_servers in every configured target account and
+# region concurrently and derives stalled, lag, backlog and elapsed replication events from the
+# dataReplicationInfo of each server.
+
+import botocore.exceptions
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import delivery
+from events.event_mapping import ProcessedEvent
+import metrics
+import os
+import re
+import threading
+from ttl_cache import TTLCache
+import utils
+
+SWEEP_EVENT_TYPE = 'Replication Sweep'
+# Conditions evaluated for every source server
+SWEEP_BREACHES = ('Stalled', 'LagDuration', 'Backlog', 'ElapsedReplicationDuration')
+
+ISO8601_DURATION = re.compile(
+    r'^P(?:(?P<days>\d+(?:\.\d+)?)D)?(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$'
+)
+
+# Breaches already notified, so that a breach is notified once and not on every sweep. The record
+# is kept by the container, a sweep running in a new container notifies the open breaches again.
+notified_breaches = TTLCache(
+    int(os.environ.get('SweepNotifiedBreachesMaxEntries', 50000)),
+    int(os.environ.get('SweepRenotifySeconds', 21600))
+)
+# (breach key, recovered) of the breaches and recoveries notified by the current sweep, recorded in
+# notified_breaches once they are delivered
+pending_breaches = []
+_pending_lock = threading.Lock()
+
+def parse_sweep_targets(value):
+    """
+    :param value: comma separated list of account:region pairs, for example 111111111111:us-east-1,222222222222:eu-west-1
+    :return targets: list of (account, region) tuples
+    """
+    targets = []
+    for target in (value or '').split(','):
+        target = target.strip()
+        if not target:
+            continue
+        account, region = target.split(':', 1)
+        targets.append((account.strip(), region.strip()))
+    return targets
+
+def parse_iso8601_duration(duration):
+    """
+    :param duration: ISO 8601 duration as reported by MGN, for example PT1H30M
+    :return seconds (float) or None if the duration is missing or not parsable
+    """
+    if not duration:
+        return None
+    match = ISO8601_DURATION.match(duration)
+    if match is None:
+        return None
+    parts = {name: float(value) for name, value in match.groupdict().items() if value}
+    return parts.get('days', 0) * 86400 + parts.get('hours', 0) * 3600 + parts.get('minutes', 0) * 60 + parts.get('seconds', 0)
+
+def parse_timestamp(value):
+    """
+    :param value: ISO 8601 timestamp string or datetime
+    :return timezone aware datetime or None
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def get_thresholds():
+    """
+    :return dictionary of sweep thresholds, named like the target account alarm settings
+    """
+    return {
+        'LagDuration': float(os.environ.get('LagDuration_Threshold', 3600)),
+        'ElapsedReplicationDuration': float(os.environ.get('ElapsedReplicationDuration_Threshold', 7776000)),
+        'Backlog': float(os.environ.get('Backlog_Threshold', 0)),
+    }
+
+def replication_metrics(item, now):
+    """
+    :param item: source server item from describe_source_servers
+    :param now: time of the sweep
+    :return dictionary with state, lag_seconds, backlog_bytes and elapsed_seconds of the server
+    """
+    replication_info = item.get('dataReplicationInfo') or {}
+    started = parse_timestamp((replication_info.get('dataReplicationInitiation') or {}).get('startDateTime'))
+    return {
+        'state': replication_info.get('dataReplicationState'),
+        'lag_seconds': parse_iso8601_duration(replication_info.get('lagDuration')),
+        'backlog_bytes': sum(disk.get('backloggedStorageBytes', 0) for disk in replication_info.get('replicatedDisks', [])),
+        'elapsed_seconds': (now - started).total_seconds() if started else None,
+    }
+
+def evaluate_source_server(account, region, item, thresholds, now):
+    """
+    :param account: target account of the source server
+    :param region: region of the source server
+    :param item: source server item from describe_source_servers
+    :param thresholds: dictionary returned by get_thresholds
+    :param now: time of the sweep
+    :return processed_events: list of ProcessedEvents for every breached condition, and a recovery for
+    every condition whose breach was notified by an earlier sweep and no longer holds
+    """
+    if item['lifeCycle']['state'] in utils.SKIP_PROCESSING_STATES:
+        return []
+    replication_info = replication_metrics(item, now)
+    source_server_id = utils.parse_source_serverid(item['arn'])
+    fqdn = item['sourceProperties']['identificationHints'].get('fqdn')
+    time_stamp = now.strftime('%Y-%m-%dT%H:%M:%SZ')
+    event_detail = {
+        'state': replication_info['state'],
+        'lifecycle_state': item['lifeCycle']['state'],
+        'lag_seconds': replication_info['lag_seconds'],
+        'backlog_bytes': replication_info['backlog_bytes'],
+        'elapsed_seconds': replication_info['elapsed_seconds'],
+    }
+
+    breaches = []
+    if replication_info['state'] == 'STALLED':
+        breaches.append(('Stalled', 'Stalled'))
+    if replication_info['lag_seconds'] is not None and replication_info['lag_seconds'] > thresholds['LagDuration']:
+        breaches.append(('LagDuration', 'LagDuration'))
+    if thresholds['Backlog'] > 0 and replication_info['backlog_bytes'] > thresholds['Backlog']:
+        breaches.append(('Backlog', 'Backlog'))
+    if replication_info['elapsed_seconds'] is not None and replication_info['elapsed_seconds'] > thresholds['ElapsedReplicationDuration']:
+        breaches.append(('ElapsedReplicationDuration', 'ReplicationDuration'))
+
+    processed_events = [
+        ProcessedEvent(account, region, SWEEP_EVENT_TYPE + ' : ' + breach, time_stamp, source_server_id, fqdn, event_detail, utils.get_severity(severity_key, account, region, item))
+        for breach, severity_key in breaches
+    ]
+    breached = [breach for breach, severity_key in breaches]
+    for breach in SWEEP_BREACHES:
+        event_type = SWEEP_EVENT_TYPE + ' : ' + breach
+        if breach not in breached and notified_breaches.get((account, region, source_server_id, event_type)) is not None:
+            recovery_detail = dict(event_detail, recovered=True)
+            processed_events.append(ProcessedEvent(account, region, event_type, time_stamp, source_server_id, fqdn, recovery_detail, utils.get_severity('Recovery', account, region, item)))
+    return processed_events
+
+def sweep_target(account, region, thresholds, now):
+    """
+    :param account: target account to sweep
+    :param region: region to sweep
+    :param thresholds: dictionary returned by get_thresholds
+    :param now: time of the sweep
+    :return (servers, processed_events): number of source servers seen and the breaches found
+    """
+    metrics.begin_event(SWEEP_EVENT_TYPE, account)
+    try:
+        client = utils.get_mgn_client(account, region)
+        paginator = client.get_paginator('describe_source_servers')
+        servers = 0
+        processed_events = []
+        try:
+            with metrics.timer('describe_source_servers'):
+                for page in paginator.paginate(filters={}):
+                    for item in page['items']:
+                        servers += 1
+                        utils.source_server_cache.set((account, region, utils.parse_source_serverid(item['arn'])), utils.compact_source_server(item))
+                        processed_events.extend(evaluate_source_server(account, region, item, thresholds, now))
+        except botocore.exceptions.ClientError as err:
+            if err.response['Error']['Code'] in utils.ROLE_FAILURE_ERROR_CODES:
+                utils.mgn_client_cache.invalidate((account, region, 'mgn'))
+                utils.record_role_failure(account, err)
+            raise err
+        metrics.increment('swept_servers', servers)
+        return servers, processed_events
+    finally:
+        metrics.end_event(region=region)
+
+def run_sweep(targets, max_workers=None):
+    """
+    Sweeps every target concurrently and sends the breaches through the delivery sinks. The notified
+    breaches are only recorded by record_notified_breaches, once the caller flushed the deliveries.
+    :param targets: list of (account, region) tuples
+    :param max_workers: number of targets swept at the same time
+    :return summary: dictionary with the number of servers, breaches, notifications, recoveries and failed targets
+    """
+    if max_workers is None:
+        max_workers = int(os.environ.get('SweepConcurrency', 8))
+    thresholds = get_thresholds()
+    now = datetime.now(timezone.utc)
+    summary = {'servers': 0, 'breaches': 0, 'notified': 0, 'recoveries': 0, 'failed_targets': []}
+    if not targets:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        futures = {executor.submit(sweep_target, account, region, thresholds, now): (account, region) for account, region in targets}
+        for future, (account, region) in futures.items():
+            try:
+                servers, processed_events = future.result()
+            except Exception as err:
+                utils.logger.error('Unable to sweep account {} region {}: {}'.format(account, region, err))
+                summary['failed_targets'].append('{}:{}'.format(account, region))
+                continue
+            summary['servers'] += servers
+            for processed_event in processed_events:
+                breach_key = (account, region, processed_event.get_source_server_id(), processed_event.get_event_type())
+                if processed_event.is_recovery():
+                    summary['recoveries'] += 1
+                    with _pending_lock:
+                        pending_breaches.append((breach_key, True))
+                    delivery.deliver(processed_event)
+                    continue
+                summary['breaches'] += 1
+                notify = notified_breaches.get(breach_key) is None
+                if notify:
+                    with _pending_lock:
+                        pending_breaches.append((breach_key, False))
+                    summary['notified'] += 1
+                delivery.deliver(processed_event, notify=notify)
+    return summary
+
+def drain_pending_breaches():
+    """
+    :return breaches: the (breach key, recovered) pairs notified since the last call, to be recorded with record_notified_breaches
+    """
+    with _pending_lock:
+        breaches = list(pending_breaches)
+        del pending_breaches[:]
+    return breaches
+
+def record_notified_breaches(breaches):
+    """
+    :param breaches: (breach key, recovered) pairs returned by drain_pending_breaches whose notifications were delivered
+    :return : None - a breach is not notified again for SweepRenotifySeconds, a recovered breach is notified again as soon as it recurs
+    """
+    for breach_key, recovered in breaches:
+        if recovered:
+            notified_breaches.invalidate(breach_key)
+        else:
+            notified_breaches.set(breach_key, True)
@@ -0,0 +1,226 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Severity policy engine. The policy file holds default severities per severity key and an ordered
+# list of rules matching on the event type, alarm state, account, region, lifecycle state, FQDN
+# patterns and tags of the source server. Rules are compiled once into buckets indexed by
+# (event type, alarm state), so evaluating an event only checks the few rules of its bucket.
+# A PolicySource reloads the file when its modification time, or the S3 object version, changes.
+#
+# The flat {"Stalled": "Critical", ...} layout of event_severity.json is a policy without rules.
+
+import fnmatch
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger()
+
+DEFAULT_SEVERITY = 'Major'
+# Fields of a rule's "match" object, every field is optional and takes a value or a list of values
+MATCH_FIELDS = ('event_type', 'alarm_state', 'account', 'region', 'lifecycle_state', 'fqdn', 'tags')
+
+def as_values(value):
+    """
+    :param value: a value, a list of values or None
+    :return frozenset of the values as strings, or None when the field is not matched on
+    """
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return frozenset(str(item) for item in value)
+    return frozenset([str(value)])
+
+class PolicyRule:
+    """
+    A compiled rule. The event type and alarm state are resolved by the index of CompiledPolicy,
+    matches checks the remaining fields with set lookups and one precompiled regular expression.
+    """
+
+    __slots__ = ('index', 'name', 'severity', 'event_types', 'alarm_states', 'accounts', 'regions', 'lifecycle_states', 'fqdn_pattern', 'tags')
+
+    def __init__(self, index, rule):
+        """
+        :param index: position of the rule in the policy, the first matching rule wins
+        :param rule: dictionary with a "severity", an optional "name" and an optional "match" object
+        """
+        match = rule.get('match') or {}
+        unknown = set(match) - set(MATCH_FIELDS)
+        if unknown:
+            raise ValueError('Unknown match fields {} in severity rule {}'.format(sorted(unknown), rule.get('name', index)))
+        if not rule.get('severity'):
+            raise ValueError('The severity rule {} has no severity'.format(rule.get('name', index)))
+        self.index = index
+        self.name = rule.get('name', 'rule-' + str(index))
+        self.severity = rule['severity']
+        self.event_types = as_values(match.get('event_type'))
+        self.alarm_states = as_values(match.get('alarm_state'))
+        self.accounts = as_values(match.get('account'))
+        self.regions = as_values(match.get('region'))
+        self.lifecycle_states = as_values(match.get('lifecycle_state'))
+        fqdn_patterns = as_values(match.get('fqdn'))
+        self.fqdn_pattern = re.compile('|'.join(fnmatch.translate(pattern) for pattern in sorted(fqdn_patterns)), re.IGNORECASE) if fqdn_patterns else None
+        self.tags = {key: as_values(value) for key, value in (match.get('tags') or {}).items()}
+
+    def matches(self, account, region, lifecycle_state, fqdn, tags):
+        if self.accounts is not None and account not in self.accounts:
+            return False
+        if self.regions is not None and region not in self.regions:
+            return False
+        if self.lifecycle_states is not None and lifecycle_state not in self.lifecycle_states:
+            return False
+        if self.fqdn_pattern is not None and (not fqdn or self.fqdn_pattern.match(fqdn) is None):
+            return False
+        for key, values in self.tags.items():
+            # A tag given without values only has to be present
+            if key not in tags or (values is not None and tags[key] not in values):
+                return False
+        return True
+
+class CompiledPolicy:
+    """
+    Defaults and rules of a policy document, with the rules indexed by (event type, alarm state).
+    """
+
+    def __init__(self, document):
+        """
+        :param document: parsed policy file, either {"version", "defaults", "rules"} or a flat map of defaults
+        """
+        if 'rules' in document or 'defaults' in document:
+            self.version = document.get('version')
+            self.defaults = dict(document.get('defaults') or {})
+            rules = document.get('rules') or []
+        else:
+            self.version = None
+            self.defaults = dict(document)
+            rules = []
+        self.default_severity = self.defaults.get('Default', DEFAULT_SEVERITY)
+        self.rules = [PolicyRule(index, rule) for index, rule in enumerate(rules)]
+
+        # None stands for a rule that matches any event type or alarm state
+        self._buckets = {}
+        for rule in self.rules:
+            for event_type in rule.event_types or [None]:
+                for alarm_state in rule.alarm_states or [None]:
+                    self._buckets.setdefault((event_type, alarm_state), []).append(rule)
+        self._candidates = {}
+
+    def candidates(self, event_type, alarm_state):
+        """
+        :return tuple of the rules that can match the event type and alarm state, in policy order
+        """
+        key = (event_type, alarm_state)
+        rules = self._candidates.get(key)
+        if rules is None:
+            merged = {}
+            for bucket_key in ((event_type, alarm_state), (event_type, None), (None, alarm_state), (None, None)):
+                for rule in self._buckets.get(bucket_key, ()):
+                    merged[rule.index] = rule
+            rules = tuple(merged[index] for index in sorted(merged))
+            self._candidates[key] = rules
+        return rules
+
+    def evaluate(self, event_type, account=None, region=None, alarm_state=None, lifecycle_state=None, fqdn=None, tags=None):
+        """
+        :param event_type: severity key of the event, for example Stalled or ReplicationDuration
+        :param account: account of the event
+        :param region: region of the event
+        :param alarm_state: CloudWatch alarm state of alarm events, for example ALARM
+        :param lifecycle_state: lifecycle state of the source server
+        :param fqdn: FQDN of the source server
+        :param tags: dictionary of the source server tags
+        :return severity: severity of the first matching rule, else the default of the event type
+        """
+        for rule in self.candidates(event_type, alarm_state):
+            if rule.matches(account, region, lifecycle_state, fqdn, tags or {}):
+                return rule.severity
+        return self.defaults.get(event_type, self.default_severity)
+
+class PolicySource:
+    """
+    Keeps the compiled policy of a local file or an s3://bucket/key object. The file is checked at
+    most every check_seconds, with a stat of the file or a head_object call, and only read and
+    compiled again when it changed.
+    """
+
+    def __init__(self, location, check_seconds=30):
+        """
+        :param location: path of the policy file, or s3://bucket/key
+        :param check_seconds: seconds between two checks for a new version, 0 checks on every call
+        """
+        self.location = location
+        self.check_seconds = check_seconds
+        self.policy = None
+        self.version = None
+        self.checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        :return CompiledPolicy, reloaded when the source changed since the last check
+        """
+        now = time.monotonic()
+        if self.policy is not None and now - self.checked_at < self.check_seconds:
+            return self.policy
+        with self._lock:
+            if self.policy is None or now - self.checked_at >= self.check_seconds:
+                self.checked_at = now
+                self._refresh()
+        return self.policy
+
+    def _refresh(self):
+        try:
+            version = self._current_version()
+            if self.policy is not None and version == self.version:
+                return
+            policy = CompiledPolicy(self._read())
+        except Exception as err:
+            if self.policy is None:
+                raise err
+            # A broken or unreachable policy keeps the previous one in force
+            logger.error('Unable to reload the severity policy {}, keeping version {}: {}'.format(self.location, self.version, err))
+            return
+        self.policy = policy
+        self.version = version
+        logger.info('Loaded severity policy {} version {} with {} rules'.format(self.location, policy.version, len(policy.rules)))
+
+    def _current_version(self):
+        if self.location.startswith('s3://'):
+            bucket, key = self._s3_object()
+            response = self._s3_client().head_object(Bucket=bucket, Key=key)
+            return response.get('VersionId') or response['ETag']
+        stat = os.stat(self.location)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self):
+        if self.location.startswith('s3://'):
+            bucket, key = self._s3_object()
+            return json.loads(self._s3_client().get_object(Bucket=bucket, Key=key)['Body'].read())
+        with open(self.location, 'r') as policy_file:
+            return json.load(policy_file)
+
+    def _s3_object(self):
+        bucket, _, key = self.location[len('s3://'):].partition('/')
+        return bucket, key
+
+    def _s3_client(self):
+        import client_factory
+        return client_factory.get_client('s3')
@@ -0,0 +1,169 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Storm correlation. When a replication server, staging subnet or network link fails, many source
+# servers of the same account and region report Stalled or LagDuration events within seconds. A
+# sliding window counts the distinct source servers reporting these events per (account, region).
+# Once the count reaches the threshold an incident is opened, and the following events are attached to it without any source server lookup
+# so that a single incident notification lists the affected hosts. An incident closes after a quiet
+# period, or once it is older than its maximum age, with a summary listing every attached host.
+
+from collections import Counter, deque
+import threading
+import time
+import uuid
+
+class Incident:
+    """
+    A storm of events in one account and region
+    """
+
+    def __init__(self, account, region, opened_at):
+        self.incident_id = 'storm-' + uuid.uuid4().hex[:12]
+        self.account = account
+        self.region = region
+        self.opened_at = opened_at
+        self.last_event_at = opened_at
+        self.hosts = {}
+        self.event_types = set()
+        self.events = 0
+        self.notified = False
+        self.closed = False
+
+    def attach(self, source_server_id, event_type, fqdn, now):
+        """
+        :param source_server_id: MGN source server id of the event
+        :param event_type: event type of the event
+        :param fqdn: host name of the source server when known, the id otherwise
+        :param now: monotonic time of the event
+        :return : None
+        """
+        self.hosts.setdefault(source_server_id, fqdn or source_server_id)
+        self.event_types.add(event_type)
+        self.events += 1
+        self.last_event_at = now
+
+class StormCorrelator:
+    """
+    Thread safe sliding window correlator of events per (account, region). State is kept per
+    container, an SQS batch of a storm is therefore correlated by the container receiving it.
+    """
+
+    def __init__(self, window_seconds, threshold, quiet_seconds, max_seconds=0):
+        """
+        :param window_seconds: length of the sliding window
+        :param threshold: number of distinct source servers reporting an event in the window opening an incident, 0 disables correlation
+        :param quiet_seconds: time without events after which an incident is closed
+        :param max_seconds: age after which an incident is closed even while events keep arriving, 0 for no limit
+        """
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.quiet_seconds = quiet_seconds
+        self.max_seconds = max_seconds
+        self._windows = {}
+        self._incidents = {}
+        self._closed = []
+        self._lock = threading.Lock()
+
+    def _expired(self, incident, now):
+        if now - incident.last_event_at > self.quiet_seconds:
+            return True
+        return self.max_seconds > 0 and now - incident.opened_at > self.max_seconds
+
+    def _close(self, key):
+        incident = self._incidents.pop(key)
+        incident.closed = True
+        self._closed.append(incident)
+
+    def observe(self, account, region, source_server_id, event_type, fqdn=None, now=None):
+        """
+        Counts the source server of an event in the window of its account and region
+        :param fqdn: host name of the source server when known without a lookup
+        :param now: monotonic time of the event, defaults to now
+        :return incident: the open Incident the event is attached to, or None when the event must be processed normally
+        """
+        if self.threshold <= 0:
+            return None
+        if now is None:
+            now = time.monotonic()
+        key = (account, region)
+        with self._lock:
+            incident = self._incidents.get(key)
+            if incident is not None and self._expired(incident, now):
+                self._close(key)
+                incident = None
+            if incident is not None:
+                incident.attach(source_server_id, event_type, fqdn, now)
+                return incident
+
+            window, servers = self._windows.setdefault(key, (deque(), Counter()))
+            window.append((now, source_server_id, event_type, fqdn))
+            servers[source_server_id] += 1
+            while window and now - window[0][0] > self.window_seconds:
+                expired_server_id = window.popleft()[1]
+                servers[expired_server_id] -= 1
+                if servers[expired_server_id] <= 0:
+                    del servers[expired_server_id]
+            # A single source server repeating its events does not make a storm
+            if len(servers) < self.threshold:
+                return None
+
+            # The events of the window were processed normally, their hosts are listed in the incident
+            incident = Incident(account, region, now)
+            for _, window_server_id, window_event_type, window_fqdn in window:
+                incident.attach(window_server_id, window_event_type, window_fqdn, now)
+            self._incidents[key] = incident
+            window.clear()
+            servers.clear()
+            return incident
+
+    def pending_notifications(self, now=None):
+        """
+        Closes the expired incidents
+        :param now: monotonic time, defaults to now
+        :return list of the open incidents whose notification was not sent yet, marked as notified,
+                followed by the closed incidents whose summary was not sent yet
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            for key, incident in list(self._incidents.items()):
+                if self._expired(incident, now):
+                    self._close(key)
+            incidents = [incident for incident in self._incidents.values() if not incident.notified]
+            for incident in incidents:
+                incident.notified = True
+            incidents.extend(self._closed)
+            self._closed = []
+        return incidents
+
+    def requeue(self, incidents):
+        """
+        :param incidents: incidents whose notification could not be delivered
+        :return : None - the incidents still open and the summaries of the closed incidents are returned again by pending_notifications
+        """
+        with self._lock:
+            for incident in incidents:
+                if incident.closed:
+                    self._closed.append(incident)
+                elif self._incidents.get((incident.account, incident.region)) is incident:
+                    incident.notified = False
+
+    def open_incidents(self):
+        with self._lock:
+            return list(self._incidents.values())
@@ -16,18 +16,97 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
 #########################################################################################
 
-import boto3
 import botocore.exceptions
+from circuit_breaker import CircuitBreaker
+import client_factory
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+from events import event_registry
 import logging
+from log_buffer import LogBuffer
+import idempotency
+import message_templates
+import metrics
+import notification_digest
+import severity_policy
+from storm_correlator import StormCorrelator
+from ttl_cache import TTLCache
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
+if not logger.handlers:
+    # The Lambda runtime installs its own handler, only local runs need one
+    logging.basicConfig()
+logger.setLevel(os.environ.get('LogLevel', 'INFO'))
 
-cw_logs = boto3.client('logs')
-sns = boto3.client('sns')
+# Log events are buffered and written once at the end of an invocation or batch by flush_log_events
+log_buffer = LogBuffer(
+    lambda: client_factory.get_client('logs'),
+    os.environ.get('EventsCLoudWatchLogGroup'),
+    stdout=os.environ.get('EventsLogMode', 'api').lower() == 'stdout'
+)
+
+# Notifications are combined per account, region, event type and window and published by flush_notifications
+digest = notification_digest.NotificationDigest(
+    int(os.environ.get('NotificationDigestWindowSeconds', 300)),
+    int(os.environ.get('FlapSuppressionSeconds', 900))
+)
+
+# SNS message templates, resolved once per event type
+notification_renderer = message_templates.MessageRenderer(message_templates.NOTIFICATION_TEMPLATES, message_templates.NOTIFICATION_RECOVERY_TEMPLATES)
+
+# Keys of processed events, used to drop duplicate deliveries before any remote call is made
+idempotency_store = None
+if os.environ.get('IdempotencyStore', '').lower() == 'local':
+    idempotency_store = idempotency.LocalIdempotencyStore(os.environ.get('IdempotencyStorePath', '/tmp/mgn-idempotency.db'))
+idempotency_cache = idempotency.IdempotencyCache(
+    int(os.environ.get('IdempotencyTTL', 86400)),
+    int(os.environ.get('IdempotencyCacheMaxEntries', 10000)),
+    idempotency_store
+)
+
+CENTRAL_ACCOUNT_ROLE_NAME = 'MGN-Monitoring-Generic-Central-Account-Lambda-Role'
+SKIP_PROCESSING_STATES = ['TESTING', 'READY_FOR_CUTOVER', 'CUTTING_OVER', 'CUTOVER', 'DISCONNECTED']
+ACCESS_DENIED_ERROR_CODES = ['AccessDenied', 'AccessDeniedException', 'UnauthorizedOperation', 'ExpiredToken', 'ExpiredTokenException']
+# Errors meaning the monitoring role of a target account is missing or denies access
+ROLE_FAILURE_ERROR_CODES = ['AccessDenied', 'AccessDeniedException', 'UnauthorizedOperation', 'NoSuchEntity']
+
+# Target accounts whose monitoring role failed are not called again until the circuit is half open
+account_circuit_breaker = CircuitBreaker(
+    int(os.environ.get('CircuitBreakerFailureThreshold', 1)),
+    int(os.environ.get('CircuitBreakerOpenSeconds', 300))
+)
+
+# Assumed role clients of the target accounts keyed by (account, region, service), reused across warm invocations
+mgn_client_cache = TTLCache(
+    int(os.environ.get('MGNClientCacheMaxEntries', 256)),
+    int(os.environ.get('MGNClientCacheTTL', 3000))
+)
+credential_refresh_margin = int(os.environ.get('CredentialRefreshMarginSeconds', 300))
+
+DESCRIBE_SOURCE_SERVERS_MAX_IDS = 200
+
+# Events per (account, region) within StormWindowSeconds that open a storm incident, see storm_correlator
+storm_correlator = StormCorrelator(
+    int(os.environ.get('StormWindowSeconds', 60)),
+    int(os.environ.get('StormThreshold', 10)),
+    int(os.environ.get('StormQuietSeconds', 300)),
+    int(os.environ.get('StormMaxIncidentSeconds', 3600))
+)
+STORM_EVENT_TYPES = [event_type.strip() for event_type in os.environ.get('StormEventTypes', 'Stalled,LagDuration').split(',') if event_type.strip()]
+STORM_MAX_HOSTS = int(os.environ.get('StormMaxHosts', 200))
+
+# Severity policy, event_severity.json next to the function unless SeverityPolicyPath names a file or s3://bucket/key
+severity_policy_source = severity_policy.PolicySource(
+    os.environ.get('SeverityPolicyPath') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'event_severity.json'),
+    int(os.environ.get('SeverityPolicyCheckSeconds', 30))
+)
+
+# Source server records (lifecycle state and identification hints) keyed by (account, region, source server ID)
+source_server_cache = TTLCache(
+    int(os.environ.get('SourceServerCacheMaxEntries', 4096)),
+    int(os.environ.get('SourceServerCacheTTL', 60))
+)
 
 def open_file(file_name):
     """'
@@ -44,17 +123,16 @@ def open_file(file_name):
     except FileNotFoundError as err:
         raise FileNotFoundError('The file {} was not found, check the file name passed to the function.'.format(file_name))
 
-def source_server_validation(mgnsourcedetails):
+def source_server_validation(source_server):
     """
-    :param event: event received by the lambda function
-    :param sourceserverid: MGN source server id
+    :param source_server: MGN source server record returned by get_source_server
     :return True | False: return True if the event should be processed
     """
-    skip_processing= ['TESTING', 'READY_FOR_CUTOVER', 'CUTTING_OVER', 'CUTOVER', 'DISCONNECTED']
-    sourceserverid = mgnsourcedetails['items'][0]['arn']
-    logger.info("The current state of source server "+ sourceserverid + " is " + mgnsourcedetails['items'][0]['lifeCycle']['state'])
+    skip_processing= SKIP_PROCESSING_STATES
+    sourceserverid = source_server['arn']
+    logger.info("The current state of source server "+ sourceserverid + " is " + source_server['lifeCycle']['state'])
   
-    if mgnsourcedetails['items'][0]['lifeCycle']['state'] not in skip_processing:
+    if source_server['lifeCycle']['state'] not in skip_processing:
         return True
     else:
         return False
@@ -62,26 +140,95 @@ def source_server_validation(mgnsourcedetails):
 def get_event_type(event):
     """
     :param event: event being processed
-    :return String (str) Event Type Name
+    :return String (str) Event Type Name, classified once with the event registry dispatch tables
+    """
+    return event_registry.classify_event(event)
+
+def get_severity_map():
+    """
+    :return dictionary of the default event severities of the severity policy
+    """
+    return severity_policy_source.get().defaults
+
+def get_severity(event_type, account=None, region=None, source_server=None, alarm_state=None, fqdn=None):
+    """
+    :param event_type: severity key of the event, for example Stalled or ReplicationDuration
+    :param account: Account ID where Event Originated
+    :param region: Region where Event Originated
+    :param source_server: MGN source server record, provides the lifecycle state, FQDN and tags
+    :param alarm_state: CloudWatch alarm state of alarm events
+    :param fqdn: FQDN of the source server when there is no source server record
+    :return severity: severity of the event under the severity policy
+    """
+    lifecycle_state = tags = None
+    if source_server is not None:
+        lifecycle_state = source_server['lifeCycle']['state']
+        fqdn = fqdn or source_server['sourceProperties']['identificationHints'].get('fqdn')
+        tags = source_server.get('tags')
+    return severity_policy_source.get().evaluate(event_type, account, region, alarm_state, lifecycle_state, fqdn, tags)
+
+def get_mgn_client(account, region):
+    """
+    :param account: Account ID of the target account
+    :param region: AWS region of the target account MGN service
+    :return client: MGN client using temporary credentials from the target account
     """
+    return get_target_client('mgn', account, region)
+
+def get_target_client(service, account, region):
+    """
+    :param service: AWS service name
+    :param account: Account ID of the target account
+    :param region: AWS region of the target account
+    :return client: client of the service using temporary credentials from the target account
+
+    Clients are cached by (account, region, service) and expire credential_refresh_margin seconds
+    before their credentials do, so they are refreshed ahead of time.
+    """
+    cache_key = (account, region, service)
+    client = mgn_client_cache.get(cache_key)
+    if client is not None:
+        metrics.increment('mgn_client_cache_hit')
+        return client
+    metrics.increment('mgn_client_cache_miss')
+    account_circuit_breaker.check(account)
+
+    # Get Temporary Credentials for Target Account
     try:
-        if 'detail-type' in event:
-            if 'Stalled' in event['detail-type']:
-                return 'Stalled'
-            elif 'LagDuration' in event['detail']['configuration']['metrics'][0]['metricStat']['metric']['name']:
-                return 'LagDuration'
-            elif 'ElapsedReplicationDuration' in event['detail']['configuration']['metrics'][0]['metricStat']['metric']['name']:
-                return 'ElapsedReplicationDuration'
-        elif 'eventName' in event:
-            return 'DisconnectFromService'
-        else:
-            raise ValueError('The Event Received Is Not Parsable')
-    except ValueError as err:
-        print('A ValueError Occured, please see the details below:')
-        print(err)
-    except Exception as err:
-        print('An Error Occured, please see the details below:')
-        print(err)
+        with metrics.timer('assume_role'):
+            stsresponse = client_factory.get_client('sts', region).assume_role(
+                RoleArn='arn:aws:iam::' + account + ':role/' + CENTRAL_ACCOUNT_ROLE_NAME,
+                RoleSessionName='mgn-event-session'+account
+            )
+    except botocore.exceptions.ClientError as err:
+        if err.response['Error']['Code'] in ROLE_FAILURE_ERROR_CODES:
+            record_role_failure(account, err)
+        raise err
+    account_circuit_breaker.record_success(account)
+    credentials=stsresponse['Credentials']
+
+    # Create the Client with Temporary Credentials from Target Account
+    client = client_factory.create_client(service, region, credentials, account)
+
+    ttl = mgn_client_cache.ttl_seconds
+    if 'Expiration' in credentials:
+        remaining = (credentials['Expiration'] - datetime.now(timezone.utc)).total_seconds()
+        ttl = min(ttl, remaining - credential_refresh_margin)
+    if ttl > 0:
+        mgn_client_cache.set(cache_key, client, ttl)
+    return client
+
+def record_role_failure(account, err):
+    """
+    Records a missing or denied monitoring role in the circuit breaker of the account
+    :param account: Account ID of the target account
+    :param err: ClientError returned by STS or MGN
+    :return : None
+    """
+    if account_circuit_breaker.record_failure(account, err):
+        metrics.increment('circuit_opened')
+        logger.error('The monitoring role of account {} is missing or denied access, events of the account fail fast for {} seconds: {}'.format(
+            account, account_circuit_breaker.open_seconds, err))
 
 def get_source_details(account, sourceserverid, region):
     """
@@ -90,84 +237,148 @@ def get_source_details(account, sourceserverid, region):
 
     :return respone: return the detail of the source server looked up from the target account
     """
+    client = get_mgn_client(account, region)
     try:
-        boto_sts=boto3.client('sts', region_name=region)
-
-        # Get Temporary Credentials for Target Account
-        stsresponse = boto_sts.assume_role(
-            RoleArn='arn:aws:iam::' + account + ':role/MGN-Monitoring-Generic-Central-Account-Lambda-Role',
-            RoleSessionName='mgn-event-session'+account
-        )
-        credentials=stsresponse['Credentials']
-                
-        # Create MGN Client with Temporary Credentials from Target Account
-        client = boto3.client('mgn',
-            aws_access_key_id=credentials['AccessKeyId'],
-            aws_secret_access_key=credentials['SecretAccessKey'],
-            aws_session_token=credentials['SessionToken'],
-            region_name=region
-        )
-        
         # Describe MGN source server in Target Account by Source Server ID
-        response = client.describe_source_servers(
-            filters = {
-                    'sourceServerIDs': [sourceserverid]
-            }
-        )
+        with metrics.timer('describe_source_servers'):
+            response = client.describe_source_servers(
+                filters = {
+                        'sourceServerIDs': [sourceserverid]
+                }
+            )
         return response
     except botocore.exceptions.ClientError as err:
+        if err.response['Error']['Code'] in ACCESS_DENIED_ERROR_CODES:
+            mgn_client_cache.invalidate((account, region, 'mgn'))
+        if err.response['Error']['Code'] in ROLE_FAILURE_ERROR_CODES:
+            record_role_failure(account, err)
         raise err
 
-def describe_log_stream(log_group, log_stream):
+def compact_source_server(item):
     """
-    :param log_group: CloudWatch Log Group
-    :param log_stream: CloudWatch Log Stream
-    :return response['logStreams'][0] - most recent log stream
+    :param item: source server item from an MGN describe_source_servers response
+    :return dictionary with only the fields used by the event processors
     """
-    response = cw_logs.describe_log_streams(
-            logGroupName=log_group,
-            logStreamNamePrefix=log_stream,
-        )
+    return {
+        'arn': item['arn'],
+        'sourceServerID': item.get('sourceServerID'),
+        'lifeCycle': {
+            'state': item['lifeCycle']['state']
+        },
+        'sourceProperties': {
+            'identificationHints': item['sourceProperties']['identificationHints']
+        },
+        'tags': item.get('tags') or {}
+    }
 
-    if not len(response['logStreams']) > 0:
-        cw_logs.create_log_stream(
-            logGroupName=log_group,
-            logStreamName=log_stream,
-        )
-        return {}
-    return response['logStreams'][0]
+def get_source_server(account, sourceserverid, region):
+    """
+    :param account: Account ID where Event Originated
+    :param sourceserverid: MGN source server id
+    :param region: AWS region of the source server
+    :return source_server: compact source server record, served from source_server_cache when possible
+    """
+    cache_key = (account, region, sourceserverid)
+    source_server = source_server_cache.get(cache_key)
+    if source_server is not None:
+        metrics.increment('source_server_cache_hit')
+        return source_server
+    metrics.increment('source_server_cache_miss')
 
+    response = get_source_details(account, sourceserverid, region)
+    if not len(response['items']) > 0:
+        raise ValueError('The source server {} was not found in account {} region {}.'.format(sourceserverid, account, region))
+    source_server = compact_source_server(response['items'][0])
+    source_server_cache.set(cache_key, source_server)
+    return source_server
 
-def put_log_events(message, log_stream_name):
+def invalidate_source_server(account, region, sourceserverid):
+    """
+    :param account: Account ID of the source server
+    :param region: AWS region of the source server
+    :param sourceserverid: MGN source server id
+    :return : None - the next get_source_server call describes the source server again
+    """
+    source_server_cache.invalidate((account, region, sourceserverid))
+    metrics.increment('source_server_cache_invalidations')
+
+def describe_source_server_items(client, sourceserverids):
+    """
+    :param client: MGN client of the target account
+    :param sourceserverids: at most DESCRIBE_SOURCE_SERVERS_MAX_IDS source server ids
+    :return items: source server items of every page of the describe_source_servers response
+    """
+    items = []
+    pages = client.get_paginator('describe_source_servers').paginate(
+        filters = {
+            'sourceServerIDs': sourceserverids
+        }
+    )
+    for page in pages:
+        items.extend(page['items'])
+    return items
+
+def get_source_servers(account, sourceserverids, region):
+    """
+    :param account: Account ID where the events originated
+    :param sourceserverids: list of MGN source server ids in the account and region
+    :param region: AWS region of the source servers
+    :return source_servers: dictionary of compact source server records keyed by source server id
+
+    Records missing from source_server_cache are resolved with one paginated describe_source_servers
+    call per chunk of DESCRIBE_SOURCE_SERVERS_MAX_IDS ids, and the results are added to the cache.
+    """
+    source_servers = {}
+    missing = []
+    for sourceserverid in sourceserverids:
+        source_server = source_server_cache.get((account, region, sourceserverid))
+        if source_server is not None:
+            source_servers[sourceserverid] = source_server
+        elif sourceserverid not in missing:
+            missing.append(sourceserverid)
+    metrics.increment('source_server_cache_hit', len(source_servers))
+    metrics.increment('source_server_cache_miss', len(missing))
+
+    if not missing:
+        return source_servers
+
+    client = get_mgn_client(account, region)
+    try:
+        for start in range(0, len(missing), DESCRIBE_SOURCE_SERVERS_MAX_IDS):
+            with metrics.timer('describe_source_servers'):
+                items = describe_source_server_items(
+                    client,
+                    missing[start:start + DESCRIBE_SOURCE_SERVERS_MAX_IDS]
+                )
+            for item in items:
+                source_server = compact_source_server(item)
+                sourceserverid = parse_source_serverid(item['arn'])
+                source_server_cache.set((account, region, sourceserverid), source_server)
+                source_servers[sourceserverid] = source_server
+        return source_servers
+    except botocore.exceptions.ClientError as err:
+        if err.response['Error']['Code'] in ACCESS_DENIED_ERROR_CODES:
+            mgn_client_cache.invalidate((account, region, 'mgn'))
+        if err.response['Error']['Code'] in ROLE_FAILURE_ERROR_CODES:
+            record_role_failure(account, err)
+        raise err
+
+def put_log_events(message, log_stream_name, timestamp=None):
     """
     :param message: Event string - put to CloudWatch Log Group
     :type event: String
-    :return source_server_id: 
+    :param log_stream_name: CloudWatch Log Stream
+    :param timestamp: event time in milliseconds since the epoch, defaults to now
+    :return : None - the message is buffered until flush_log_events is called
     """
-    now = datetime.now()
-    curr_date_time = now.strftime("%Y-%m-%dT%H:%M:%S")
-    millisec = int((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds() * 1000)
-
-    log_stream_info = describe_log_stream(os.environ.get('EventsCLoudWatchLogGroup'), log_stream_name)
-    upload_sequence_token = log_stream_info.get('uploadSequenceToken')
-
-    put_log_params = {
-        'logGroupName': os.environ.get('EventsCLoudWatchLogGroup'),
-        'logStreamName':log_stream_name,
-        'logEvents':[
-            {
-                'timestamp': millisec,
-                'message': message
-            },
-        ]
-    }
-
-    if upload_sequence_token:
-        put_log_params['sequenceToken'] = upload_sequence_token
+    log_buffer.add(log_stream_name, message, timestamp)
 
-    response = cw_logs.put_log_events(**put_log_params)
-    
-    return response
+def flush_log_events():
+    """
+    :return responses: list of PutLogEvents responses for the buffered log events
+    """
+    with metrics.timer('put_log_events'):
+        return log_buffer.flush()
 
 def get_server_fqdn(event, mgnsourceserver):
     """
@@ -199,6 +410,14 @@ def parse_source_serverid(arn):
 
     return sourceserverid
 
+def format_log_event(event, level):
+    """
+    :param event: The processed event that will be logged
+    :param level: log level written in the level field
+    :return log_str: one JSON object with the level and the cached JSON document of the event
+    """
+    return '{"level":"' + level + '",' + event.to_json()[1:]
+
 def info_log_event(event, log_stream_name):
     """
     :param event: The processed event that will be logged
@@ -207,7 +426,7 @@ def info_log_event(event, log_stream_name):
     : type log_stream_name: String
     : return : None
     """
-    log_str = 'INFO: ' + str(event.get_event_attributes())
+    log_str = format_log_event(event, 'INFO')
     put_log_events(log_str, log_stream_name)
 
 def warn_log_event(event, log_stream_name):
@@ -218,7 +437,7 @@ def warn_log_event(event, log_stream_name):
     : type log_stream_name: String
     : return : None
     """
-    log_str = 'WARN: ' + str(event.get_event_attributes())
+    log_str = format_log_event(event, 'WARN')
     put_log_events(log_str, log_stream_name)
 
 def critical_log_event(event, log_stream_name):
@@ -230,7 +449,7 @@ def critical_log_event(event, log_stream_name):
     : return : None
     """
 
-    log_str = 'CRITICAL: ' + str(event.get_event_attributes())
+    log_str = format_log_event(event, 'CRITICAL')
     print(log_str)
     put_log_events(log_str, log_stream_name)
 
@@ -249,45 +468,72 @@ def format_messages(event):
     :param event: event to be formatted
     : return : message - to be sent via SNS
     """
-    if 'Stalled' in event.get_event_type():
-        message = '''
-            Hello, \n
-            The Hostname {} in AWS Account {} in the region {} is experiencing stalled data replication. \n
-            This is a {} event which occured on {}.            
-        '''.format(event.get_server_fqdn(), event.get_aws_account_id(), event.get_aws_region(), event.get_event_severity(), event.get_time_stamp())
-        return message
-    elif 'LagDuration' in event.get_event_type():
-        message = '''
-            Hello, \n
-            The Hostname {} in AWS Account {} in the region {} is experiencing lag in replication. \n
-            This is a {} event which occured on {}.       
-        '''.format(event.get_server_fqdn(), event.get_aws_account_id(), event.get_aws_region(), event.get_event_severity(), event.get_time_stamp())
-        return message
-    elif 'ElapsedReplicationDuration' in event.get_event_type():
-        message = '''
-            Hello, \n
-            The Hostname {} in AWS Account {} in the region {} has exceeded the replication threshold of 90 days. \n
-            This is a {} event which occured on {}. 
-        '''.format(event.get_server_fqdn(), event.get_aws_account_id(), event.get_aws_region(), event.get_event_severity(), event.get_time_stamp())
-        return message
-    elif 'DisconnectFromService' in event.get_event_type():
-        message = '''
+    return notification_renderer.render(event)
+
+def format_digest_message(events):
+    """
+    :param events: ProcessedEvents of the same account, region, event type and recovery
+    : return : (subject, message) - to be sent via SNS
+    """
+    first = events[0]
+    if len(events) == 1:
+        return None, format_messages(first)
+    action = 'recovered from' if first.is_recovery() else 'reported'
+    hosts = '\n'.join(
+        '            {} ({}) - {} event which occured on {}'.format(event.get_server_fqdn(), event.get_source_server_id(), event.get_event_severity(), event.get_time_stamp())
+        for event in events
+    )
+    message = '''
             Hello, \n
-            The Hostname {} in AWS Account {} in the region {} has been disconnected from the AWS MGN service. \n
-            This is a {} event which occured on {}. 
-        '''.format(event.get_server_fqdn(), event.get_aws_account_id(), event.get_aws_region(), event.get_event_severity(), event.get_time_stamp())
-        return message
-    else:
-        raise RuntimeError('The event provided does not contain a valid event type.')
+            {} source servers in AWS Account {} in the region {} {} the event {}. \n
+{}
+        '''.format(len(events), first.get_aws_account_id(), first.get_aws_region(), action, first.get_event_type(), hosts)
+    subject = '{} MGN source servers{}: {}'.format(len(events), ' recovered' if first.is_recovery() else '', first.get_event_type())
+    return subject[:notification_digest.MAX_SUBJECT_LENGTH], message
 
 def publish_event_to_sns_topic(event):
     """
-    :param event: event to be formatted and published to SNS
-    : return : response (from SNS API call)
+    :param event: event to be formatted and published to SNS by flush_notifications
+    : return : True | False - False if the event was suppressed as an alarm flap
     """
-    message = format_messages(event)
-    response = sns.publish(
-        TopicArn=os.environ['EventsSNSTopic'],
-        Message=message
-    )
-    return response
\ No newline at end of file
+    queued = digest.add(event)
+    if not queued:
+        logger.info('Suppressed flapping alarm notification for source server ' + str(event.get_source_server_id()))
+    return queued
+
+def flush_notifications():
+    """
+    Publishes one message per digest group, using publish_batch when there is more than one message
+    : return : responses (from SNS API calls)
+    """
+    entries = []
+    for number, events in enumerate(digest.drain()):
+        subject, message = format_digest_message(events)
+        entry = {
+            'Id': 'digest-' + str(number),
+            'Message': message
+        }
+        if subject:
+            entry['Subject'] = subject
+        entries.append(entry)
+
+    responses = []
+    if len(entries) == 1:
+        entry = entries[0]
+        entry.pop('Id')
+        with metrics.timer('sns_publish'):
+            responses.append(client_factory.get_client('sns').publish(TopicArn=os.environ['EventsSNSTopic'], **entry))
+        return responses
+
+    failed = []
+    for batch in notification_digest.split_batches(entries):
+        with metrics.timer('sns_publish'):
+            response = client_factory.get_client('sns').publish_batch(
+                TopicArn=os.environ['EventsSNSTopic'],
+                PublishBatchRequestEntries=batch
+            )
+        failed.extend(response.get('Failed', []))
+        responses.append(response)
+    if failed:
+        raise RuntimeError('Failed to publish {} notifications to SNS: {}'.format(len(failed), failed))
+    return responses
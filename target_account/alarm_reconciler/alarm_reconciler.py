@@ -0,0 +1,208 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Reconciles the MGN CloudWatch alarms of a target account and region with the MGN source server
+# inventory. Missing alarms are created, orphaned alarms are deleted and alarms whose threshold,
+# period or evaluation periods differ from the environment settings are updated.
+
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+import botocore.exceptions
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+METRICS = ["LagDuration", "ElapsedReplicationDuration"]
+ALARM_PREFIX = "MGN-"
+DELETE_ALARMS_MAX_NAMES = 100
+EXCLUDED_LIFECYCLE_STATES = ["DISCONNECTED"]
+
+class RateLimiter:
+    """
+    Spaces calls shared by the worker threads to at most `rate` calls per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+def alarm_name(sourceServerID, MetricName):
+    return f"{ALARM_PREFIX}{sourceServerID}-{MetricName}"
+
+def parse_alarm_name(AlarmName):
+    """
+    :param AlarmName: name of an alarm created by this solution
+    :return (sourceServerID, MetricName) or None if the alarm was not created by this solution
+    """
+    for metric in METRICS:
+        suffix = f"-{metric}"
+        if AlarmName.startswith(ALARM_PREFIX) and AlarmName.endswith(suffix):
+            return AlarmName[len(ALARM_PREFIX):-len(suffix)], metric
+    return None
+
+def get_alarm_settings():
+    """
+    :return dictionary of metric name to the Threshold, Period and EvaluationPeriods set in the environment
+    """
+    return {
+        metric: {
+            "Threshold": float(os.environ[f"{metric}_Threshold"]),
+            "Period": int(os.environ[f"{metric}_Period"]),
+            "EvaluationPeriods": int(os.environ[f"{metric}_EvaluationPeriod"]),
+        }
+        for metric in METRICS
+    }
+
+def list_mgn_alarms(cloudwatch):
+    """
+    :return dictionary of alarm name to MetricAlarm for the alarms created by this solution
+    """
+    alarms = {}
+    paginator = cloudwatch.get_paginator("describe_alarms")
+    for page in paginator.paginate(AlarmNamePrefix=ALARM_PREFIX, AlarmTypes=["MetricAlarm"]):
+        for alarm in page["MetricAlarms"]:
+            if parse_alarm_name(alarm["AlarmName"]) is not None:
+                alarms[alarm["AlarmName"]] = alarm
+    return alarms
+
+def list_source_server_ids(mgn):
+    """
+    :return set of the source server IDs that should have alarms
+    """
+    sourceServerIDs = set()
+    paginator = mgn.get_paginator("describe_source_servers")
+    for page in paginator.paginate(filters={"isArchived": False}):
+        for item in page["items"]:
+            if item["lifeCycle"]["state"] not in EXCLUDED_LIFECYCLE_STATES:
+                sourceServerIDs.add(item["sourceServerID"])
+    return sourceServerIDs
+
+def plan(sourceServerIDs, alarms, settings):
+    """
+    :param sourceServerIDs: source servers that should have alarms
+    :param alarms: existing alarms returned by list_mgn_alarms
+    :param settings: alarm settings returned by get_alarm_settings
+    :return (create, update, delete): alarms to create and update as (sourceServerID, MetricName), and alarm names to delete
+    """
+    create = []
+    update = []
+    for sourceServerID in sorted(sourceServerIDs):
+        for metric in METRICS:
+            alarm = alarms.get(alarm_name(sourceServerID, metric))
+            if alarm is None:
+                create.append((sourceServerID, metric))
+            elif any(alarm.get(key) != value for key, value in settings[metric].items()):
+                update.append((sourceServerID, metric))
+    delete = sorted(name for name in alarms if parse_alarm_name(name)[0] not in sourceServerIDs)
+    return create, update, delete
+
+def put_alarm(cloudwatch, limiter, sourceServerID, MetricName, settings):
+    limiter.wait()
+    cloudwatch.put_metric_alarm(
+        AlarmName=alarm_name(sourceServerID, MetricName),
+        ComparisonOperator='GreaterThanThreshold',
+        EvaluationPeriods=settings["EvaluationPeriods"],
+        MetricName=MetricName,
+        Namespace='AWS/MGN',
+        Period=settings["Period"],
+        Statistic='Maximum',
+        Threshold=settings["Threshold"],
+        ActionsEnabled=False,
+        AlarmDescription=f'Alarm to monitor {MetricName}',
+        Dimensions=[
+                {
+                    'Name': 'SourceServerID',
+                    'Value': sourceServerID
+                },
+            ]
+    )
+
+def reconcile(cloudwatch, mgn, settings, dry_run=False, max_workers=4, put_rate=3.0):
+    """
+    :param cloudwatch: CloudWatch client of the target account and region
+    :param mgn: MGN client of the target account and region
+    :param settings: alarm settings returned by get_alarm_settings
+    :param dry_run: only report the planned changes
+    :param max_workers: number of threads calling put_metric_alarm
+    :param put_rate: maximum put_metric_alarm calls per second
+    :return summary: dictionary with the number of alarms created, updated, deleted and failed
+    """
+    alarms = list_mgn_alarms(cloudwatch)
+    sourceServerIDs = list_source_server_ids(mgn)
+    create, update, delete = plan(sourceServerIDs, alarms, settings)
+    summary = {
+        "source_servers": len(sourceServerIDs),
+        "alarms": len(alarms),
+        "created": len(create),
+        "updated": len(update),
+        "deleted": len(delete),
+        "failed": [],
+        "dry_run": dry_run,
+    }
+    logger.info(f"Reconciliation plan: create {len(create)}, update {len(update)}, delete {len(delete)}")
+    if dry_run:
+        return summary
+
+    limiter = RateLimiter(put_rate)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(put_alarm, cloudwatch, limiter, sourceServerID, metric, settings[metric]): alarm_name(sourceServerID, metric)
+            for sourceServerID, metric in create + update
+        }
+        for future, name in futures.items():
+            try:
+                future.result()
+            except botocore.exceptions.ClientError as error:
+                logger.error(f"Unable to put alarm {name}: {error}")
+                summary["failed"].append(name)
+
+    for start in range(0, len(delete), DELETE_ALARMS_MAX_NAMES):
+        names = delete[start:start + DELETE_ALARMS_MAX_NAMES]
+        try:
+            cloudwatch.delete_alarms(AlarmNames=names)
+        except botocore.exceptions.ClientError as error:
+            logger.error(f"Unable to delete alarms {names}: {error}")
+            summary["failed"].extend(names)
+    return summary
+
+def lambda_handler(event, context):
+    logger.info(f"Event:{event}")
+    dry_run = bool(isinstance(event, dict) and event.get("dry_run"))
+    summary = reconcile(
+        boto3.client('cloudwatch'),
+        boto3.client('mgn'),
+        get_alarm_settings(),
+        dry_run=dry_run,
+        max_workers=int(os.environ.get("ReconcileConcurrency", 4)),
+        put_rate=float(os.environ.get("PutMetricAlarmRate", 3)),
+    )
+    logger.info(f"Reconciliation summary: {summary}")
+    return summary
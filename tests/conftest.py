@@ -0,0 +1,197 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+# Unit tests of the Central Account Lambda modules. The modules are imported the way the Lambda
+# runtime imports them, from the lambda_function folder. The central fixture replaces the AWS
+# clients with in-memory fakes and resets the state kept by warm containers between tests.
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda_function'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('MetricsEnabled', 'false')
+os.environ.setdefault('EventsCLoudWatchLogGroup', 'MGN-Events')
+os.environ.setdefault('EventsSNSTopic', 'arn:aws:sns:us-east-1:999999999999:MGN-Events')
+
+ACCOUNT = '111111111111'
+REGION = 'us-east-1'
+
+def client_error(code, operation='Operation'):
+    import botocore.exceptions
+    return botocore.exceptions.ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+class FakeClient:
+    """
+    Answers the calls of one service from the state of FakeAWS and records them
+    """
+
+    def __init__(self, aws, service, account=None, region=None):
+        self.aws = aws
+        self.service = service
+        self.account = account or ACCOUNT
+        self.region = region or REGION
+
+    def __getattr__(self, operation):
+        def call(**params):
+            self.aws.calls[(self.service, operation)] += 1
+            self.aws.requests.append((self.service, operation, params))
+            error = self.aws.errors.get((self.service, operation))
+            if error is not None:
+                raise error
+            handler = getattr(self.aws, '{}_{}'.format(self.service, operation), None)
+            return handler(self, **params) if handler is not None else {}
+        return call
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, **params):
+                yield getattr(client, operation)(**params)
+        return Paginator()
+
+class FakeAWS:
+    """
+    In-memory stand-in for STS, MGN, CloudWatch Logs and SNS. Source servers are added with
+    add_server, errors are raised for an operation by setting errors[(service, operation)].
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.requests = []
+        self.errors = {}
+        self.servers = {}
+        self.log_events = []
+        self.notifications = []
+
+    def add_server(self, source_server_id, state='READY_FOR_TEST', account=ACCOUNT, region=REGION, fqdn=None, tags=None, replication=None):
+        self.servers[(account, region, source_server_id)] = {
+            'dataReplicationInfo': replication or {'dataReplicationState': 'CONTINUOUS'},
+            'arn': 'arn:aws:mgn:{}:{}:source-server/{}'.format(region, account, source_server_id),
+            'sourceServerID': source_server_id,
+            'lifeCycle': {'state': state},
+            'sourceProperties': {'identificationHints': {'fqdn': fqdn or source_server_id + '.example.com'}},
+            'tags': tags or {}
+        }
+
+    def count(self, service, operation):
+        return self.calls[(service, operation)]
+
+    def sts_assume_role(self, client, **params):
+        return {'Credentials': {
+            'AccessKeyId': 'testing', 'SecretAccessKey': 'testing', 'SessionToken': 'testing',
+            'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)
+        }}
+
+    def mgn_describe_source_servers(self, client, filters=None, **params):
+        ids = (filters or {}).get('sourceServerIDs')
+        items = [item for (account, region, source_server_id), item in self.servers.items()
+                 if account == client.account and region == client.region and (ids is None or source_server_id in ids)]
+        return {'items': items}
+
+    def logs_put_log_events(self, client, logGroupName, logStreamName, logEvents):
+        self.log_events.extend((logStreamName, log_event['message']) for log_event in logEvents)
+        return {}
+
+    def sns_publish(self, client, **params):
+        self.notifications.append(params)
+        return {'MessageId': str(len(self.notifications))}
+
+    def sns_publish_batch(self, client, TopicArn, PublishBatchRequestEntries):
+        self.notifications.extend(PublishBatchRequestEntries)
+        return {'Successful': [{'Id': entry['Id']} for entry in PublishBatchRequestEntries], 'Failed': []}
+
+@pytest.fixture
+def aws(monkeypatch):
+    """
+    FakeAWS answering every client created by client_factory
+    """
+    import client_factory
+    fake = FakeAWS()
+    monkeypatch.setattr(client_factory, 'get_client', lambda service, region_name=None: FakeClient(fake, service, region=region_name))
+    monkeypatch.setattr(client_factory, 'create_client', lambda service, region_name, credentials, account=None: FakeClient(fake, service, account, region_name))
+    return fake
+
+@pytest.fixture
+def central(aws, monkeypatch):
+    """
+    The lambda_function module with the warm container state of utils and delivery reset
+    """
+    from circuit_breaker import CircuitBreaker
+    import delivery
+    import idempotency
+    import lambda_function
+    from log_buffer import LogBuffer
+    import notification_digest
+    from storm_correlator import StormCorrelator
+    import utils
+    monkeypatch.setattr(utils, 'log_buffer', LogBuffer(lambda: __import__('client_factory').get_client('logs'), os.environ['EventsCLoudWatchLogGroup']))
+    monkeypatch.setattr(utils, 'digest', notification_digest.NotificationDigest(utils.digest.window_seconds, utils.digest.flap_history.ttl_seconds))
+    monkeypatch.setattr(utils, 'idempotency_cache', idempotency.IdempotencyCache(3600, 1000))
+    monkeypatch.setattr(utils, 'storm_correlator', StormCorrelator(utils.storm_correlator.window_seconds, utils.storm_correlator.threshold, utils.storm_correlator.quiet_seconds, utils.storm_correlator.max_seconds))
+    monkeypatch.setattr(utils, 'account_circuit_breaker', CircuitBreaker(utils.account_circuit_breaker.failure_threshold, utils.account_circuit_breaker.open_seconds))
+    monkeypatch.setattr(delivery, 'pipeline', delivery.DeliveryPipeline(delivery.configured_sinks()))
+    utils.source_server_cache.clear()
+    utils.mgn_client_cache.clear()
+    return lambda_function
+
+def stalled_event(source_server_id='s-1', state='STALLED', account=ACCOUNT, event_id=None, time_stamp='2024-01-01T00:00:00Z'):
+    return {
+        'id': event_id or 'stalled-{}-{}-{}'.format(source_server_id, state, time_stamp),
+        'detail-type': 'MGN Source Server Data Replication Stalled Change',
+        'source': 'aws.mgn',
+        'account': account,
+        'region': REGION,
+        'time': time_stamp,
+        'resources': ['arn:aws:mgn:{}:{}:source-server/{}'.format(REGION, account, source_server_id)],
+        'detail': {'state': state}
+    }
+
+def alarm_event(source_server_id='s-1', state='ALARM', previous_state='OK', metric='LagDuration', account=ACCOUNT, time_stamp='2024-01-01T00:00:00Z'):
+    alarm_name = 'MGN-{}-{}'.format(source_server_id, metric)
+    return {
+        'id': 'alarm-{}-{}-{}'.format(source_server_id, state, time_stamp),
+        'detail-type': 'CloudWatch Alarm State Change',
+        'source': 'aws.cloudwatch',
+        'account': account,
+        'region': REGION,
+        'time': time_stamp,
+        'resources': ['arn:aws:cloudwatch:{}:{}:alarm:{}'.format(REGION, account, alarm_name)],
+        'detail': {
+            'alarmName': alarm_name,
+            'state': {'value': state},
+            'previousState': {'value': previous_state},
+            'configuration': {'metrics': [{'metricStat': {'metric': {
+                'name': metric, 'namespace': 'AWS/MGN', 'dimensions': {'SourceServerID': source_server_id}
+            }}}]}
+        }
+    }
+
+def sqs_batch(*events):
+    import json
+    return {'Records': [
+        {'messageId': 'message-{}'.format(number), 'body': json.dumps(event), 'attributes': {'ApproximateReceiveCount': '1'}}
+        for number, event in enumerate(events)
+    ]}
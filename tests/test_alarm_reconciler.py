@@ -0,0 +1,100 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'target_account', 'alarm_reconciler'))
+
+import alarm_reconciler
+from conftest import client_error
+
+SETTINGS = {
+    'LagDuration': {'Threshold': 60.0, 'Period': 60, 'EvaluationPeriods': 1},
+    'ElapsedReplicationDuration': {'Threshold': 3600.0, 'Period': 300, 'EvaluationPeriods': 1},
+}
+
+class Paginator:
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def paginate(self, **params):
+        return self.pages
+
+class CloudWatch:
+
+    def __init__(self, alarms, failing=()):
+        self.alarms = {alarm['AlarmName']: alarm for alarm in alarms}
+        self.failing = set(failing)
+        self.put = []
+        self.deleted = []
+
+    def get_paginator(self, operation):
+        return Paginator([{'MetricAlarms': list(self.alarms.values())}])
+
+    def put_metric_alarm(self, **params):
+        if params['AlarmName'] in self.failing:
+            raise client_error('LimitExceeded', 'PutMetricAlarm')
+        self.put.append(params['AlarmName'])
+
+    def delete_alarms(self, AlarmNames):
+        self.deleted.append(AlarmNames)
+
+class Mgn:
+
+    def __init__(self, servers):
+        self.servers = servers
+
+    def get_paginator(self, operation):
+        return Paginator([{'items': [{'sourceServerID': source_server_id, 'lifeCycle': {'state': state}} for source_server_id, state in self.servers]}])
+
+def alarm(source_server_id, metric, **settings):
+    return dict(SETTINGS[metric], AlarmName=alarm_reconciler.alarm_name(source_server_id, metric), **settings)
+
+def test_parse_alarm_name():
+    assert alarm_reconciler.parse_alarm_name('MGN-s-1234-LagDuration') == ('s-1234', 'LagDuration')
+    assert alarm_reconciler.parse_alarm_name('MGN-s-1234-CPUUtilization') is None
+    assert alarm_reconciler.parse_alarm_name('Other-s-1234-LagDuration') is None
+
+def test_plan_creates_updates_and_deletes():
+    alarms = {
+        'MGN-s-1-LagDuration': alarm('s-1', 'LagDuration'),
+        'MGN-s-1-ElapsedReplicationDuration': alarm('s-1', 'ElapsedReplicationDuration', Threshold=7200.0),
+        'MGN-s-gone-LagDuration': alarm('s-gone', 'LagDuration'),
+    }
+    create, update, delete = alarm_reconciler.plan({'s-1', 's-2'}, alarms, SETTINGS)
+    assert create == [('s-2', 'LagDuration'), ('s-2', 'ElapsedReplicationDuration')]
+    assert update == [('s-1', 'ElapsedReplicationDuration')]
+    assert delete == ['MGN-s-gone-LagDuration']
+
+def test_reconcile_applies_the_plan_and_reports_failures():
+    cloudwatch = CloudWatch([alarm('s-1', 'LagDuration'), alarm('s-1', 'ElapsedReplicationDuration'), alarm('s-gone', 'LagDuration')],
+                            failing=['MGN-s-2-ElapsedReplicationDuration'])
+    mgn = Mgn([('s-1', 'READY_FOR_TEST'), ('s-2', 'CUTOVER'), ('s-3', 'DISCONNECTED')])
+    summary = alarm_reconciler.reconcile(cloudwatch, mgn, SETTINGS, put_rate=0)
+    assert summary['source_servers'] == 2
+    assert (summary['created'], summary['updated'], summary['deleted']) == (2, 0, 1)
+    assert summary['failed'] == ['MGN-s-2-ElapsedReplicationDuration']
+    assert cloudwatch.put == ['MGN-s-2-LagDuration']
+    assert cloudwatch.deleted == [['MGN-s-gone-LagDuration']]
+
+def test_dry_run_changes_nothing():
+    cloudwatch = CloudWatch([alarm('s-gone', 'LagDuration')])
+    summary = alarm_reconciler.reconcile(cloudwatch, Mgn([('s-1', 'READY_FOR_TEST')]), SETTINGS, dry_run=True)
+    assert (summary['created'], summary['deleted'], summary['dry_run']) == (2, 1, True)
+    assert cloudwatch.put == [] and cloudwatch.deleted == []
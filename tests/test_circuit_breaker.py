@@ -0,0 +1,67 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import pytest
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock.monotonic)
+    return clock
+
+def test_circuit_opens_once_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(3, 60)
+    assert [breaker.record_failure('111111111111', 'AccessDenied') for _ in range(5)] == [False, False, True, False, False]
+    assert breaker.is_open('111111111111')
+    with pytest.raises(CircuitOpenError, match='after 5 failures: AccessDenied'):
+        breaker.check('111111111111')
+    # Other accounts are not affected
+    breaker.check('222222222222')
+
+def test_success_resets_the_failures(clock):
+    breaker = CircuitBreaker(2, 60)
+    assert not breaker.record_failure('111111111111', 'AccessDenied')
+    breaker.record_success('111111111111')
+    assert not breaker.record_failure('111111111111', 'AccessDenied')
+    assert not breaker.is_open('111111111111')
+
+def test_half_open_lets_one_trial_call_through(clock):
+    breaker = CircuitBreaker(1, 60)
+    assert breaker.record_failure('111111111111', 'AccessDenied')
+    clock.now += 61
+    breaker.check('111111111111')
+    # The other callers keep failing fast during the trial call
+    with pytest.raises(CircuitOpenError):
+        breaker.check('111111111111')
+    # A failed trial keeps the circuit open without reporting it as opened again
+    assert not breaker.record_failure('111111111111', 'AccessDenied')
+    clock.now += 61
+    breaker.check('111111111111')
+    breaker.record_success('111111111111')
+    assert not breaker.is_open('111111111111')
+    breaker.check('111111111111')
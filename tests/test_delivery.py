@@ -0,0 +1,87 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import threading
+import delivery
+from events.event_mapping import ProcessedEvent
+
+class RecordingSink(delivery.Sink):
+
+    def __init__(self, name, timeout_seconds=5, error=None, block=None, required=True):
+        super().__init__(timeout_seconds)
+        self.name = name
+        self.error = error
+        self.block = block
+        self.required = required
+        self.flushed = []
+
+    def flush(self):
+        records = self.drain()
+        if self.block is not None:
+            self.block.wait()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        self.flushed.extend(records)
+        return records
+
+def event(source_server_id='s-1'):
+    return ProcessedEvent('111111111111', 'us-east-1', 'MGN Lifecycle State Change', '2024-01-01T00:00:00Z', source_server_id, 'host.example.com', {'state': 'TESTING'}, 'Major')
+
+def test_failed_sink_reports_the_origins_it_held():
+    logs, sns = RecordingSink('logs'), RecordingSink('sns', error='throttled')
+    sns.notifications_only = True
+    pipeline = delivery.DeliveryPipeline([logs, sns])
+    pipeline.deliver(event('s-1'), notify=True, origin='message-1')
+    pipeline.deliver(event('s-2'), notify=False, origin='message-2')
+    failures, failed_origins = pipeline.flush_with_origins()
+    assert failures == {'sns': 'throttled'}
+    # message-2 was not notified, so the SNS failure does not retry it
+    assert failed_origins == {'message-1'}
+    assert len(logs.flushed) == 2
+    sns.error = None
+    assert pipeline.flush_with_origins() == ({}, set())
+
+def test_timed_out_sink_keeps_its_events_until_the_flush_finishes():
+    block = threading.Event()
+    slow = RecordingSink('webhook', timeout_seconds=0.05, block=block)
+    pipeline = delivery.DeliveryPipeline([RecordingSink('logs'), slow])
+    pipeline.deliver(event(), origin='message-1')
+    failures, failed_origins = pipeline.flush_with_origins()
+    assert failures == {'webhook': 'timed out after 0.05 seconds'}
+    assert failed_origins == {'message-1'}
+    pipeline.deliver(event(), origin='message-2')
+    assert pipeline.flush_with_origins() == ({'webhook': 'previous flush still running'}, {'message-2'})
+    block.set()
+    pipeline._running['webhook'].result()
+    assert pipeline.flush_with_origins() == ({}, set())
+    assert len(slow.flushed) == 2
+
+def test_best_effort_sink_failures_are_not_retried():
+    webhook = RecordingSink('webhook', error='connection refused', required=False)
+    pipeline = delivery.DeliveryPipeline([RecordingSink('logs'), webhook])
+    pipeline.deliver(event(), origin='message-1')
+    assert pipeline.flush_with_origins() == ({}, set())
+
+def test_configured_sinks(monkeypatch):
+    monkeypatch.setenv('DeliverySinks', 'logs, sns,webhook')
+    monkeypatch.setenv('SinkTimeouts', 'webhook=3')
+    monkeypatch.setenv('WebhookUrl', 'https://hooks.example.com/mgn')
+    sinks = delivery.configured_sinks()
+    assert [(sink.name, sink.timeout_seconds, sink.required) for sink in sinks] == [('logs', 10, True), ('sns', 10, True), ('webhook', 3, False)]
+    monkeypatch.setenv('RequiredSinks', 'logs,webhook')
+    assert [sink.required for sink in delivery.configured_sinks()] == [True, False, True]
@@ -0,0 +1,113 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+from datetime import datetime, timezone
+import delivery
+from conftest import stalled_event
+from events.event_mapping import ProcessedEvent
+from event_history import episode_transition, LocalEventHistoryStore
+
+def event(event_type, time_stamp, state, account='111111111111', source_server_id='s-1'):
+    return ProcessedEvent(account, 'us-east-1', event_type, time_stamp, source_server_id, 'host.example.com', {'state': state}, 'Major')
+
+def test_episode_transition():
+    assert episode_transition(event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED')) == ('stall', True)
+    assert episode_transition(event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'NOT_STALLED')) == ('stall', False)
+    assert episode_transition(event('MGN Replication LagDuration Alarm', '2024-01-01T00:00:00Z', {'value': 'ALARM'})) == ('lag', True)
+    assert episode_transition(event('MGN Replication LagDuration Alarm', '2024-01-01T00:00:00Z', {'value': 'OK'})) == ('lag', False)
+    assert episode_transition(event('MGN Replication LagDuration Alarm', '2024-01-01T00:00:00Z', {'value': 'INSUFFICIENT_DATA'})) is None
+    assert episode_transition(event('MGN Lifecycle State Change', '2024-01-01T00:00:00Z', 'CUTOVER')) is None
+
+def test_sweep_recovery_closes_the_lag_episode():
+    breach = event('Replication Sweep : LagDuration', '2024-01-01T00:00:00Z', 'CONTINUOUS')
+    recovery = ProcessedEvent('111111111111', 'us-east-1', 'Replication Sweep : LagDuration', '2024-01-01T01:00:00Z', 's-1', 'host.example.com',
+                              {'state': 'CONTINUOUS', 'recovered': True}, 'Informational')
+    assert episode_transition(breach) == ('lag', True)
+    assert episode_transition(recovery) == ('lag', False)
+
+def test_forecast_events_do_not_open_episodes():
+    assert episode_transition(event('MGN Replication Forecast LagDuration', '2024-01-01T00:00:00Z', 'STALLED')) is None
+
+def test_episodes_and_mttr(tmp_path):
+    store = LocalEventHistoryStore(str(tmp_path / 'history.db'))
+    store.append([
+        event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED', source_server_id='s-1'),
+        # A repeated problem event does not open a second episode
+        event('MGN Source Server Stalled', '2024-01-01T00:05:00Z', 'STALLED', source_server_id='s-1'),
+        event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED', source_server_id='s-2'),
+        event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED', account='222222222222', source_server_id='s-3'),
+    ])
+    assert len(store.open_incidents()) == 3
+    assert len(store.open_incidents(account='222222222222')) == 1
+    assert store.mttr('stall') is None
+
+    store.append([
+        event('MGN Source Server Stalled', '2024-01-01T00:10:00Z', 'NOT_STALLED', source_server_id='s-1'),
+        event('MGN Source Server Stalled', '2024-01-01T00:30:00Z', 'NOT_STALLED', source_server_id='s-2'),
+        event('MGN Source Server Stalled', '2024-01-01T01:00:00Z', 'NOT_STALLED', account='222222222222', source_server_id='s-3'),
+        # A recovery without an open episode is ignored
+        event('MGN Source Server Stalled', '2024-01-01T01:00:00Z', 'NOT_STALLED', source_server_id='s-4'),
+    ])
+    assert store.open_incidents() == []
+    assert store.mttr('stall', account='111111111111') == 1200
+    assert store.mttr('stall') == (600 + 1800 + 3600) / 3
+    assert store.mttr('lag') is None
+    assert store.worst_accounts('stall') == [('222222222222', 1, 3600, 3600), ('111111111111', 2, 2400, 1200)]
+
+def test_mttr_by_day(tmp_path):
+    store = LocalEventHistoryStore(str(tmp_path / 'history.db'))
+    store.append([
+        event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED'),
+        event('MGN Source Server Stalled', '2024-01-01T00:10:00Z', 'NOT_STALLED'),
+        event('MGN Source Server Stalled', '2024-01-02T00:00:00Z', 'STALLED'),
+        event('MGN Source Server Stalled', '2024-01-02T00:30:00Z', 'NOT_STALLED'),
+    ])
+    day = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    assert store.mttr('stall', since=day) == 1800
+    assert store.mttr('stall', until=datetime(2024, 1, 1, tzinfo=timezone.utc)) == 600
+
+def test_server_history_is_newest_first(tmp_path):
+    store = LocalEventHistoryStore(str(tmp_path / 'history.db'))
+    store.append([
+        event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED'),
+        event('MGN Source Server Stalled', '2024-01-01T00:10:00Z', 'NOT_STALLED'),
+    ])
+    history = store.server_history('s-1')
+    assert len(history) == 2
+    assert '00:10:00' in history[0]
+
+def test_handler_records_stall_episodes(central, aws, monkeypatch, tmp_path):
+    monkeypatch.setenv('DeliverySinks', 'logs,sns,history')
+    monkeypatch.setenv('EventHistoryPath', str(tmp_path / 'history.db'))
+    monkeypatch.setattr(delivery, 'pipeline', delivery.DeliveryPipeline(delivery.configured_sinks()))
+    aws.add_server('s-1')
+    central.lambda_handler(stalled_event('s-1', 'STALLED', time_stamp='2024-01-01T00:00:00Z'), None)
+    central.lambda_handler(stalled_event('s-1', 'NOT_STALLED', time_stamp='2024-01-01T00:20:00Z'), None)
+    store = LocalEventHistoryStore(str(tmp_path / 'history.db'))
+    assert store.open_incidents() == []
+    assert store.mttr('stall') == 1200
+    assert 'is no longer stalled' in aws.notifications[1]['Message']
+    assert 'This is a Informational event' in aws.notifications[1]['Message']
+
+def test_history_sink_needs_a_shared_location(monkeypatch):
+    monkeypatch.delenv('EventHistoryPath', raising=False)
+    sink = delivery.HistorySink(1)
+    sink.deliver(event('MGN Source Server Stalled', '2024-01-01T00:00:00Z', 'STALLED'))
+    assert sink.flush() == []
+    assert sink.disabled
+    assert sink.store is None
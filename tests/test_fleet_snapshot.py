@@ -0,0 +1,163 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import pytest
+from events.event_mapping import ProcessedEvent
+import fleet_snapshot
+from fleet_snapshot import FleetSnapshot, SnapshotStore, SnapshotConflictError, epoch_seconds
+
+def event(event_type, time_stamp, detail, source_server_id='s-1'):
+    return ProcessedEvent('111111111111', 'us-east-1', event_type, time_stamp, source_server_id, 'host.example.com', detail, 'Major')
+
+def test_upsert_keeps_the_newest_data():
+    snapshot = FleetSnapshot()
+    assert snapshot.upsert('111111111111', 'us-east-1', 's-1', 100, lifecycle_state='READY_FOR_TEST')
+    assert not snapshot.upsert('111111111111', 'us-east-1', 's-1', 50, lifecycle_state='NOT_READY')
+    assert snapshot.upsert('111111111111', 'us-east-1', 's-1', 100, replication_state='CONTINUOUS')
+    [record] = snapshot.records()
+    assert record['lifecycle_state'] == 'READY_FOR_TEST'
+    assert record['replication_state'] == 'CONTINUOUS'
+    assert record['lag_seconds'] is None
+    assert len(snapshot) == 1
+
+def test_apply_event():
+    snapshot = FleetSnapshot()
+    assert snapshot.apply_event(event('MGN Lifecycle State Change', '2024-01-01T00:00:00Z', {'state': 'TESTING'}))
+    assert snapshot.apply_event(event('MGN Source Server Stalled', '2024-01-01T00:01:00Z', {'state': 'STALLED'}))
+    assert snapshot.apply_event(event('MGN Replication Sweep Lag', '2024-01-01T00:02:00Z', {'state': 'CONTINUOUS', 'lifecycle_state': 'TESTING', 'lag_seconds': 42}, 's-2'))
+    assert not snapshot.apply_event(event('MGN Replication Lag Alarm', '2024-01-01T00:03:00Z', {'state': {'value': 'ALARM'}}))
+    # An event older than the row does not change it
+    assert not snapshot.apply_event(event('MGN Lifecycle State Change', '2023-12-31T00:00:00Z', {'state': 'NOT_READY'}))
+    records = {record['source_server_id']: record for record in snapshot.records()}
+    assert records['s-1']['lifecycle_state'] == 'TESTING'
+    assert records['s-1']['replication_state'] == 'STALLED'
+    assert records['s-1']['fqdn'] == 'host.example.com'
+    assert records['s-1']['updated_at'] == epoch_seconds('2024-01-01T00:01:00Z')
+    assert records['s-2']['lag_seconds'] == 42
+    assert snapshot.state_counts() == {'TESTING': 2}
+
+def test_merge_takes_newer_rows_and_build_time():
+    older = FleetSnapshot()
+    older.built_at = 1000
+    older.upsert('111111111111', 'us-east-1', 's-1', 100, lifecycle_state='TESTING')
+    older.upsert('111111111111', 'us-east-1', 's-2', 300, lifecycle_state='CUTOVER')
+    newer = FleetSnapshot()
+    newer.built_at = 2000
+    newer.upsert('111111111111', 'us-east-1', 's-1', 200, lifecycle_state='CUTOVER')
+    newer.upsert('111111111111', 'us-east-1', 's-2', 200, lifecycle_state='TESTING')
+    newer.upsert('111111111111', 'us-east-1', 's-3', 200, lifecycle_state='TESTING')
+    assert older.merge(newer) == 2
+    assert older.built_at == 2000
+    assert {record['source_server_id']: record['lifecycle_state'] for record in older.records()} == {'s-1': 'CUTOVER', 's-2': 'CUTOVER', 's-3': 'TESTING'}
+    newer.merge(FleetSnapshot())
+    assert newer.built_at == 2000
+
+def test_needs_rebuild():
+    snapshot = FleetSnapshot()
+    assert snapshot.needs_rebuild(3600, 0)
+    assert not snapshot.needs_rebuild(0, 0)
+    snapshot.built_at = 1000
+    assert not snapshot.needs_rebuild(3600, 4599)
+    assert snapshot.needs_rebuild(3600, 4600)
+
+def test_document_round_trip():
+    snapshot = FleetSnapshot()
+    snapshot.built_at = 1000
+    snapshot.upsert('111111111111', 'us-east-1', 's-1', 100, lifecycle_state='TESTING', lag_seconds=5)
+    snapshot.upsert('111111111111', 'eu-west-1', 's-2', 200, replication_state='STALLED')
+    restored = FleetSnapshot.from_document(snapshot.to_document())
+    assert restored.built_at == 1000
+    assert list(restored.records()) == list(snapshot.records())
+
+def test_store_applies_events_to_the_stored_snapshot(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshot.json.gz'), write_attempts=2)
+    assert store.load() is None
+    assert store.update([event('MGN Lifecycle State Change', '2024-01-01T00:00:00Z', {'state': 'TESTING'})]) == 0
+    built = FleetSnapshot()
+    built.built_at = 1000
+    built.upsert('111111111111', 'us-east-1', 's-1', 0, lifecycle_state='READY_FOR_TEST')
+    store.save(built)
+    assert store.update([event('MGN Lifecycle State Change', '2024-01-01T00:00:00Z', {'state': 'TESTING'})]) == 1
+    stored = store.load()
+    assert stored.built_at == 1000
+    assert [record['lifecycle_state'] for record in stored.records()] == ['TESTING']
+
+def test_store_retries_a_conflicting_write(tmp_path, monkeypatch):
+    location = str(tmp_path / 'snapshot.json.gz')
+    store = SnapshotStore(location, write_attempts=3)
+    store.save(FleetSnapshot())
+    write_location_if = fleet_snapshot.write_location_if
+    attempts = []
+
+    def concurrent_write(location, body, expected_version):
+        attempts.append(expected_version)
+        if len(attempts) == 1:
+            # Another container stores a snapshot between the read and the write
+            other = SnapshotStore(location, write_attempts=1)
+            snapshot = other.load()
+            snapshot.upsert('111111111111', 'us-east-1', 's-2', 100, lifecycle_state='CUTOVER')
+            write_location_if(location, fleet_snapshot.gzip.compress(fleet_snapshot.json.dumps(snapshot.to_document()).encode('utf-8')), expected_version)
+            # Keep the modification time based version apart on coarse file systems
+            fleet_snapshot.os.utime(location, ns=(0, 1))
+        return write_location_if(location, body, expected_version)
+
+    monkeypatch.setattr(fleet_snapshot, 'write_location_if', concurrent_write)
+    snapshot = FleetSnapshot()
+    snapshot.upsert('111111111111', 'us-east-1', 's-1', 100, lifecycle_state='TESTING')
+    store.save(snapshot)
+    assert len(attempts) == 2
+    assert {record['source_server_id'] for record in store.load().records()} == {'s-1', 's-2'}
+
+def test_store_gives_up_after_the_write_attempts(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / 'snapshot.json.gz'), write_attempts=2)
+    monkeypatch.setattr(fleet_snapshot, 'write_location_if', lambda location, body, expected_version: False)
+    with pytest.raises(SnapshotConflictError):
+        store.save(FleetSnapshot())
+
+def test_rebuild_replaces_the_rows_of_the_rebuilt_targets(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshot.json.gz'), write_attempts=2)
+    stored = FleetSnapshot()
+    stored.built_at = 1000
+    stored.upsert('111111111111', 'us-east-1', 's-deleted', 1000, lifecycle_state='CUTOVER')
+    stored.upsert('111111111111', 'us-east-1', 's-event', 2500, lifecycle_state='TESTING')
+    stored.upsert('222222222222', 'us-east-1', 's-unread', 1000, lifecycle_state='TESTING')
+    store.save(stored)
+    rebuilt = FleetSnapshot()
+    rebuilt.built_at = 2000
+    rebuilt.upsert('111111111111', 'us-east-1', 's-1', 2000, lifecycle_state='READY_FOR_TEST')
+    targets = [('111111111111', 'us-east-1'), ('222222222222', 'us-east-1')]
+    store.save(rebuilt, fleet_snapshot.rebuilt_targets(targets, ['222222222222:us-east-1']))
+    # s-deleted was not found by the build, s-event changed after it started, s-unread is in a target that failed
+    assert {record['source_server_id'] for record in store.load().records()} == {'s-1', 's-event', 's-unread'}
+
+def test_snapshot_sink_is_best_effort_and_writes_at_an_interval(tmp_path, monkeypatch):
+    import delivery
+    store = SnapshotStore(str(tmp_path / 'snapshot.json.gz'), write_attempts=1)
+    store.save(FleetSnapshot())
+    sink = delivery.SnapshotSink(5, store=store, interval_seconds=60)
+    monkeypatch.setattr(fleet_snapshot, 'write_location_if', lambda location, body, expected_version: False)
+    sink.deliver(event('MGN Lifecycle State Change', '2024-01-01T00:00:00Z', {'state': 'TESTING'}))
+    assert sink.flush() == []
+    monkeypatch.undo()
+    sink.deliver(event('MGN Lifecycle State Change', '2024-01-01T00:00:00Z', {'state': 'TESTING'}, 's-2'))
+    # The failed write is retried with the events of the next flush
+    assert sink.flush() == [2]
+    sink.deliver(event('MGN Lifecycle State Change', '2024-01-01T00:01:00Z', {'state': 'CUTOVER'}))
+    # Within the interval the events are kept for the next write
+    assert sink.flush() == []
+    assert [record['lifecycle_state'] for record in store.load().records()] == ['TESTING', 'TESTING']
@@ -0,0 +1,53 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+from idempotency import event_key, IdempotencyCache, LocalIdempotencyStore
+
+def test_event_key_uses_the_event_id():
+    assert event_key({'id': 'abc', 'detail': {}}) == 'id:abc'
+
+def test_event_key_hashes_records_without_id():
+    first = event_key({'eventName': 'StartReplication', 'requestParameters': {'a': 1, 'b': 2}})
+    reordered = event_key({'requestParameters': {'b': 2, 'a': 1}, 'eventName': 'StartReplication'})
+    other = event_key({'eventName': 'StopReplication', 'requestParameters': {'a': 1, 'b': 2}})
+    assert first.startswith('sha256:')
+    assert first == reordered
+    assert first != other
+
+def test_cache_remembers_recorded_keys():
+    cache = IdempotencyCache(60, 100)
+    assert not cache.is_duplicate('id:1')
+    cache.record('id:1')
+    assert cache.is_duplicate('id:1')
+    assert not cache.is_duplicate('id:2')
+
+def test_store_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / 'idempotency.db')
+    first = IdempotencyCache(60, 100, LocalIdempotencyStore(path))
+    second = IdempotencyCache(60, 100, LocalIdempotencyStore(path))
+    first.record('id:1')
+    assert second.is_duplicate('id:1')
+    # The key found in the store is now answered from memory
+    assert second.memory.get('id:1') is not None
+
+def test_store_expires_keys(tmp_path):
+    store = LocalIdempotencyStore(str(tmp_path / 'idempotency.db'))
+    store.put('id:1', -1)
+    store.put('id:2', 60)
+    assert not store.exists('id:1')
+    assert store.exists('id:2')
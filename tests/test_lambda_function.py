@@ -0,0 +1,125 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import pytest
+from conftest import alarm_event, client_error, sqs_batch, stalled_event
+
+def notified_messages(aws):
+    return [notification['Message'] for notification in aws.notifications]
+
+def test_alarm_recovery_is_notified_as_a_recovery(central, aws):
+    aws.add_server('s-1')
+    central.lambda_handler(alarm_event('s-1', 'ALARM', 'OK', time_stamp='2024-01-01T00:00:00Z'), None)
+    central.lambda_handler(alarm_event('s-1', 'OK', 'ALARM', time_stamp='2024-01-01T00:01:00Z'), None)
+    alarm, recovery = notified_messages(aws)
+    assert 'is experiencing lag in replication' in alarm
+    assert 'is no longer experiencing lag in replication' in recovery
+    assert 'This is a Informational event' in recovery
+
+def test_alarm_flapping_after_recovery_is_not_notified(central, aws):
+    aws.add_server('s-1')
+    transitions = [('ALARM', 'OK'), ('OK', 'ALARM'), ('ALARM', 'OK'), ('OK', 'ALARM')]
+    published = []
+    for minute, (state, previous_state) in enumerate(transitions):
+        central.lambda_handler(alarm_event('s-1', state, previous_state, time_stamp='2024-01-01T00:0{}:00Z'.format(minute)), None)
+        published.append(len(aws.notifications))
+    assert published == [1, 2, 2, 2]
+    # Suppressed transitions are still logged
+    assert len(aws.log_events) == 4
+
+def test_batch_digests_recoveries_apart_from_alarms(central, aws):
+    for source_server_id in ('s-1', 's-2', 's-3'):
+        aws.add_server(source_server_id)
+    central.batch_handler(sqs_batch(
+        alarm_event('s-1', 'ALARM', 'OK'),
+        alarm_event('s-2', 'ALARM', 'OK'),
+        alarm_event('s-3', 'OK', 'ALARM'),
+    ), None)
+    subjects = sorted(notification.get('Subject', '') for notification in aws.notifications)
+    assert subjects == ['', '2 MGN source servers: CloudWatch Alarm State Change : LagDuration']
+    assert any('no longer experiencing lag' in message for message in notified_messages(aws))
+
+def test_duplicate_delivery_is_dropped(central, aws):
+    aws.add_server('s-1')
+    event = stalled_event('s-1')
+    central.lambda_handler(event, None)
+    central.lambda_handler(event, None)
+    assert len(aws.notifications) == 1
+    assert aws.count('mgn', 'describe_source_servers') == 1
+
+def test_idempotency_key_is_not_recorded_when_the_flush_fails(central, aws):
+    aws.add_server('s-1')
+    event = stalled_event('s-1')
+    aws.errors[('sns', 'publish')] = client_error('InternalError', 'Publish')
+    with pytest.raises(RuntimeError):
+        central.lambda_handler(event, None)
+    del aws.errors[('sns', 'publish')]
+    central.lambda_handler(event, None)
+    assert len(aws.notifications) == 1
+
+def test_duplicates_within_a_batch_are_dropped(central, aws):
+    aws.add_server('s-1')
+    event = stalled_event('s-1')
+    response = central.batch_handler(sqs_batch(event, event), None)
+    assert response == {'batchItemFailures': []}
+    assert len(aws.notifications) == 1
+
+def test_batch_describes_source_servers_once_per_account_and_region(central, aws):
+    for source_server_id in ('s-1', 's-2', 's-3'):
+        aws.add_server(source_server_id)
+    aws.add_server('s-4', account='222222222222')
+    response = central.batch_handler(sqs_batch(
+        stalled_event('s-1'), stalled_event('s-2'), stalled_event('s-3'), stalled_event('s-4', account='222222222222')
+    ), None)
+    assert response == {'batchItemFailures': []}
+    assert aws.count('mgn', 'describe_source_servers') == 2
+    assert len(aws.log_events) == 4
+
+def test_batch_retries_only_the_records_that_failed(central, aws, monkeypatch):
+    aws.add_server('s-1')
+    aws.add_server('s-2', account='222222222222')
+    describe_source_servers = aws.mgn_describe_source_servers
+
+    def denied_in_one_account(client, **params):
+        if client.account == '222222222222':
+            raise client_error('InternalServerException', 'DescribeSourceServers')
+        return describe_source_servers(client, **params)
+
+    monkeypatch.setattr(aws, 'mgn_describe_source_servers', denied_in_one_account)
+    batch = sqs_batch(stalled_event('s-1'), stalled_event('s-2', account='222222222222'))
+    batch['Records'].append({'messageId': 'message-invalid', 'body': 'not json', 'attributes': {'ApproximateReceiveCount': '1'}})
+    response = central.batch_handler(batch, None)
+    assert sorted(failure['itemIdentifier'] for failure in response['batchItemFailures']) == ['message-1', 'message-invalid']
+    assert len(aws.notifications) == 1
+
+def test_batch_retries_the_records_queued_in_a_failed_sink(central, aws):
+    aws.add_server('s-1')
+    aws.add_server('s-2')
+    lifecycle_event = dict(stalled_event('s-2'), **{
+        'id': 'lifecycle-s-2',
+        'detail-type': 'MGN Source Server Lifecycle State Change',
+        'detail': {'state': 'READY_FOR_TEST'}
+    })
+    aws.errors[('sns', 'publish')] = client_error('InternalError', 'Publish')
+    response = central.batch_handler(sqs_batch(stalled_event('s-1'), lifecycle_event), None)
+    # The lifecycle change is not notified, so only the stalled event waits for SNS
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'message-0'}]}
+    del aws.errors[('sns', 'publish')]
+    response = central.batch_handler(sqs_batch(stalled_event('s-1'), lifecycle_event), None)
+    assert response == {'batchItemFailures': []}
+    assert len(aws.notifications) == 1
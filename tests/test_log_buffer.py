@@ -0,0 +1,88 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+from collections import Counter
+import log_buffer
+from log_buffer import LogBuffer, split_batches
+from conftest import client_error
+
+class LogsClient:
+
+    def __init__(self, missing_once=()):
+        self.calls = Counter()
+        self.batches = []
+        self.missing_once = set(missing_once)
+
+    def create_log_stream(self, logGroupName, logStreamName):
+        self.calls['create_log_stream'] += 1
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents):
+        self.calls['put_log_events'] += 1
+        if logStreamName in self.missing_once:
+            self.missing_once.discard(logStreamName)
+            raise client_error('ResourceNotFoundException', 'PutLogEvents')
+        self.batches.append((logStreamName, logEvents))
+        return {}
+
+def log_events(count, message='x', start=0, step=1):
+    return [{'timestamp': start + index * step, 'message': message} for index in range(count)]
+
+def test_split_batches_respects_the_count_limit():
+    assert [len(batch) for batch in split_batches(log_events(log_buffer.MAX_BATCH_EVENTS + 1))] == [log_buffer.MAX_BATCH_EVENTS, 1]
+
+def test_split_batches_respects_the_size_limit():
+    message = 'x' * (100 * 1024 - log_buffer.EVENT_OVERHEAD_BYTES)
+    assert [len(batch) for batch in split_batches(log_events(11, message))] == [10, 1]
+
+def test_split_batches_respects_the_time_span_limit():
+    batches = list(split_batches(log_events(3, step=log_buffer.MAX_BATCH_SPAN_MS // 2)))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert list(split_batches([])) == []
+
+def test_flush_writes_each_stream_in_time_order_and_creates_it_once():
+    client = LogsClient()
+    buffer = LogBuffer(lambda: client, 'MGN-Events')
+    buffer.add('stream-a', 'second', 2000)
+    buffer.add('stream-a', 'first', 1000)
+    buffer.add('stream-b', 'other', 1500)
+    assert buffer.pending_count() == 3
+    buffer.flush()
+    assert buffer.pending_count() == 0
+    assert [(stream, [log_event['message'] for log_event in batch]) for stream, batch in client.batches] == [
+        ('stream-a', ['first', 'second']), ('stream-b', ['other'])
+    ]
+    buffer.add('stream-a', 'third', 3000)
+    buffer.flush()
+    assert client.calls == Counter({'create_log_stream': 2, 'put_log_events': 3})
+
+def test_deleted_stream_is_created_again():
+    client = LogsClient()
+    buffer = LogBuffer(lambda: client, 'MGN-Events')
+    buffer.add('stream-a', 'first', 1000)
+    buffer.flush()
+    client.missing_once.add('stream-a')
+    buffer.add('stream-a', 'second', 2000)
+    buffer.flush()
+    assert client.calls['create_log_stream'] == 2
+    assert [batch[0]['message'] for stream, batch in client.batches] == ['first', 'second']
+
+def test_stdout_mode_prints_the_events(capsys):
+    buffer = LogBuffer(lambda: None, 'MGN-Events', stdout=True)
+    buffer.add('stream-a', 'message', 1000)
+    assert buffer.flush() == []
+    assert '"message": "message"' in capsys.readouterr().out
@@ -0,0 +1,38 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import metrics
+
+def counters(monkeypatch, responses):
+    monkeypatch.setattr(metrics, 'enabled', True)
+    monkeypatch.setattr(metrics, '_aggregates', {})
+    metrics.begin_event('Test', '111111111111')
+    for response in responses:
+        metrics.observe_response(context={'retries': {'attempt': 1}}, parsed_response=response)
+    metrics.end_event()
+    return metrics._aggregates.get(('Test', '111111111111'), {}).get('counters', {})
+
+def test_throttled_responses_are_counted_by_code_or_message(monkeypatch):
+    assert counters(monkeypatch, [
+        {'Error': {'Code': 'ThrottlingException', 'Message': 'Too many requests'}},
+        {'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}},
+        {'Error': {'Code': 'LimitExceededException', 'Message': 'Rate exceeded'}},
+        {'Error': {'Code': 'AccessDeniedException', 'Message': 'Rate exceeded for account'}},
+        {'Error': {'Code': 'Rate exceeded'}},
+        {'ResponseMetadata': {}}
+    ]) == {'aws_throttles': 3}
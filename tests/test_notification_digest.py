@@ -0,0 +1,96 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+from events.event_mapping import ProcessedEvent
+from notification_digest import NotificationDigest, split_batches, MAX_BATCH_ENTRIES, MAX_BATCH_BYTES
+
+def alarm_event(state, previous_state, source_server_id='s-1', time_stamp='2024-01-01T00:00:10Z'):
+    detail = {'state': {'value': state}, 'previous_state': {'value': previous_state}}
+    if state == 'OK':
+        detail['recovered'] = True
+    return ProcessedEvent('111111111111', 'us-east-1', 'MGN Replication Lag Alarm', time_stamp, source_server_id, 'host.example.com', detail, 'Major')
+
+def stalled_event(time_stamp, account='111111111111'):
+    return ProcessedEvent(account, 'us-east-1', 'MGN Source Server Stalled', time_stamp, 's-1', 'host.example.com', {'state': 'STALLED'}, 'Critical')
+
+def test_events_are_grouped_by_window():
+    digest = NotificationDigest(60, 0)
+    digest.add(stalled_event('2024-01-01T00:00:05Z'))
+    digest.add(stalled_event('2024-01-01T00:00:55Z'))
+    digest.add(stalled_event('2024-01-01T00:01:05Z'))
+    digest.add(stalled_event('2024-01-01T00:00:30Z', account='222222222222'))
+    assert [len(group) for group in digest.drain()] == [2, 1, 1]
+    assert digest.drain() == []
+
+def test_recoveries_are_grouped_apart():
+    digest = NotificationDigest(60, 0)
+    digest.add(alarm_event('ALARM', 'OK', 's-1'))
+    digest.add(alarm_event('ALARM', 'OK', 's-2'))
+    digest.add(alarm_event('OK', 'ALARM', 's-3'))
+    groups = digest.drain()
+    assert [[event.is_recovery() for event in group] for group in groups] == [[False, False], [True]]
+
+def test_first_recovery_is_notified():
+    digest = NotificationDigest(0, 300)
+    assert digest.add(alarm_event('ALARM', 'OK'))
+    assert digest.add(alarm_event('OK', 'ALARM'))
+
+def test_alarm_after_recovery_is_suppressed():
+    digest = NotificationDigest(0, 300)
+    results = [digest.add(alarm_event(state, previous)) for state, previous in
+               [('ALARM', 'OK'), ('OK', 'ALARM'), ('ALARM', 'OK'), ('OK', 'ALARM'), ('ALARM', 'OK')]]
+    assert results == [True, True, False, False, False]
+
+def test_flap_window_is_per_source_server():
+    digest = NotificationDigest(0, 300)
+    for source_server_id in ('s-1', 's-2'):
+        assert digest.add(alarm_event('ALARM', 'OK', source_server_id))
+        assert digest.add(alarm_event('OK', 'ALARM', source_server_id))
+    assert not digest.add(alarm_event('ALARM', 'OK', 's-1'))
+    assert digest.add(alarm_event('INSUFFICIENT_DATA', 'OK', 's-3'))
+
+def test_no_suppression_without_flap_window():
+    digest = NotificationDigest(0, 0)
+    for state, previous in [('ALARM', 'OK'), ('OK', 'ALARM'), ('ALARM', 'OK')]:
+        assert digest.add(alarm_event(state, previous))
+
+def test_non_alarm_events_are_never_suppressed():
+    digest = NotificationDigest(0, 300)
+    for _ in range(3):
+        assert digest.add(stalled_event('2024-01-01T00:00:05Z'))
+
+def entry(index, size):
+    return {'Id': str(index), 'Subject': 'Stalled', 'Message': 'x' * size}
+
+def test_split_batches_entry_limit():
+    batches = list(split_batches(entry(index, 10) for index in range(25)))
+    assert [len(batch) for batch in batches] == [MAX_BATCH_ENTRIES, MAX_BATCH_ENTRIES, 5]
+
+def test_split_batches_size_limit():
+    size = MAX_BATCH_BYTES // 3
+    batches = list(split_batches(entry(index, size) for index in range(4)))
+    assert [len(batch) for batch in batches] == [2, 2]
+    for batch in batches:
+        assert sum(len(item['Message']) + len(item['Subject']) for item in batch) <= MAX_BATCH_BYTES
+
+def test_split_batches_keeps_an_oversized_entry_alone():
+    batches = list(split_batches([entry(0, 10), entry(1, MAX_BATCH_BYTES + 1), entry(2, 10)]))
+    assert [[item['Id'] for item in batch] for batch in batches] == [['0'], ['1'], ['2']]
+
+def test_split_batches_without_entries():
+    assert list(split_batches([])) == []
@@ -0,0 +1,56 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import rate_limiter
+from rate_limiter import TokenBucket
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+def test_token_bucket_spreads_a_burst(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, 'sleep', clock.sleep)
+    bucket = TokenBucket(2)
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, 0.5, 0.5]
+    clock.now += 10
+    # The bucket refills up to its capacity only
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0.5]
+
+def test_parse_rate_limits():
+    assert rate_limiter.parse_rate_limits(' mgn:DescribeSourceServers=5, STS:AssumeRole=0.5,') == {
+        ('mgn', 'DescribeSourceServers'): 5.0,
+        ('sts', 'AssumeRole'): 0.5
+    }
+
+def test_buckets_are_kept_per_api_and_account(monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'buckets', {})
+    bucket = rate_limiter.get_bucket('mgn', 'DescribeSourceServers', '111111111111')
+    assert bucket is rate_limiter.get_bucket('mgn', 'DescribeSourceServers', '111111111111')
+    assert bucket is not rate_limiter.get_bucket('mgn', 'DescribeSourceServers', '222222222222')
+    assert rate_limiter.get_bucket('mgn', 'StartTest') is None
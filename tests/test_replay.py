@@ -0,0 +1,33 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import replay
+from events.event_mapping import ProcessedEvent
+
+def test_event_timestamp():
+    assert replay.event_timestamp('2024-01-01T00:00:01Z') == 1704067201000
+    assert replay.event_timestamp('2024-01-01T01:00:01+01:00') == 1704067201000
+    assert replay.event_timestamp('not a time') is None
+
+def test_log_group_output_keeps_the_time_of_the_original_events(central, aws):
+    output = replay.LogGroupOutput()
+    for time_stamp in ('2024-01-01T01:00:00Z', '2024-01-01T00:00:00Z'):
+        output.write(ProcessedEvent('111111111111', 'us-east-1', 'MGN Lifecycle State Change', time_stamp, 's-1', 'host.example.com', {'state': 'TESTING'}, 'Major'))
+    output.close()
+    [log_events] = [params['logEvents'] for service, operation, params in aws.requests if operation == 'put_log_events']
+    assert [log_event['timestamp'] for log_event in log_events] == [1704067200000, 1704070800000]
@@ -0,0 +1,66 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import pytest
+from conftest import ACCOUNT, REGION, client_error
+from events.event_mapping import ProcessedEvent
+from ttl_cache import TTLCache
+
+np = pytest.importorskip('numpy')
+import replication_forecast
+
+FORECAST_EVENT = {'targets': ['{}:{}'.format(ACCOUNT, REGION)]}
+
+def forecast_event(source_server_id='s-1'):
+    detail = {'metric': 'LagDuration', 'threshold': 3600, 'level': 1800, 'slope_per_hour': 600, 'points': 12,
+              'hours_to_breach': 3, 'predicted_breach_time': '2024-01-01T03:00:00Z'}
+    return ProcessedEvent(ACCOUNT, REGION, 'Replication Forecast : LagDuration', '2024-01-01T00:00:00Z', source_server_id, source_server_id + '.example.com', detail, 'Major')
+
+@pytest.fixture
+def forecast(central, monkeypatch):
+    monkeypatch.setattr(replication_forecast, 'notified_forecasts', TTLCache(1000, 3600))
+    monkeypatch.setattr(replication_forecast, 'pending_forecasts', [])
+    monkeypatch.setattr(replication_forecast, 'forecast_target', lambda account, region, thresholds, settings, now: (1, [forecast_event()]))
+    return central
+
+def test_analyze_series_predicts_the_time_to_breach():
+    settings = {'min_points': 3, 'window': 1, 'percentile': 50}
+    offsets = np.array([-3600.0, -2400.0, -1200.0, 0.0])
+    values = np.array([
+        [600.0, 1200.0, 1800.0, 2400.0],
+        [2400.0, 1800.0, 1200.0, 600.0],
+        [np.nan, np.nan, np.nan, 600.0],
+    ])
+    analysis = replication_forecast.analyze_series(values, offsets, 3600, settings)
+    assert analysis['slope'][0] == pytest.approx(0.5)
+    assert analysis['time_to_breach'][0] == pytest.approx(2400)
+    assert np.isnan(analysis['time_to_breach'][1])
+    assert np.isnan(analysis['slope'][2])
+
+def test_forecast_is_notified_once(forecast, aws):
+    assert forecast.forecast_handler(FORECAST_EVENT, None)['notified'] == 1
+    assert forecast.forecast_handler(FORECAST_EVENT, None)['notified'] == 0
+    assert len(aws.notifications) == 1
+
+def test_forecast_of_a_failed_flush_is_notified_again(forecast, aws):
+    aws.errors[('sns', 'publish')] = client_error('InternalError', 'Publish')
+    with pytest.raises(RuntimeError):
+        forecast.forecast_handler(FORECAST_EVENT, None)
+    del aws.errors[('sns', 'publish')]
+    assert forecast.forecast_handler(FORECAST_EVENT, None)['notified'] == 1
+    assert len(aws.notifications) == 1
@@ -0,0 +1,74 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import pytest
+from conftest import ACCOUNT, REGION, client_error
+from ttl_cache import TTLCache
+import replication_sweep
+
+SWEEP_EVENT = {'targets': ['{}:{}'.format(ACCOUNT, REGION)]}
+
+@pytest.fixture
+def sweep(central, monkeypatch):
+    monkeypatch.setattr(replication_sweep, 'notified_breaches', TTLCache(1000, 3600))
+    monkeypatch.setattr(replication_sweep, 'pending_breaches', [])
+    return central
+
+def test_parse_sweep_targets():
+    assert replication_sweep.parse_sweep_targets(' 111111111111:us-east-1, ,222222222222:eu-west-1') == [
+        ('111111111111', 'us-east-1'), ('222222222222', 'eu-west-1')]
+
+def test_parse_iso8601_duration():
+    assert replication_sweep.parse_iso8601_duration('PT1H30M') == 5400
+    assert replication_sweep.parse_iso8601_duration('P1DT1S') == 86401
+    assert replication_sweep.parse_iso8601_duration('1 hour') is None
+
+def test_breach_is_notified_once(sweep, aws):
+    aws.add_server('s-1', replication={'dataReplicationState': 'STALLED'})
+    aws.add_server('s-2')
+    first = sweep.sweep_handler(SWEEP_EVENT, None)
+    second = sweep.sweep_handler(SWEEP_EVENT, None)
+    assert (first['servers'], first['breaches'], first['notified']) == (2, 1, 1)
+    assert (second['breaches'], second['notified']) == (1, 0)
+    assert len(aws.notifications) == 1
+
+def test_breach_of_a_failed_flush_is_notified_again(sweep, aws):
+    aws.add_server('s-1', replication={'dataReplicationState': 'STALLED'})
+    aws.errors[('sns', 'publish')] = client_error('InternalError', 'Publish')
+    with pytest.raises(RuntimeError):
+        sweep.sweep_handler(SWEEP_EVENT, None)
+    del aws.errors[('sns', 'publish')]
+    assert sweep.sweep_handler(SWEEP_EVENT, None)['notified'] == 1
+    assert len(aws.notifications) == 1
+    assert replication_sweep.pending_breaches == []
+
+def test_servers_in_testing_are_not_swept(sweep, aws):
+    aws.add_server('s-1', state='TESTING', replication={'dataReplicationState': 'STALLED'})
+    assert sweep.sweep_handler(SWEEP_EVENT, None)['breaches'] == 0
+
+def test_breach_that_no_longer_holds_is_reported_as_a_recovery(sweep, aws):
+    aws.add_server('s-1', replication={'dataReplicationState': 'STALLED'})
+    sweep.sweep_handler(SWEEP_EVENT, None)
+    aws.add_server('s-1', replication={'dataReplicationState': 'CONTINUOUS'})
+    summary = sweep.sweep_handler(SWEEP_EVENT, None)
+    assert (summary['breaches'], summary['recoveries']) == (0, 1)
+    assert 'is no longer stalled' in aws.notifications[1]['Message']
+    # The recovery is reported once, and a new breach is notified again
+    assert sweep.sweep_handler(SWEEP_EVENT, None)['recoveries'] == 0
+    aws.add_server('s-1', replication={'dataReplicationState': 'STALLED'})
+    assert sweep.sweep_handler(SWEEP_EVENT, None)['notified'] == 1
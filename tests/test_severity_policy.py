@@ -0,0 +1,113 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import json
+import os
+import pytest
+from severity_policy import CompiledPolicy, PolicySource, DEFAULT_SEVERITY
+
+POLICY = {
+    'version': 3,
+    'defaults': {'Stalled': 'Critical', 'Default': 'Minor'},
+    'rules': [
+        {'name': 'test-servers', 'severity': 'Informational', 'match': {'fqdn': ['*.test.example.com'], 'event_type': 'Stalled'}},
+        {'name': 'production-alarms', 'severity': 'Critical', 'match': {'alarm_state': 'ALARM', 'tags': {'Environment': 'production'}}},
+        {'name': 'cutover', 'severity': 'Major', 'match': {'lifecycle_state': ['READY_FOR_CUTOVER', 'CUTTING_OVER'], 'account': '111111111111'}},
+        {'name': 'owned', 'severity': 'Minor', 'match': {'tags': {'Owner': None}}},
+    ],
+}
+
+def test_flat_document_holds_the_defaults():
+    policy = CompiledPolicy({'Stalled': 'Critical'})
+    assert policy.version is None
+    assert policy.rules == []
+    assert policy.evaluate('Stalled') == 'Critical'
+    assert policy.evaluate('LagDuration') == DEFAULT_SEVERITY
+
+def test_defaults_apply_without_a_matching_rule():
+    policy = CompiledPolicy(POLICY)
+    assert policy.version == 3
+    assert policy.evaluate('Stalled', fqdn='db.prod.example.com') == 'Critical'
+    assert policy.evaluate('LagDuration') == 'Minor'
+
+def test_fqdn_patterns_ignore_case():
+    policy = CompiledPolicy(POLICY)
+    assert policy.evaluate('Stalled', fqdn='DB01.Test.Example.com') == 'Informational'
+    assert policy.evaluate('LagDuration', fqdn='db01.test.example.com') == 'Minor'
+
+def test_alarm_state_and_tags():
+    policy = CompiledPolicy(POLICY)
+    tags = {'Environment': 'production'}
+    assert policy.evaluate('LagDuration', alarm_state='ALARM', tags=tags) == 'Critical'
+    assert policy.evaluate('LagDuration', alarm_state='OK', tags=tags) == 'Minor'
+    assert policy.evaluate('LagDuration', alarm_state='ALARM', tags={'Environment': 'test'}) == 'Minor'
+
+def test_first_matching_rule_wins():
+    policy = CompiledPolicy(POLICY)
+    tags = {'Environment': 'production', 'Owner': 'team'}
+    assert policy.evaluate('LagDuration', alarm_state='ALARM', tags=tags) == 'Critical'
+    assert policy.evaluate('Stalled', account='111111111111', lifecycle_state='CUTTING_OVER', tags=tags) == 'Major'
+    assert policy.evaluate('Stalled', account='222222222222', lifecycle_state='CUTTING_OVER', tags=tags) == 'Minor'
+    assert [rule.name for rule in policy.candidates('Stalled', 'ALARM')] == ['test-servers', 'production-alarms', 'cutover', 'owned']
+    assert [rule.name for rule in policy.candidates('LagDuration', 'OK')] == ['cutover', 'owned']
+
+def test_unknown_match_field_is_rejected():
+    with pytest.raises(ValueError):
+        CompiledPolicy({'rules': [{'severity': 'Major', 'match': {'hostname': 'db01'}}]})
+
+def test_rule_without_severity_is_rejected():
+    with pytest.raises(ValueError):
+        CompiledPolicy({'rules': [{'match': {'event_type': 'Stalled'}}]})
+
+def write_policy(path, document):
+    path.write_text(json.dumps(document))
+    # Make the change visible to the modification time check on coarse file systems
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+def test_source_reloads_a_changed_file(tmp_path):
+    path = tmp_path / 'policy.json'
+    path.write_text(json.dumps({'Stalled': 'Critical'}))
+    source = PolicySource(str(path), check_seconds=0)
+    first = source.get()
+    assert first.evaluate('Stalled') == 'Critical'
+    assert source.get() is first
+    write_policy(path, {'Stalled': 'Minor'})
+    assert source.get().evaluate('Stalled') == 'Minor'
+
+def test_source_keeps_the_policy_when_the_file_breaks(tmp_path):
+    path = tmp_path / 'policy.json'
+    path.write_text(json.dumps({'Stalled': 'Critical'}))
+    source = PolicySource(str(path), check_seconds=0)
+    first = source.get()
+    write_policy(path, {'rules': [{'severity': 'Major', 'match': {'hostname': 'db01'}}]})
+    assert source.get() is first
+    path.write_text('{')
+    assert source.get() is first
+
+def test_source_waits_between_checks(tmp_path):
+    path = tmp_path / 'policy.json'
+    path.write_text(json.dumps({'Stalled': 'Critical'}))
+    source = PolicySource(str(path), check_seconds=3600)
+    source.get()
+    write_policy(path, {'Stalled': 'Minor'})
+    assert source.get().evaluate('Stalled') == 'Critical'
+
+def test_source_raises_without_a_policy(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        PolicySource(str(tmp_path / 'missing.json')).get()
@@ -0,0 +1,125 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import time
+from conftest import sqs_batch, stalled_event
+from storm_correlator import StormCorrelator
+
+def observe_servers(correlator, count, now, prefix='s-'):
+    return [correlator.observe('111111111111', 'us-east-1', '{}{}'.format(prefix, index), 'Stalled', now=now) for index in range(count)]
+
+def test_incident_opens_at_the_threshold_of_distinct_servers():
+    correlator = StormCorrelator(60, 3, 300)
+    # A single source server repeating its events does not make a storm
+    assert [correlator.observe('111111111111', 'us-east-1', 's-0', 'Stalled', now=0) for _ in range(5)] == [None] * 5
+    assert correlator.observe('111111111111', 'us-east-1', 's-1', 'Stalled', now=1) is None
+    incident = correlator.observe('111111111111', 'us-east-1', 's-2', 'Stalled', 'host-2', now=2)
+    assert incident is not None
+    assert incident.hosts == {'s-0': 's-0', 's-1': 's-1', 's-2': 'host-2'}
+    assert correlator.observe('111111111111', 'us-east-1', 's-3', 'LagDuration', now=3) is incident
+    assert incident.event_types == {'Stalled', 'LagDuration'}
+    # Other regions keep their own window
+    assert correlator.observe('111111111111', 'eu-west-1', 's-4', 'Stalled', now=3) is None
+
+def test_events_leave_the_window():
+    correlator = StormCorrelator(60, 3, 300)
+    assert observe_servers(correlator, 2, now=0) == [None, None]
+    assert correlator.observe('111111111111', 'us-east-1', 's-2', 'Stalled', now=61) is None
+    assert correlator.open_incidents() == []
+
+def test_disabled_correlator_never_opens_an_incident():
+    correlator = StormCorrelator(60, 0, 300)
+    assert observe_servers(correlator, 20, now=0) == [None] * 20
+
+def test_incident_closes_after_the_quiet_period_with_a_summary():
+    correlator = StormCorrelator(60, 2, 300)
+    incident = observe_servers(correlator, 2, now=0)[-1]
+    assert correlator.pending_notifications(now=1) == [incident]
+    assert correlator.pending_notifications(now=2) == []
+    correlator.observe('111111111111', 'us-east-1', 's-9', 'Stalled', now=200)
+    assert correlator.pending_notifications(now=400) == []
+    assert correlator.pending_notifications(now=501) == [incident]
+    assert incident.closed
+    assert set(incident.hosts) == {'s-0', 's-1', 's-9'}
+    # A failed summary is sent again
+    correlator.requeue([incident])
+    assert correlator.pending_notifications(now=502) == [incident]
+    assert correlator.open_incidents() == []
+
+def test_incident_closes_at_its_maximum_age_while_events_keep_arriving():
+    correlator = StormCorrelator(60, 2, 300, max_seconds=600)
+    incident = observe_servers(correlator, 2, now=0)[-1]
+    correlator.pending_notifications(now=0)
+    for now in range(100, 700, 100):
+        assert correlator.observe('111111111111', 'us-east-1', 's-0', 'Stalled', now=now) is incident
+    # Past its maximum age the incident is closed and the events are counted for a new one
+    assert correlator.observe('111111111111', 'us-east-1', 's-0', 'Stalled', now=700) is None
+    assert incident.closed
+    reopened = correlator.observe('111111111111', 'us-east-1', 's-1', 'Stalled', now=701)
+    assert reopened is not None and reopened is not incident
+    assert correlator.pending_notifications(now=702) == [reopened, incident]
+
+def test_requeued_open_incident_is_notified_again():
+    correlator = StormCorrelator(60, 2, 300)
+    incident = observe_servers(correlator, 2, now=0)[-1]
+    assert correlator.pending_notifications(now=1) == [incident]
+    correlator.requeue([incident])
+    assert correlator.pending_notifications(now=2) == [incident]
+
+def test_handler_attaches_the_events_of_a_storm(central, aws, monkeypatch):
+    monkeypatch.setattr(central.utils, 'storm_correlator', StormCorrelator(60, 3, 300))
+    for index in range(5):
+        aws.add_server('s-{}'.format(index), fqdn='host-{}.example.com'.format(index))
+    central.batch_handler(sqs_batch(*[stalled_event('s-{}'.format(index)) for index in range(3)]), None)
+    # The source servers were not cached, their events are counted once processed
+    [incident] = central.utils.storm_correlator.open_incidents()
+    assert len(aws.notifications) == 2
+    assert 'host-2.example.com' in aws.notifications[-1]['Message']
+    describes = aws.count('mgn', 'describe_source_servers')
+    # Later events of cached source servers are attached without a lookup or a notification
+    central.utils.get_source_servers('111111111111', ['s-3', 's-4'], 'us-east-1')
+    result = central.batch_handler(sqs_batch(stalled_event('s-3'), stalled_event('s-4')), None)
+    assert result == {'batchItemFailures': []}
+    assert aws.count('mgn', 'describe_source_servers') == describes + 1
+    assert len(aws.notifications) == 2
+    assert incident.hosts['s-4'] == 'host-4.example.com'
+    assert any('Replication Storm : Stalled' in message for _, message in aws.log_events)
+
+def test_handler_does_not_count_servers_in_skipped_states(central, aws, monkeypatch):
+    monkeypatch.setattr(central.utils, 'storm_correlator', StormCorrelator(60, 2, 300))
+    aws.add_server('s-0', state='CUTOVER')
+    aws.add_server('s-1', state='TESTING')
+    aws.add_server('s-2')
+    central.utils.get_source_servers('111111111111', ['s-0', 's-1', 's-2'], 'us-east-1')
+    for source_server_id in ('s-0', 's-1', 's-2'):
+        central.lambda_handler(stalled_event(source_server_id), None)
+    assert central.utils.storm_correlator.open_incidents() == []
+    assert len(aws.notifications) == 1
+
+def test_handler_sends_a_summary_of_the_closed_incident(central, aws, monkeypatch):
+    correlator = StormCorrelator(60, 2, 300)
+    monkeypatch.setattr(central.utils, 'storm_correlator', correlator)
+    opened_at = time.monotonic() - 1000
+    for index in range(3):
+        correlator.observe('111111111111', 'us-east-1', 's-{}'.format(index), 'Stalled', 'host-{}'.format(index), now=opened_at + index)
+    [incident] = correlator.pending_notifications(now=opened_at + 2)
+    central.deliver_storm_incidents()
+    central.flush_deliveries()
+    [summary] = [notification['Message'] for notification in aws.notifications]
+    assert 'incident {} in AWS Account 111111111111 in the region us-east-1 is closed after 1 seconds'.format(incident.incident_id) in summary
+    assert all('host-{}'.format(index) in summary for index in range(3))
@@ -0,0 +1,80 @@
+#########################################################################################
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                    #
+# SPDX-License-Identifier: MIT-0                                                        #
+#                                                                                       #
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this  #
+# software and associated documentation files (the "Software"), to deal in the Software #
+# without restriction, including without limitation the rights to use, copy, modify,    #
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to    #
+# permit persons to whom the Software is furnished to do so.                            #
+#                                                                                       #
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,   #
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A         #
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT    #
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION     #
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE        #
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                                #
+#########################################################################################
+
+import botocore.exceptions
+from datetime import datetime, timedelta, timezone
+import pytest
+from conftest import ACCOUNT, REGION, client_error, stalled_event
+
+def test_mgn_client_is_reused_across_events(central, aws):
+    utils = central.utils
+    client = utils.get_mgn_client(ACCOUNT, REGION)
+    assert utils.get_mgn_client(ACCOUNT, REGION) is client
+    assert aws.count('sts', 'assume_role') == 1
+    assert utils.get_mgn_client(ACCOUNT, 'eu-west-1') is not client
+    assert aws.count('sts', 'assume_role') == 2
+
+def test_mgn_client_expires_before_its_credentials(central, aws, monkeypatch):
+    utils = central.utils
+    # Credentials expiring within the refresh margin are not cached
+    monkeypatch.setattr(aws, 'sts_assume_role', lambda client, **params: {'Credentials': {
+        'AccessKeyId': 'testing', 'SecretAccessKey': 'testing', 'SessionToken': 'testing',
+        'Expiration': datetime.now(timezone.utc) + timedelta(seconds=utils.credential_refresh_margin - 1)
+    }})
+    utils.get_mgn_client(ACCOUNT, REGION)
+    utils.get_mgn_client(ACCOUNT, REGION)
+    assert aws.count('sts', 'assume_role') == 2
+
+def test_mgn_client_is_dropped_when_its_credentials_are_rejected(central, aws):
+    utils = central.utils
+    aws.add_server('s-1')
+    utils.get_source_details(ACCOUNT, 's-1', REGION)
+    aws.errors[('mgn', 'describe_source_servers')] = client_error('ExpiredTokenException', 'DescribeSourceServers')
+    with pytest.raises(botocore.exceptions.ClientError):
+        utils.get_source_details(ACCOUNT, 's-1', REGION)
+    del aws.errors[('mgn', 'describe_source_servers')]
+    utils.get_source_details(ACCOUNT, 's-1', REGION)
+    assert aws.count('sts', 'assume_role') == 2
+
+def test_source_server_is_described_once_while_cached(central, aws):
+    aws.add_server('s-1')
+    central.lambda_handler(stalled_event('s-1', time_stamp='2024-01-01T00:00:00Z'), None)
+    central.lambda_handler(stalled_event('s-1', 'NOT_STALLED', time_stamp='2024-01-01T00:01:00Z'), None)
+    assert aws.count('mgn', 'describe_source_servers') == 1
+
+def test_lifecycle_change_invalidates_the_cached_source_server(central, aws):
+    aws.add_server('s-1')
+    central.utils.get_source_server(ACCOUNT, 's-1', REGION)
+    aws.add_server('s-1', state='TESTING')
+    lifecycle_event = dict(stalled_event('s-1'), **{
+        'id': 'lifecycle-s-1',
+        'detail-type': 'MGN Source Server Lifecycle State Change',
+        'detail': {'state': 'TESTING'}
+    })
+    central.lambda_handler(lifecycle_event, None)
+    assert central.utils.source_server_cache.get((ACCOUNT, REGION, 's-1')) is None
+    # The next event sees the new state and is not processed
+    central.lambda_handler(stalled_event('s-1'), None)
+    assert central.utils.get_source_server(ACCOUNT, 's-1', REGION)['lifeCycle']['state'] == 'TESTING'
+    assert aws.notifications == []
+
+def test_missing_source_server_is_not_cached(central, aws):
+    with pytest.raises(ValueError):
+        central.utils.get_source_server(ACCOUNT, 's-missing', REGION)
+    aws.add_server('s-missing')
+    assert central.utils.get_source_server(ACCOUNT, 's-missing', REGION)['sourceServerID'] == 's-missing'